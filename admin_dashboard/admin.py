@@ -1,3 +1,23 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import PlatformMetricsSnapshot, ExportJob
+
+
+@admin.register(PlatformMetricsSnapshot)
+class PlatformMetricsSnapshotAdmin(admin.ModelAdmin):
+    list_display = ['id', 'generated_at']
+    readonly_fields = ['user_statistics', 'course_statistics', 'payment_statistics', 'generated_at']
+
+    def has_add_permission(self, request):
+        return False  # Snapshots are produced by the refresh task
+
+
+@admin.register(ExportJob)
+class ExportJobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'export_type', 'file_format', 'requested_by', 'status', 'processed_rows', 'total_rows', 'created_at']
+    list_filter = ['export_type', 'file_format', 'status']
+    readonly_fields = [
+        'requested_by', 'export_type', 'file_format', 'filters', 'status',
+        'total_rows', 'processed_rows', 'error_message', 'file',
+        'created_at', 'started_at', 'completed_at'
+    ]
@@ -0,0 +1,137 @@
+# admin_dashboard/exports.py
+
+import csv
+import gzip
+import io
+import json
+import logging
+import secrets
+import tempfile
+
+from django.core.files import File
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+
+from support_feedback.models import SupportTicket, CourseFeedback, TeacherFeedback
+from .models import ExportJob
+from .utils import filter_admin_users, filter_admin_payments, filter_admin_enrollments
+
+logger = logging.getLogger(__name__)
+
+# Rows fetched per database round-trip and written between progress updates
+EXPORT_CHUNK_SIZE = 2000
+
+
+def support_tickets_queryset(params):
+    tickets = SupportTicket.objects.all()
+    if params.get('status'):
+        tickets = tickets.filter(status=params['status'])
+    if params.get('priority'):
+        tickets = tickets.filter(priority=params['priority'])
+    return tickets
+
+
+def course_feedback_queryset(params):
+    feedback = CourseFeedback.objects.all()
+    if params.get('course_id'):
+        feedback = feedback.filter(course_id=params['course_id'])
+    return feedback
+
+
+def teacher_feedback_queryset(params):
+    feedback = TeacherFeedback.objects.all()
+    if params.get('teacher_id'):
+        feedback = feedback.filter(teacher_id=params['teacher_id'])
+    return feedback
+
+
+# export_type -> queryset builder, the filter keys it reads, column paths and ordering
+EXPORTS = {
+    'users': {
+        'queryset': filter_admin_users,
+        'filters': ['role', 'search', 'is_verified'],
+        'fields': ['id', 'username', 'email', 'first_name', 'last_name', 'role', 'is_verified', 'created_at'],
+        'ordering': ['-created_at', '-id'],
+    },
+    'enrollments': {
+        'queryset': filter_admin_enrollments,
+        'filters': ['course_id'],
+        'fields': [
+            'id', 'student_id', 'student__user__email', 'course_id', 'course__title',
+            'course__course_type', 'course__price', 'payment_status', 'enrolled_at', 'is_completed'
+        ],
+        'ordering': ['-enrolled_at', '-id'],
+    },
+    'payments': {
+        'queryset': filter_admin_payments,
+        'filters': ['course_id', 'status', 'gateway'],
+        'fields': [
+            'id', 'txn_ref', 'amount', 'gateway', 'is_successful', 'created_at',
+            'user_id', 'user__username', 'user__email', 'course_id', 'course__title'
+        ],
+        'ordering': ['-created_at', '-id'],
+    },
+    'support_tickets': {
+        'queryset': support_tickets_queryset,
+        'filters': ['status', 'priority'],
+        'fields': ['id', 'user_id', 'user__email', 'subject', 'message', 'status', 'priority', 'created_at', 'updated_at'],
+        'ordering': ['-created_at', '-id'],
+    },
+    'course_feedback': {
+        'queryset': course_feedback_queryset,
+        'filters': ['course_id'],
+        'fields': ['id', 'user_id', 'user__user__email', 'course_id', 'course__title', 'rating', 'feedback_text', 'created_at'],
+        'ordering': ['-created_at', '-id'],
+    },
+    'teacher_feedback': {
+        'queryset': teacher_feedback_queryset,
+        'filters': ['teacher_id'],
+        'fields': ['id', 'user_id', 'user__email', 'teacher_id', 'teacher__full_name', 'rating', 'feedback_text', 'created_at'],
+        'ordering': ['-created_at', '-id'],
+    },
+}
+
+
+def write_export(job):
+    """
+    Stream the job's queryset into a gzip'd CSV/JSONL file in chunks,
+    recording progress on the job as rows are written
+    """
+    spec = EXPORTS[job.export_type]
+    fields = spec['fields']
+    rows = spec['queryset'](job.filters).order_by(*spec['ordering'])
+
+    job.total_rows = rows.count()
+    job.save(update_fields=['total_rows'])
+
+    processed = 0
+    with tempfile.TemporaryFile() as tmp:
+        with gzip.GzipFile(fileobj=tmp, mode='wb') as gz:
+            out = io.TextIOWrapper(gz, encoding='utf-8', newline='')
+            writer = csv.writer(out) if job.file_format == 'csv' else None
+            if writer:
+                writer.writerow(fields)
+
+            for row in rows.values_list(*fields).iterator(chunk_size=EXPORT_CHUNK_SIZE):
+                if writer:
+                    writer.writerow(row)
+                else:
+                    out.write(json.dumps(dict(zip(fields, row)), cls=DjangoJSONEncoder) + '\n')
+
+                processed += 1
+                if processed % EXPORT_CHUNK_SIZE == 0:
+                    ExportJob.objects.filter(id=job.id).update(processed_rows=processed)
+
+            out.flush()
+            out.detach()
+
+        tmp.seek(0)
+        # Random part so a file's name can't be guessed from the job id
+        filename = (
+            f"{job.export_type}-{job.id}-{timezone.now():%Y%m%d%H%M%S}-"
+            f"{secrets.token_urlsafe(16)}.{job.file_format}.gz"
+        )
+        job.file.save(filename, File(tmp), save=False)
+
+    job.processed_rows = processed
+    return processed
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.1 on 2026-10-19 04:45
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('admin_dashboard', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExportJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('export_type', models.CharField(choices=[('users', 'Users'), ('enrollments', 'Course Enrollments'), ('payments', 'Course Payments'), ('support_tickets', 'Support Tickets'), ('course_feedback', 'Course Feedback'), ('teacher_feedback', 'Teacher Feedback')], max_length=30)),
+                ('file_format', models.CharField(choices=[('csv', 'CSV'), ('jsonl', 'JSON Lines')], default='csv', max_length=10)),
+                ('filters', models.JSONField(blank=True, default=dict)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('completed', 'Completed'), ('failed', 'Failed')], default='pending', max_length=20)),
+                ('total_rows', models.PositiveIntegerField(default=0)),
+                ('processed_rows', models.PositiveIntegerField(default=0)),
+                ('error_message', models.TextField(blank=True)),
+                ('file', models.FileField(blank=True, null=True, upload_to='exports/')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+                ('requested_by', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='export_jobs', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'admin_export_jobs',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['requested_by', '-created_at'], name='admin_expor_request_97ce73_idx')],
+            },
+        ),
+    ]
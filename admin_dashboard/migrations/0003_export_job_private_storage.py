@@ -0,0 +1,36 @@
+# Generated by Django 5.2.1 on 2026-10-19 05:58
+
+import os
+import shutil
+
+import admin_dashboard.models
+from django.conf import settings
+from django.db import migrations, models
+
+
+def move_files_out_of_media_root(apps, schema_editor):
+    ExportJob = apps.get_model('admin_dashboard', 'ExportJob')
+    storage = admin_dashboard.models.export_storage()
+
+    for name in ExportJob.objects.exclude(file='').exclude(file__isnull=True).values_list('file', flat=True):
+        source = os.path.join(settings.MEDIA_ROOT, name)
+        if os.path.exists(source):
+            target = storage.path(name)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            shutil.move(source, target)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('admin_dashboard', '0002_exportjob'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='exportjob',
+            name='file',
+            field=models.FileField(blank=True, null=True, storage=admin_dashboard.models.export_storage, upload_to=''),
+        ),
+        migrations.RunPython(move_files_out_of_media_root, migrations.RunPython.noop),
+    ]
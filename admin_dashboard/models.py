@@ -1,3 +1,100 @@
+# admin_dashboard/models.py
+
+import os
+
 from django.db import models
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.utils import timezone
+
+
+class PlatformMetricsSnapshot(models.Model):
+    """
+    Platform-wide counters for the admin overview, refreshed periodically
+    by Celery beat so admin polling doesn't rescan users and payments
+    """
+    user_statistics = models.JSONField(default=dict)
+    course_statistics = models.JSONField(default=dict)
+    payment_statistics = models.JSONField(default=dict)
+    generated_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"Platform metrics at {self.generated_at}"
+
+    class Meta:
+        db_table = 'platform_metrics_snapshots'
+        ordering = ['-generated_at']
+
+
+def export_storage():
+    """
+    Storage for export files. They hold users' personal data, so they live
+    outside MEDIA_ROOT and are only ever streamed by the download view,
+    which checks who is asking.
+    """
+    return FileSystemStorage(
+        location=getattr(settings, 'ADMIN_EXPORT_ROOT', os.path.join(settings.BASE_DIR, 'admin_exports'))
+    )
+
+
+class ExportJob(models.Model):
+    """
+    Background export of an admin list to a gzip'd CSV/JSONL file
+    """
+    EXPORT_TYPES = [
+        ('users', 'Users'),
+        ('enrollments', 'Course Enrollments'),
+        ('payments', 'Course Payments'),
+        ('support_tickets', 'Support Tickets'),
+        ('course_feedback', 'Course Feedback'),
+        ('teacher_feedback', 'Teacher Feedback'),
+    ]
+
+    FORMAT_CHOICES = [
+        ('csv', 'CSV'),
+        ('jsonl', 'JSON Lines'),
+    ]
+
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    ]
+
+    requested_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='export_jobs')
+    export_type = models.CharField(max_length=30, choices=EXPORT_TYPES)
+    file_format = models.CharField(max_length=10, choices=FORMAT_CHOICES, default='csv')
+    filters = models.JSONField(default=dict, blank=True)
+
+    # Progress
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    total_rows = models.PositiveIntegerField(default=0)
+    processed_rows = models.PositiveIntegerField(default=0)
+    error_message = models.TextField(blank=True)
+
+    # Result
+    file = models.FileField(storage=export_storage, null=True, blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.get_export_type_display()} export ({self.status})"
+
+    @property
+    def progress(self):
+        """Percentage of rows written so far"""
+        if self.status == 'completed':
+            return 100
+        if self.total_rows == 0:
+            return 0
+        return round(self.processed_rows / self.total_rows * 100, 2)
 
-# Create your models here.
+    class Meta:
+        db_table = 'admin_export_jobs'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['requested_by', '-created_at']),
+        ]
@@ -0,0 +1,53 @@
+# admin_dashboard/serializers.py
+
+from django.urls import reverse
+from rest_framework import serializers
+
+from .exports import EXPORTS
+from .models import ExportJob
+
+
+class ExportJobSerializer(serializers.ModelSerializer):
+    """Status of an admin export job"""
+    progress = serializers.ReadOnlyField()
+    download_url = serializers.SerializerMethodField()
+    filters = serializers.DictField(required=False)
+
+    class Meta:
+        model = ExportJob
+        fields = [
+            'id', 'export_type', 'file_format', 'filters', 'status',
+            'total_rows', 'processed_rows', 'progress', 'error_message',
+            'download_url', 'created_at', 'started_at', 'completed_at'
+        ]
+        read_only_fields = [
+            'id', 'status', 'total_rows', 'processed_rows', 'error_message',
+            'created_at', 'started_at', 'completed_at'
+        ]
+
+    def get_download_url(self, obj):
+        if obj.status != 'completed' or not obj.file:
+            return None
+        url = reverse('admin_export_job_download', kwargs={'job_id': obj.id})
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
+
+    def validate(self, attrs):
+        """Only filters the export reads, with plain values"""
+        export_type = attrs['export_type']
+        filters = attrs.get('filters', {})
+        allowed = EXPORTS[export_type]['filters']
+
+        unknown = sorted(set(filters) - set(allowed))
+        if unknown:
+            raise serializers.ValidationError({
+                'filters': f"Unknown filters for {export_type}: {', '.join(unknown)}. "
+                           f"Allowed: {', '.join(allowed)}."
+            })
+        for key, value in filters.items():
+            if not isinstance(value, (str, int, float, bool)):
+                raise serializers.ValidationError({'filters': f"{key} must be a string or number."})
+
+        # The queryset builders read them like query parameters
+        attrs['filters'] = {key: str(value) for key, value in filters.items()}
+        return attrs
@@ -0,0 +1,58 @@
+# admin_dashboard/tasks.py
+
+import logging
+
+from celery import shared_task
+from django.utils import timezone
+
+from .exports import write_export
+from .models import ExportJob
+from .utils import refresh_platform_metrics_snapshot
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def refresh_platform_metrics():
+    """
+    Refresh the admin overview metrics snapshot (scheduled every minute)
+    """
+    snapshot = refresh_platform_metrics_snapshot()
+    logger.info(f"Platform metrics snapshot refreshed at {snapshot.generated_at}")
+    return snapshot.id
+
+
+@shared_task
+def run_export_job(job_id):
+    """
+    Write an admin export job's file off the web tier
+    """
+    try:
+        job = ExportJob.objects.get(id=job_id)
+    except ExportJob.DoesNotExist:
+        logger.error(f"Export job {job_id} not found")
+        return 0
+
+    if job.status != 'pending':
+        logger.info(f"Export job {job_id} is already {job.status}, skipping")
+        return job.processed_rows
+
+    job.status = 'running'
+    job.started_at = timezone.now()
+    job.save(update_fields=['status', 'started_at'])
+
+    try:
+        write_export(job)
+        job.status = 'completed'
+        job.completed_at = timezone.now()
+        job.save()
+        logger.info(f"Export job {job_id} wrote {job.processed_rows} rows")
+        return job.processed_rows
+    except Exception as e:
+        logger.error(f"Export job {job_id} failed: {str(e)}")
+        ExportJob.objects.filter(id=job_id).update(
+            status='failed',
+            error_message=str(e),
+            completed_at=timezone.now()
+        )
+        return 0
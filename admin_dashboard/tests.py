@@ -1,3 +1,177 @@
+import base64
+import gzip
+import os
+import tempfile
+import uuid
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.storage import FileSystemStorage
 from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from payments.models import Payment
+
+from .models import ExportJob, export_storage
+from .tasks import run_export_job
+from .utils import decode_cursor, encode_cursor
+
+User = get_user_model()
+
+
+def raw_cursor(raw):
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+class KeysetPaginationTests(TestCase):
+    """Cursor pages of the admin users and payments lists"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(
+            username='admin', email='admin@example.com', password='pass', role='admin'
+        )
+        cls.users = [
+            User.objects.create_user(username=f'user{i}', email=f'user{i}@example.com', password='pass')
+            for i in range(7)
+        ]
+        # Several users share a created_at, so pages must break ties on id
+        same_time = timezone.now() - timedelta(days=1)
+        User.objects.filter(pk__in=[user.pk for user in cls.users[:4]]).update(created_at=same_time)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def walk(self, url, key, page_size):
+        seen, cursor = [], None
+        while True:
+            params = {'page_size': page_size}
+            if cursor:
+                params['cursor'] = cursor
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, 200)
+            data = response.data['data']
+            seen.extend(item['id'] for item in data[key])
+            cursor = data['next_cursor']
+            self.assertEqual(data['has_more'], cursor is not None)
+            if cursor is None:
+                return seen
+
+    def test_users_pages_cover_every_user_once_newest_first(self):
+        seen = self.walk('/api/admin-portal/users/', 'users', page_size=3)
+
+        expected = list(
+            User.objects.order_by('-created_at', '-id').values_list('id', flat=True)
+        )
+        self.assertEqual([uuid.UUID(str(pk)) for pk in seen], expected)
+
+    def test_payments_pages_use_integer_ids(self):
+        for i, user in enumerate(self.users):
+            Payment.objects.create(user=user, gateway='jazzcash', txn_ref=f'txn{i}', amount=Decimal('10'))
+
+        seen = self.walk('/api/admin-portal/payments/', 'payments', page_size=2)
+
+        self.assertEqual(seen, list(Payment.objects.order_by('-created_at', '-id').values_list('id', flat=True)))
+
+    def test_malformed_cursors_are_rejected(self):
+        now = timezone.now().isoformat()
+        for cursor in ['not base64!', raw_cursor('no separator'), raw_cursor(f'{now}|not-a-uuid'),
+                       raw_cursor(f'not a date|{uuid.uuid4()}'), raw_cursor(f'{now}|')]:
+            with self.subTest(cursor=cursor):
+                response = self.client.get('/api/admin-portal/users/', {'cursor': cursor})
+                self.assertEqual(response.status_code, 400)
+
+        response = self.client.get('/api/admin-portal/payments/', {'cursor': raw_cursor(f'{now}|abc')})
+        self.assertEqual(response.status_code, 400)
+
+    def test_cursor_round_trip(self):
+        user = self.users[0]
+        cursor = encode_cursor(user.created_at, user.pk)
+
+        self.assertEqual(decode_cursor(cursor, User._meta.pk), (user.created_at, user.pk))
+        with self.assertRaises(ValueError):
+            decode_cursor(cursor, Payment._meta.pk)
+
+
+class ExportJobFileTests(TestCase):
+    """Export files are private and only served to the admin who asked"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(
+            username='admin', email='admin@example.com', password='pass', role='admin'
+        )
+        cls.other_admin = User.objects.create_user(
+            username='other', email='other@example.com', password='pass', role='admin'
+        )
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.root = directory.name
+        field = ExportJob._meta.get_field('file')
+        patcher = mock.patch.object(field, 'storage', FileSystemStorage(location=self.root))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.job = ExportJob.objects.create(requested_by=self.admin, export_type='users')
+        run_export_job(self.job.id)
+        self.job.refresh_from_db()
+        self.client = APIClient()
+
+    def test_files_are_stored_outside_media_root(self):
+        self.assertEqual(self.job.status, 'completed')
+        self.assertTrue(self.job.file.path.startswith(self.root))
+
+        media_root = os.path.abspath(settings.MEDIA_ROOT)
+        self.assertFalse(os.path.abspath(export_storage().location).startswith(media_root + os.sep))
+
+    def test_download_is_limited_to_the_requester(self):
+        url = f'/api/admin-portal/exports/{self.job.id}/download/'
+
+        self.client.force_authenticate(self.other_admin)
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+        self.client.force_authenticate(self.admin)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(f'users-{self.job.id}.csv.gz', response['Content-Disposition'])
+        rows = gzip.decompress(b''.join(response.streaming_content)).decode().splitlines()
+        self.assertEqual(rows[0].split(',')[:3], ['id', 'username', 'email'])
+        self.assertEqual(len(rows), 3)
+
+
+class ExportJobCreateTests(TestCase):
+    """Export filters are checked before a job is queued"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(username='admin', email='admin@example.com', role='admin')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def create(self, filters, export_type='payments'):
+        with mock.patch('admin_dashboard.views.run_export_job'):
+            return self.client.post(
+                '/api/admin-portal/exports/', {'export_type': export_type, 'filters': filters}, format='json'
+            )
+
+    def test_filters_are_stored_like_query_parameters(self):
+        response = self.create({'course_id': 3, 'status': 'successful'})
+        self.assertEqual(response.status_code, 202, response.data)
+        self.assertEqual(ExportJob.objects.get().filters, {'course_id': '3', 'status': 'successful'})
 
-# Create your tests here.
+    def test_malformed_or_unknown_filters_are_rejected(self):
+        for filters in (['course_id'], 'course_id=3', {'course_id': {'in': [1, 2]}}, {'role': 'teacher'}):
+            with self.subTest(filters=filters):
+                response = self.create(filters)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('filters', response.data['errors'])
+        self.assertFalse(ExportJob.objects.exists())
@@ -21,8 +21,14 @@ urlpatterns = [
     
     # Payment Management
     path('payments/', views.admin_course_payments, name='admin_course_payments'),
+    path('payments/export/', views.admin_export_course_payments, name='admin_export_course_payments'),
     path('payments/<int:payment_id>/verify/', views.admin_verify_payment, name='admin_verify_payment'),
 
+    # Background exports
+    path('exports/', views.admin_export_jobs, name='admin_export_jobs'),
+    path('exports/<int:job_id>/', views.admin_export_job_detail, name='admin_export_job_detail'),
+    path('exports/<int:job_id>/download/', views.admin_export_job_download, name='admin_export_job_download'),
+
     # support tickets
     path('admin/tickets/', views.AdminSupportTicketListView.as_view(), name='admin-tickets'),
     path('admin/tickets/<int:pk>/', views.AdminSupportTicketDetailView.as_view(), name='admin-ticket-detail'),
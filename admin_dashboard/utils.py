@@ -0,0 +1,211 @@
+# admin_dashboard/utils.py
+
+import base64
+from datetime import timedelta
+
+from django.core.exceptions import ValidationError
+from django.db.models import Count, Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from authentication.models import User
+from courses.models import Course, Enrollment
+from payments.models import Payment
+from payments.utils import daily_revenue_series, total_revenue
+from .models import PlatformMetricsSnapshot
+
+# The overview keeps a single snapshot row that is overwritten on refresh
+SNAPSHOT_ID = 1
+
+# Days of daily revenue included in the overview chart
+REVENUE_CHART_DAYS = 30
+
+# Admin list pagination
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+def compute_platform_metrics():
+    """
+    Compute admin overview statistics with one conditional aggregate per table
+    """
+    user_stats = User.objects.aggregate(
+        total_users=Count('id'),
+        total_students=Count('id', filter=Q(role='student')),
+        total_teachers=Count('id', filter=Q(role='teacher')),
+        total_admins=Count('id', filter=Q(role='admin')),
+        total_subadmins=Count('id', filter=Q(role='subadmin')),
+    )
+
+    course_stats = Course.objects.aggregate(
+        total_courses=Count('id'),
+        active_courses=Count('id', filter=Q(is_active=True)),
+        paid_courses=Count('id', filter=Q(course_type='paid')),
+        free_courses=Count('id', filter=Q(course_type='free')),
+    )
+
+    payment_stats = Payment.objects.aggregate(
+        total_payments=Count('id'),
+        successful_payments=Count('id', filter=Q(is_successful=True)),
+    )
+    
+    # Revenue comes from the daily rollup rather than summing every payment
+    chart_start = timezone.localdate() - timedelta(days=REVENUE_CHART_DAYS - 1)
+    payment_stats['total_revenue'] = float(total_revenue(source='course'))
+    payment_stats['daily_revenue'] = daily_revenue_series(chart_start, source='course')
+
+    return {
+        'user_statistics': user_stats,
+        'course_statistics': course_stats,
+        'payment_statistics': payment_stats,
+    }
+
+
+def refresh_platform_metrics_snapshot():
+    """Recompute the platform metrics and store them in the snapshot row"""
+    snapshot, _ = PlatformMetricsSnapshot.objects.update_or_create(
+        id=SNAPSHOT_ID,
+        defaults={
+            **compute_platform_metrics(),
+            'generated_at': timezone.now(),
+        }
+    )
+    return snapshot
+
+
+def get_platform_metrics_snapshot(fresh=False):
+    """
+    Return the stored snapshot, recomputing it when requested or missing
+    """
+    if not fresh:
+        snapshot = PlatformMetricsSnapshot.objects.filter(id=SNAPSHOT_ID).first()
+        if snapshot:
+            return snapshot
+    return refresh_platform_metrics_snapshot()
+
+
+# ===========================
+# Admin list filters
+# ===========================
+def filter_admin_users(params):
+    """Apply the role/search/is_verified filters of the admin users list"""
+    role_filter = params.get('role', None)
+    search = params.get('search', None)
+    is_verified = params.get('is_verified', None)
+    
+    users = User.objects.all()
+    
+    if role_filter:
+        users = users.filter(role=role_filter)
+    
+    if search:
+        users = users.filter(
+            Q(username__icontains=search) |
+            Q(email__icontains=search) |
+            Q(first_name__icontains=search) |
+            Q(last_name__icontains=search)
+        )
+    
+    if is_verified is not None:
+        users = users.filter(is_verified=str(is_verified).lower() == 'true')
+    
+    return users
+
+
+def filter_admin_payments(params):
+    """Apply the course/status/gateway filters of the admin payments list"""
+    course_id = params.get('course_id', None)
+    payment_status = params.get('status', None)
+    gateway = params.get('gateway', None)
+    
+    payments = Payment.objects.all()
+    
+    if course_id:
+        payments = payments.filter(course__id=course_id)
+    
+    if payment_status:
+        is_successful = payment_status.lower() == 'successful'
+        payments = payments.filter(is_successful=is_successful)
+    
+    if gateway:
+        payments = payments.filter(gateway=gateway)
+    
+    return payments
+
+
+def filter_admin_enrollments(params):
+    """Apply the course filter of the admin enrollments list"""
+    course_id = params.get('course_id', None)
+    
+    enrollments = Enrollment.objects.all()
+    
+    if course_id:
+        enrollments = enrollments.filter(course_id=course_id)
+    
+    return enrollments
+
+
+# ===========================
+# Keyset pagination
+# ===========================
+def encode_cursor(created_at, pk):
+    """Encode a (created_at, id) position as an opaque cursor string"""
+    raw = f"{created_at.isoformat()}|{pk}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor, pk_field):
+    """
+    Decode a cursor produced by encode_cursor, converting its id with
+    ``pk_field`` (a UUID for users, an integer for payments)
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        created_at, pk = raw.split('|', 1)
+        created_at = parse_datetime(created_at)
+        pk = pk_field.to_python(pk)
+    except (ValueError, ValidationError, UnicodeDecodeError):
+        raise ValueError("Invalid cursor")
+
+    if created_at is None or pk is None:
+        raise ValueError("Invalid cursor")
+    return created_at, pk
+
+
+def get_page_size(request):
+    """Read page_size from the query string, clamped to MAX_PAGE_SIZE"""
+    try:
+        page_size = int(request.query_params.get('page_size', DEFAULT_PAGE_SIZE))
+    except (TypeError, ValueError):
+        page_size = DEFAULT_PAGE_SIZE
+    return max(1, min(page_size, MAX_PAGE_SIZE))
+
+
+def keyset_paginate(queryset, cursor=None, page_size=DEFAULT_PAGE_SIZE):
+    """
+    Return one page of ``queryset`` newest first, seeking past ``cursor``
+    on (created_at, id) instead of using OFFSET
+
+    Returns:
+        tuple: (list of objects, next cursor or None)
+    """
+    queryset = queryset.order_by('-created_at', '-id')
+
+    if cursor:
+        created_at, pk = decode_cursor(cursor, queryset.model._meta.pk)
+        queryset = queryset.filter(
+            Q(created_at__lt=created_at) |
+            Q(created_at=created_at, id__lt=pk)
+        )
+
+    # Fetch one extra row to know whether another page exists
+    rows = list(queryset[:page_size + 1])
+    if len(rows) <= page_size:
+        return rows, None
+
+    rows = rows[:page_size]
+    last = rows[-1]
+    return rows, encode_cursor(last.created_at, last.pk)
@@ -7,6 +7,9 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from django.db.models import Count, Q, Sum
 from django.shortcuts import get_object_or_404
+from django.http import StreamingHttpResponse, FileResponse
+from django.db import transaction
+from django.utils import timezone
 from django.db import models
 from notifications.models import Notification
 from authentication.models import User,TeacherProfile,StudentProfile, StudentQuery
@@ -14,14 +17,27 @@ from authentication.serializers import UserSerializer,StudentQuerySerializer,Stu
 from courses.models import Course, Teacher, Enrollment
 from courses.serializers import CourseListSerializer
 from payments.models import Payment
+from payments.utils import daily_revenue_series, total_revenue
+from .models import ExportJob
+from .serializers import ExportJobSerializer
+from .tasks import run_export_job
+from .utils import (
+    get_platform_metrics_snapshot, get_page_size, keyset_paginate, REVENUE_CHART_DAYS,
+    filter_admin_users, filter_admin_payments, filter_admin_enrollments
+)
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
+import csv
 import uuid
+from datetime import timedelta
 
 @swagger_auto_schema(
     method='get',
     operation_summary="Admin Dashboard Overview",
     operation_description="Get an overview of statistics for admin dashboard, including users, courses, payments, and recent activities.",
+    manual_parameters=[
+        openapi.Parameter('fresh', openapi.IN_QUERY, description="Recompute statistics instead of using the last snapshot (1/true)", type=openapi.TYPE_STRING),
+    ],
 )
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
@@ -36,52 +52,22 @@ def admin_dashboard_overview(request):
             'message': 'Access denied. Admin privileges required.'
         }, status=status.HTTP_403_FORBIDDEN)
     
-    # Get statistics
-    total_users = User.objects.count()
-    total_students = User.objects.filter(role='student').count()
-    total_teachers = User.objects.filter(role='teacher').count()
-    total_admins = User.objects.filter(role='admin').count()
-    total_subadmins = User.objects.filter(role='subadmin').count()
-    
-    # Course statistics
-    total_courses = Course.objects.count()
-    active_courses = Course.objects.filter(is_active=True).count()
-    paid_courses = Course.objects.filter(course_type='paid').count()
-    free_courses = Course.objects.filter(course_type='free').count()
-    
-    # Payment statistics
-    total_payments = Payment.objects.count()
-    successful_payments = Payment.objects.filter(is_successful=True).count()
-    total_revenue = Payment.objects.filter(is_successful=True).aggregate(
-        total=Sum('amount')
-    )['total'] or 0
+    # Statistics come from the periodically refreshed snapshot; ?fresh=1 recomputes them
+    fresh = request.query_params.get('fresh') in ['1', 'true']
+    snapshot = get_platform_metrics_snapshot(fresh=fresh)
     
     # Recent activity
     recent_users = User.objects.order_by('-created_at')[:5]
     recent_courses = Course.objects.order_by('-created_at')[:5]
-    recent_payments = Payment.objects.filter(is_successful=True).order_by('-created_at')[:5]
+    recent_payments = Payment.objects.filter(is_successful=True).select_related('user').order_by('-created_at')[:5]
     
     return Response({
         'success': True,
         'data': {
-            'user_statistics': {
-                'total_users': total_users,
-                'total_students': total_students,
-                'total_teachers': total_teachers,
-                'total_admins': total_admins,
-                'total_subadmins': total_subadmins
-            },
-            'course_statistics': {
-                'total_courses': total_courses,
-                'active_courses': active_courses,
-                'paid_courses': paid_courses,
-                'free_courses': free_courses
-            },
-            'payment_statistics': {
-                'total_payments': total_payments,
-                'successful_payments': successful_payments,
-                'total_revenue': float(total_revenue)
-            },
+            'user_statistics': snapshot.user_statistics,
+            'course_statistics': snapshot.course_statistics,
+            'payment_statistics': snapshot.payment_statistics,
+            'generated_at': snapshot.generated_at,
             'recent_activity': {
                 'recent_users': UserSerializer(recent_users, many=True).data,
                 'recent_courses': CourseListSerializer(recent_courses, many=True,context = {'request':request}).data,
@@ -106,6 +92,9 @@ def admin_dashboard_overview(request):
         openapi.Parameter('role', openapi.IN_QUERY, description="Filter by role (student, teacher, admin, subadmin)", type=openapi.TYPE_STRING),
         openapi.Parameter('search', openapi.IN_QUERY, description="Search by username, email, first_name, last_name", type=openapi.TYPE_STRING),
         openapi.Parameter('is_verified', openapi.IN_QUERY, description="Filter by verification status (true/false)", type=openapi.TYPE_BOOLEAN),
+        openapi.Parameter('cursor', openapi.IN_QUERY, description="Cursor from the previous page's next_cursor", type=openapi.TYPE_STRING),
+        openapi.Parameter('page_size', openapi.IN_QUERY, description="Number of users per page (max 100)", type=openapi.TYPE_INTEGER),
+        openapi.Parameter('include_total', openapi.IN_QUERY, description="Also count all matching users (true/false)", type=openapi.TYPE_BOOLEAN),
     ],
     responses={200: "List of users"}
 )
@@ -113,7 +102,8 @@ def admin_dashboard_overview(request):
 @permission_classes([IsAuthenticated])
 def admin_users_list(request):
     """
-    Get all users with filtering and role information
+    Get users with filtering and role information, newest first,
+    paginated by a (created_at, id) cursor
     """
     if request.user.role not in ['admin', 'subadmin']:
         return Response({
@@ -121,38 +111,32 @@ def admin_users_list(request):
             'message': 'Access denied. Admin privileges required.'
         }, status=status.HTTP_403_FORBIDDEN)
     
-    # Get query parameters
-    role_filter = request.query_params.get('role', None)
-    search = request.query_params.get('search', None)
-    is_verified = request.query_params.get('is_verified', None)
+    cursor = request.query_params.get('cursor', None)
+    include_total = request.query_params.get('include_total', 'false').lower() == 'true'
     
-    # Base queryset
-    users = User.objects.all().order_by('-created_at')
+    users = filter_admin_users(request.query_params)
     
-    # Apply filters
-    if role_filter:
-        users = users.filter(role=role_filter)
-    
-    if search:
-        users = users.filter(
-            Q(username__icontains=search) |
-            Q(email__icontains=search) |
-            Q(first_name__icontains=search) |
-            Q(last_name__icontains=search)
-        )
+    try:
+        page, next_cursor = keyset_paginate(users, cursor, get_page_size(request))
+    except ValueError:
+        return Response({
+            'success': False,
+            'message': 'Invalid cursor'
+        }, status=status.HTTP_400_BAD_REQUEST)
     
-    if is_verified is not None:
-        users = users.filter(is_verified=is_verified.lower() == 'true')
+    data = {
+        'users': UserSerializer(page, many=True).data,
+        'next_cursor': next_cursor,
+        'has_more': next_cursor is not None
+    }
     
-    # Serialize users
-    serializer = UserSerializer(users, many=True)
+    # Counting scans every matching row, so it is opt-in
+    if include_total:
+        data['total_users'] = users.count()
     
     return Response({
         'success': True,
-        'data': {
-            'total_users': users.count(),
-            'users': serializer.data
-        }
+        'data': data
     }, status=status.HTTP_200_OK)
 
 # ========================
@@ -390,18 +374,20 @@ def admin_teachers_courses(request):
     method='get',
     tags=['Admin - Payments'],
     operation_summary="Get all course payments",
-    operation_description="Returns payment records with optional filtering by course, status, and gateway.",
+    operation_description="Returns payment summary totals and one page of payment records with optional filtering by course, status, and gateway.",
     manual_parameters=[
         openapi.Parameter('course_id', openapi.IN_QUERY, description="Filter by course ID", type=openapi.TYPE_INTEGER),
         openapi.Parameter('status', openapi.IN_QUERY, description="Filter by payment status (successful/failed)", type=openapi.TYPE_STRING),
         openapi.Parameter('gateway', openapi.IN_QUERY, description="Filter by payment gateway name", type=openapi.TYPE_STRING),
+        openapi.Parameter('cursor', openapi.IN_QUERY, description="Cursor from the previous page's next_cursor", type=openapi.TYPE_STRING),
+        openapi.Parameter('page_size', openapi.IN_QUERY, description="Number of payments per page (max 100)", type=openapi.TYPE_INTEGER),
     ]
 )
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def admin_course_payments(request):
     """
-    Get all course payments with student and course details
+    Get course payments with student and course details
     """
     if request.user.role not in ['admin', 'subadmin']:
         return Response({
@@ -409,28 +395,32 @@ def admin_course_payments(request):
             'message': 'Access denied. Admin privileges required.'
         }, status=status.HTTP_403_FORBIDDEN)
     
-    # Get query parameters
-    course_id = request.query_params.get('course_id', None)
-    payment_status = request.query_params.get('status', None)
-    gateway = request.query_params.get('gateway', None)
-    
-    # Base queryset
-    payments = Payment.objects.select_related('user', 'course').order_by('-created_at')
-    
-    # Apply filters
-    if course_id:
-        payments = payments.filter(course__id=course_id)
+    payments = filter_admin_payments(request.query_params)
     
-    if payment_status:
-        is_successful = payment_status.lower() == 'successful'
-        payments = payments.filter(is_successful=is_successful)
+    # Payment summary in a single query
+    summary = payments.aggregate(
+        total_payments=Count('id'),
+        successful_payments=Count('id', filter=Q(is_successful=True)),
+        failed_payments=Count('id', filter=Q(is_successful=False)),
+        total_revenue=Sum('amount', filter=Q(is_successful=True)),
+    )
+    summary['total_revenue'] = float(summary['total_revenue'] or 0)
     
-    if gateway:
-        payments = payments.filter(gateway=gateway)
+    try:
+        page, next_cursor = keyset_paginate(
+            payments.select_related('user', 'course'),
+            request.query_params.get('cursor', None),
+            get_page_size(request)
+        )
+    except ValueError:
+        return Response({
+            'success': False,
+            'message': 'Invalid cursor'
+        }, status=status.HTTP_400_BAD_REQUEST)
     
     # Serialize payments
     payment_data = []
-    for payment in payments:
+    for payment in page:
         payment_info = {
             'id': payment.id,
             'transaction_ref': payment.txn_ref,
@@ -444,31 +434,87 @@ def admin_course_payments(request):
                 'email': payment.user.email
             },
             'course': {
-                'id': payment.meeting.id,
-                'title': getattr(payment.meeting, 'title', 'N/A')
-            }
+                'id': payment.course.id,
+                'title': payment.course.title
+            } if payment.course else None
         }
         payment_data.append(payment_info)
     
-    # Payment summary
-    total_amount = sum(p.amount for p in payments if p.is_successful)
-    successful_count = payments.filter(is_successful=True).count()
-    failed_count = payments.filter(is_successful=False).count()
-    
     return Response({
         'success': True,
         'data': {
-            'summary': {
-                'total_payments': payments.count(),
-                'successful_payments': successful_count,
-                'failed_payments': failed_count,
-                'total_revenue': float(total_amount)
-            },
-            'payments': payment_data
+            'summary': summary,
+            'payments': payment_data,
+            'next_cursor': next_cursor,
+            'has_more': next_cursor is not None
         }
     }, status=status.HTTP_200_OK)
 
 
+class Echo:
+    """File-like object whose write() just returns the value, for streaming csv.writer rows"""
+    def write(self, value):
+        return value
+
+
+PAYMENT_EXPORT_HEADER = [
+    'id', 'transaction_ref', 'amount', 'gateway', 'is_successful', 'created_at',
+    'student_id', 'student_username', 'student_email', 'course_id', 'course_title'
+]
+
+
+def iter_payment_export_rows(payments):
+    """Yield CSV rows for payments without loading the whole queryset"""
+    yield PAYMENT_EXPORT_HEADER
+    for payment in payments.select_related('user', 'course').order_by('-created_at', '-id').iterator(chunk_size=2000):
+        yield [
+            payment.id,
+            payment.txn_ref,
+            payment.amount,
+            payment.gateway,
+            payment.is_successful,
+            payment.created_at.isoformat(),
+            payment.user.id,
+            payment.user.username,
+            payment.user.email,
+            payment.course.id if payment.course else '',
+            payment.course.title if payment.course else '',
+        ]
+
+
+@swagger_auto_schema(
+    method='get',
+    tags=['Admin - Payments'],
+    operation_summary="Export course payments as CSV",
+    operation_description="Streams every payment matching the filters as a CSV file.",
+    manual_parameters=[
+        openapi.Parameter('course_id', openapi.IN_QUERY, description="Filter by course ID", type=openapi.TYPE_INTEGER),
+        openapi.Parameter('status', openapi.IN_QUERY, description="Filter by payment status (successful/failed)", type=openapi.TYPE_STRING),
+        openapi.Parameter('gateway', openapi.IN_QUERY, description="Filter by payment gateway name", type=openapi.TYPE_STRING),
+    ]
+)
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def admin_export_course_payments(request):
+    """
+    Stream course payments as CSV for finance exports
+    """
+    if request.user.role not in ['admin', 'subadmin']:
+        return Response({
+            'success': False,
+            'message': 'Access denied. Admin privileges required.'
+        }, status=status.HTTP_403_FORBIDDEN)
+    
+    writer = csv.writer(Echo())
+    rows = iter_payment_export_rows(filter_admin_payments(request.query_params))
+    response = StreamingHttpResponse(
+        (writer.writerow(row) for row in rows),
+        content_type='text/csv'
+    )
+    response['Content-Disposition'] = 'attachment; filename="payments.csv"'
+    return response
+
+
 @swagger_auto_schema(
     method='put',
     tags=['Admin - Payments'],
@@ -542,14 +588,7 @@ def admin_course_enrollments(request):
             'message': 'Access denied. Admin privileges required.'
         }, status=status.HTTP_403_FORBIDDEN)
     
-    # Get query parameters
-    course_id = request.query_params.get('course_id', None)
-    
-    # Base queryset
-    enrollments = Enrollment.objects.select_related('course').order_by('-enrolled_at')
-    
-    if course_id:
-        enrollments = enrollments.filter(course_id=course_id)
+    enrollments = filter_admin_enrollments(request.query_params).select_related('course').order_by('-enrolled_at')
     
     # Serialize enrollments
     enrollment_data = []
@@ -576,6 +615,124 @@ def admin_course_enrollments(request):
     }, status=status.HTTP_200_OK)
 
 
+# ===========================
+# Admin Export Jobs
+# ===========================
+@swagger_auto_schema(
+    method='get',
+    tags=['Admin - Exports'],
+    operation_summary="List your export jobs",
+    responses={200: ExportJobSerializer(many=True)}
+)
+@swagger_auto_schema(
+    method='post',
+    tags=['Admin - Exports'],
+    operation_summary="Start a background export",
+    operation_description="Queues an export of users, enrollments, payments, support tickets or feedback to a gzip'd CSV/JSONL file. Filters take the same keys as the matching list endpoint.",
+    request_body=openapi.Schema(
+        type=openapi.TYPE_OBJECT,
+        properties={
+            'export_type': openapi.Schema(type=openapi.TYPE_STRING, description="users, enrollments, payments, support_tickets, course_feedback or teacher_feedback"),
+            'file_format': openapi.Schema(type=openapi.TYPE_STRING, description="csv or jsonl"),
+            'filters': openapi.Schema(type=openapi.TYPE_OBJECT, description="e.g. {\"status\": \"successful\", \"course_id\": 3}")
+        },
+        required=['export_type']
+    ),
+    responses={202: ExportJobSerializer()}
+)
+@api_view(['GET', 'POST'])
+@permission_classes([IsAuthenticated])
+def admin_export_jobs(request):
+    """
+    List the current admin's export jobs or start a new one
+    """
+    if request.user.role not in ['admin', 'subadmin']:
+        return Response({
+            'success': False,
+            'message': 'Access denied. Admin privileges required.'
+        }, status=status.HTTP_403_FORBIDDEN)
+    
+    if request.method == 'GET':
+        jobs = ExportJob.objects.filter(requested_by=request.user)[:50]
+        return Response({
+            'success': True,
+            'data': ExportJobSerializer(jobs, many=True, context={'request': request}).data
+        }, status=status.HTTP_200_OK)
+    
+    serializer = ExportJobSerializer(data=request.data, context={'request': request})
+    if not serializer.is_valid():
+        return Response({
+            'success': False,
+            'errors': serializer.errors
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    job = serializer.save(requested_by=request.user)
+    transaction.on_commit(lambda: run_export_job.delay(job.id))
+    
+    return Response({
+        'success': True,
+        'message': 'Export queued',
+        'data': ExportJobSerializer(job, context={'request': request}).data
+    }, status=status.HTTP_202_ACCEPTED)
+
+
+@swagger_auto_schema(
+    method='get',
+    tags=['Admin - Exports'],
+    operation_summary="Get export job status",
+    responses={200: ExportJobSerializer()}
+)
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def admin_export_job_detail(request, job_id):
+    """
+    Get the status and progress of an export job
+    """
+    if request.user.role not in ['admin', 'subadmin']:
+        return Response({
+            'success': False,
+            'message': 'Access denied. Admin privileges required.'
+        }, status=status.HTTP_403_FORBIDDEN)
+    
+    job = get_object_or_404(ExportJob, id=job_id, requested_by=request.user)
+    return Response({
+        'success': True,
+        'data': ExportJobSerializer(job, context={'request': request}).data
+    }, status=status.HTTP_200_OK)
+
+
+@swagger_auto_schema(
+    method='get',
+    tags=['Admin - Exports'],
+    operation_summary="Download a completed export file",
+)
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def admin_export_job_download(request, job_id):
+    """
+    Download the gzip'd file of a completed export job
+    """
+    if request.user.role not in ['admin', 'subadmin']:
+        return Response({
+            'success': False,
+            'message': 'Access denied. Admin privileges required.'
+        }, status=status.HTTP_403_FORBIDDEN)
+    
+    job = get_object_or_404(ExportJob, id=job_id, requested_by=request.user)
+    if job.status != 'completed' or not job.file:
+        return Response({
+            'success': False,
+            'message': f'Export is {job.status}, no file available yet'
+        }, status=status.HTTP_409_CONFLICT)
+    
+    return FileResponse(
+        job.file.open('rb'),
+        as_attachment=True,
+        filename=f"{job.export_type}-{job.id}.{job.file_format}.gz",
+        content_type='application/gzip'
+    )
+
+
 @api_view(['DELETE'])
 @permission_classes([IsAuthenticated])
 def admin_delete_user(request, user_id):
@@ -643,11 +800,14 @@ def admin_user_detail(request, user_id):
             try:
                 teacher = TeacherProfile.objects.get(user=user)
                 courses = Course.objects.filter(teacher=teacher)
+                chart_start = timezone.localdate() - timedelta(days=REVENUE_CHART_DAYS - 1)
                 additional_info = {
                     'teacher_profile': {
                         'bio': teacher.bio,
                         'total_courses': courses.count(),
-                        'active_courses': courses.filter(is_active=True).count()
+                        'active_courses': courses.filter(is_active=True).count(),
+                        'total_revenue': float(total_revenue(teacher=teacher)),
+                        'daily_revenue': daily_revenue_series(chart_start, teacher=teacher)
                     }
                 }
             except TeacherProfile.DoesNotExist:
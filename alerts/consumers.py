@@ -1,13 +1,31 @@
 from channels.generic.websocket import AsyncWebsocketConsumer
+from channels.db import database_sync_to_async
+from urllib.parse import parse_qs
 import json
 
+from notifications.utils import get_missed_notifications, get_unread_count
+
+
 class AlertConsumer(AsyncWebsocketConsumer):
+    """
+    Per-user socket for live alerts and notifications
+
+    Clients reconnect with `?last_id=<id>` (or send
+    {"action": "resume", "last_id": <id>}) to receive the notifications
+    they missed while disconnected instead of polling the REST API.
+    """
+
     async def connect(self):
         user = self.scope["user"]
         if user.is_authenticated:
             self.group_name = f"user_{user.id}"
             await self.channel_layer.group_add(self.group_name, self.channel_name)
             await self.accept()
+
+            query = parse_qs(self.scope.get("query_string", b"").decode())
+            last_id = query.get("last_id", [None])[0]
+            if last_id is not None:
+                await self.resume(last_id)
         else:
             await self.close()
 
@@ -15,8 +33,47 @@ class AlertConsumer(AsyncWebsocketConsumer):
         if hasattr(self, "group_name"):
             await self.channel_layer.group_discard(self.group_name, self.channel_name)
 
+    async def receive(self, text_data=None, bytes_data=None):
+        try:
+            data = json.loads(text_data or "{}")
+        except json.JSONDecodeError:
+            return
+
+        if data.get("action") == "resume":
+            await self.resume(data.get("last_id", 0))
+
+    async def resume(self, last_id):
+        """Send the notifications created after `last_id` and the unread count"""
+        try:
+            last_id = int(last_id)
+        except (TypeError, ValueError):
+            last_id = 0
+
+        notifications, has_more = await self.get_missed(last_id)
+        await self.send(text_data=json.dumps({
+            "type": "resume",
+            "notifications": notifications,
+            # Too many missed: the client should reload its list over REST
+            "has_more": has_more,
+            "unread_count": await self.get_unread_count(),
+        }))
+
+    @database_sync_to_async
+    def get_missed(self, last_id):
+        return get_missed_notifications(self.scope["user"].id, last_id)
+
+    @database_sync_to_async
+    def get_unread_count(self):
+        return get_unread_count(self.scope["user"])
+
     async def send_alert(self, event):
         await self.send(text_data=json.dumps({
             "message": event["message"],
             "type": event["type"]
         }))
+
+    async def notification_created(self, event):
+        await self.send(text_data=json.dumps({
+            "type": "notification",
+            "notification": event["notification"]
+        }))
@@ -0,0 +1,43 @@
+from urllib.parse import parse_qs
+
+from channels.db import database_sync_to_async
+from channels.middleware import BaseMiddleware
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from rest_framework_simplejwt.tokens import AccessToken
+
+User = get_user_model()
+
+
+def get_token_from_scope(scope):
+    """Read the JWT access token from the `access` cookie or `?token=` query param"""
+    for name, value in scope.get("headers", []):
+        if name == b"cookie":
+            for item in value.decode().split(";"):
+                key, _, token = item.strip().partition("=")
+                if key == "access" and token:
+                    return token
+
+    query = parse_qs(scope.get("query_string", b"").decode())
+    return query.get("token", [None])[0]
+
+
+@database_sync_to_async
+def get_user_for_token(token):
+    try:
+        user_id = AccessToken(token)["user_id"]
+        return User.objects.get(id=user_id, is_active=True)
+    except Exception:
+        return AnonymousUser()
+
+
+class JWTAuthMiddleware(BaseMiddleware):
+    """
+    Populate scope["user"] from the same JWT the REST API uses, so sockets
+    grouped by user (e.g. AlertConsumer) work for token-authenticated clients
+    """
+
+    async def __call__(self, scope, receive, send):
+        token = get_token_from_scope(scope)
+        scope["user"] = await get_user_for_token(token) if token else AnonymousUser()
+        return await super().__call__(scope, receive, send)
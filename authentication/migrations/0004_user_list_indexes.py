@@ -0,0 +1,49 @@
+# Generated by Django 5.2.1 on 2026-10-19 04:39
+
+from django.db import migrations, models
+
+# Trigram indexes back the admin users search (icontains compiles to
+# UPPER(col) LIKE UPPER(%s) on PostgreSQL). Other backends skip them.
+TRIGRAM_COLUMNS = ['username', 'email', 'first_name', 'last_name']
+
+
+def create_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for column in TRIGRAM_COLUMNS:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS users_{column}_trgm_idx '
+            f'ON users USING gin (UPPER({column}) gin_trgm_ops)'
+        )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for column in TRIGRAM_COLUMNS:
+        schema_editor.execute(f'DROP INDEX IF EXISTS users_{column}_trgm_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('authentication', '0003_studentquery'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['created_at', 'id'], name='users_created_1b562c_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['role', 'is_verified', 'created_at', 'id'], name='users_role_36e2e6_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['is_verified', 'created_at', 'id'], name='users_is_veri_4f0ca9_idx'),
+        ),
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
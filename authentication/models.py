@@ -36,6 +36,12 @@ class User(AbstractUser):
     
     class Meta:
         db_table = 'users'
+        indexes = [
+            # Keyset pagination for the admin users list, alone and with filters
+            models.Index(fields=['created_at', 'id']),
+            models.Index(fields=['role', 'is_verified', 'created_at', 'id']),
+            models.Index(fields=['is_verified', 'created_at', 'id']),
+        ]
 
 
 class StudentProfile(models.Model):
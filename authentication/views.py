@@ -4,7 +4,7 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework_simplejwt.tokens import RefreshToken,AccessToken
-from django.core.mail import send_mail
+from email_automation.dispatch import send_mail_async
 from django.conf import settings
 from django.utils.crypto import get_random_string
 from django.shortcuts import get_object_or_404
@@ -89,7 +89,7 @@ class UserRegistrationView(APIView):
         '''
         
         try:
-            send_mail(subject, message, settings.EMAIL_HOST_USER, [user.email])
+            send_mail_async(subject, message, settings.EMAIL_HOST_USER, [user.email])
         except Exception as e:
             print(f"Email sending failed: {e}")
 
@@ -283,7 +283,7 @@ class ResendVerificationEmailView(APIView):
         '''
         
         try:
-            send_mail(subject, message, settings.DEFAULT_FROM_EMAIL, [user.email])
+            send_mail_async(subject, message, settings.DEFAULT_FROM_EMAIL, [user.email])
         except Exception as e:
             print(f"Email sending failed: {e}")
 
@@ -566,7 +566,7 @@ class StudentQueryView(APIView):
         '''
         
         try:
-            send_mail(subject, message, settings.EMAIL_HOST_USER, [query.email])
+            send_mail_async(subject, message, settings.EMAIL_HOST_USER, [query.email])
         except Exception as e:
             print(f"Email sending failed: {e}")
 
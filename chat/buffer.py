@@ -0,0 +1,153 @@
+# chat/buffer.py
+import asyncio
+import atexit
+import logging
+import threading
+import weakref
+
+from channels.db import database_sync_to_async
+from django.utils import timezone
+
+from lms.conf import merged_settings
+
+from .models import ChatMessage
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHAT_MESSAGE_BUFFER = {
+    'FLUSH_INTERVAL_MS': 200,
+    'MAX_MESSAGES': 100,
+}
+
+
+def chat_message_buffer_settings():
+    """Flush interval and size of the message buffer (CHAT_MESSAGE_BUFFER)"""
+    return merged_settings('CHAT_MESSAGE_BUFFER', DEFAULT_CHAT_MESSAGE_BUFFER)
+
+
+class ChatMessageBuffer:
+    """
+    Write-behind buffer for chat messages: consumers broadcast right away
+    and add the message here, and it is saved with bulk_create once
+    ``max_messages`` are waiting or ``flush_interval`` seconds have passed.
+
+    Messages keep the time they were sent and are inserted in the order
+    they were added. A failed flush puts its batch back in front of newer
+    messages to be retried. Call flush() to drain the buffer (consumers
+    do on disconnect); flush_sync() runs at interpreter exit.
+
+    Usage:
+        buffer = get_message_buffer()
+        buffer.add(room_id, user.username, text)
+    """
+
+    def __init__(self, flush_interval, max_messages):
+        self.flush_interval = flush_interval
+        self.max_messages = max_messages
+        self._pending = []
+        # add/take/restore also run from flush_sync outside the event loop
+        self._lock = threading.Lock()
+        # Per event loop, since asyncio objects are bound to one
+        self._flush_locks = weakref.WeakKeyDictionary()
+        self._timers = weakref.WeakKeyDictionary()
+        self._tasks = set()
+
+    def __len__(self):
+        return len(self._pending)
+
+    def add(self, room_id, user, message):
+        """
+        Buffer a message; must be called from a running event loop
+
+        Returns:
+            ChatMessage: The unsaved message
+        """
+        chat_message = ChatMessage(room_id=room_id, user=user, message=message, timestamp=timezone.now())
+        with self._lock:
+            self._pending.append(chat_message)
+            full = len(self._pending) >= self.max_messages
+
+        loop = asyncio.get_running_loop()
+        if full:
+            self._spawn(loop, self.flush())
+        elif self._timers.get(loop) is None:
+            self._timers[loop] = self._spawn(loop, self._flush_after_interval(loop))
+        return chat_message
+
+    def _spawn(self, loop, coroutine):
+        # Keep a reference so the task isn't garbage collected mid-flush
+        task = loop.create_task(coroutine)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def _flush_after_interval(self, loop):
+        try:
+            while True:
+                await asyncio.sleep(self.flush_interval)
+                await self.flush()
+                if not self._pending:
+                    return
+        finally:
+            self._timers.pop(loop, None)
+
+    def _take(self):
+        with self._lock:
+            batch, self._pending = self._pending, []
+        return batch
+
+    def _write(self, batch):
+        try:
+            ChatMessage.objects.bulk_create(batch)
+        except Exception:
+            # bulk_create is atomic, so nothing was saved: retry the batch
+            # ahead of anything added since
+            with self._lock:
+                self._pending[:0] = batch
+            raise
+
+    async def flush(self):
+        """
+        Save everything buffered so far
+
+        Returns:
+            int: Number of messages saved
+        """
+        loop = asyncio.get_running_loop()
+        # One flush at a time, so batches are inserted in order
+        flush_lock = self._flush_locks.setdefault(loop, asyncio.Lock())
+        async with flush_lock:
+            batch = self._take()
+            if not batch:
+                return 0
+            try:
+                await database_sync_to_async(self._write)(batch)
+            except Exception as e:
+                logger.error(f"Failed to save {len(batch)} chat messages, will retry: {str(e)}")
+                return 0
+            return len(batch)
+
+    def flush_sync(self):
+        """Save everything buffered, from outside the event loop (shutdown)"""
+        batch = self._take()
+        if not batch:
+            return 0
+        try:
+            self._write(batch)
+        except Exception as e:
+            logger.error(f"Failed to save {len(batch)} chat messages at shutdown: {str(e)}")
+            return 0
+        return len(batch)
+
+
+_buffer = None
+
+
+def get_message_buffer():
+    """The process-wide chat message buffer, drained at exit"""
+    global _buffer
+    if _buffer is None:
+        config = chat_message_buffer_settings()
+        _buffer = ChatMessageBuffer(config['FLUSH_INTERVAL_MS'] / 1000, config['MAX_MESSAGES'])
+        atexit.register(_buffer.flush_sync)
+    return _buffer
@@ -0,0 +1,28 @@
+# chat/checks.py
+
+from django.conf import settings
+from django.core.checks import Warning, register
+
+from lms.cache import PROCESS_LOCAL_CACHES
+
+from .presence import chat_presence_settings
+
+
+@register()
+def check_presence_store(app_configs, **kwargs):
+    """
+    Without Redis, room presence lives in the default cache; a per-process
+    cache gives every Daphne worker its own rosters
+    """
+    backend = getattr(settings, 'CACHES', {}).get('default', {}).get('BACKEND', '')
+    if chat_presence_settings()['REDIS_URL'] or backend not in PROCESS_LOCAL_CACHES:
+        return []
+    return [
+        Warning(
+            f"Meeting room presence is kept in the default cache ({backend.rsplit('.', 1)[-1]}), "
+            "which is not shared between processes, so with several Daphne workers each "
+            "shows only the users connected to it.",
+            hint="Set CHAT_PRESENCE_REDIS_URL or REDIS_URL.",
+            id='chat.W001',
+        )
+    ]
@@ -1,4 +1,6 @@
+import asyncio
 import json
+import logging
 from channels.generic.websocket import AsyncWebsocketConsumer
 # from accounts.models import CustomUser
 from rest_framework_simplejwt.tokens import UntypedToken
@@ -7,12 +9,12 @@ from channels.db import database_sync_to_async
 from jwt import decode as jwt_decode
 from django.conf import settings
 
-from .models import ChatMessage
+from .buffer import get_message_buffer
+from .presence import chat_presence_settings, get_presence_store, presence_entry
 
-User = get_user_model()
+logger = logging.getLogger(__name__)
 
-# Temporary in-memory user tracking (for dev)
-ONLINE_USERS = {}  # { room_id: set(user_info_dicts) }
+User = get_user_model()
 
 def get_cookie(headers, key):
     for header in headers:
@@ -29,6 +31,8 @@ class VideoConsumer(AsyncWebsocketConsumer):
         self.room_id = self.scope['url_route']['kwargs']['room_id']
         self.room_group_name = f"meeting_{self.room_id}"
         self.user = None  # Initialize user
+        self.presence = get_presence_store()
+        self.heartbeat = None
 
         # Extract JWT from cookies
         token = get_cookie(self.scope["headers"], "access")
@@ -52,9 +56,19 @@ class VideoConsumer(AsyncWebsocketConsumer):
         await self.channel_layer.group_add(self.room_group_name, self.channel_name)
         await self.accept()
 
-        # Add user with first_name to online users
-        await self.add_online_user(self.room_id, self.user.username, self.user.first_name)
-        await self.send_online_users()
+        # Newcomers get the whole roster, everyone else only the change
+        entry = presence_entry(self.user)
+        joined = await self.presence.join(self.room_id, entry)
+        await self.send(text_data=json.dumps({
+            'type': 'online_users',
+            'users': await self.presence.members(self.room_id)
+        }))
+        if joined:
+            await self.channel_layer.group_send(
+                self.room_group_name,
+                {'type': 'presence_joined', 'user': entry}
+            )
+        self.heartbeat = asyncio.create_task(self.send_heartbeats())
 
         print(f"✅ {self.user.first_name} ({self.user.username}) connected to {self.room_group_name}")
 
@@ -62,10 +76,16 @@ class VideoConsumer(AsyncWebsocketConsumer):
         if hasattr(self, 'room_group_name'):
             await self.channel_layer.group_discard(self.room_group_name, self.channel_name)
         
+        if getattr(self, 'heartbeat', None):
+            self.heartbeat.cancel()
+        
+        # Don't leave this connection's messages waiting in the buffer
+        await get_message_buffer().flush()
+        
         # Only remove user if self.user exists
         if hasattr(self, 'user') and self.user and hasattr(self.user, 'username'):
-            await self.remove_online_user(self.room_id, self.user.username)
-            await self.send_online_users()
+            if await self.presence.leave(self.room_id, str(self.user.pk)):
+                await self.broadcast_left(presence_entry(self.user))
             print(f"❌ {self.user.first_name} ({self.user.username}) disconnected from {self.room_group_name}")
         else:
             print(f"❌ User disconnected from {getattr(self, 'room_group_name', 'unknown room')}")
@@ -76,12 +96,9 @@ class VideoConsumer(AsyncWebsocketConsumer):
             message = data.get("message", "")
 
             if self.user and not self.user.is_anonymous and message.strip():
-                # Save to DB with username (for identification)
-                await database_sync_to_async(ChatMessage.objects.create)(
-                    room_id=self.room_id,
-                    user=self.user.username,
-                    message=message
-                )
+                # Saved with username (for identification) by the
+                # write-behind buffer, so the broadcast doesn't wait on the DB
+                get_message_buffer().add(self.room_id, self.user.username, message)
 
                 # Broadcast with first_name (for display)
                 await self.channel_layer.group_send(
@@ -91,7 +108,7 @@ class VideoConsumer(AsyncWebsocketConsumer):
                         'message': message,
                         'user': self.user.username,  # for backend identification
                         'first_name': self.user.first_name,  # for frontend display
-                        'user_id': self.user.id
+                        'user_id': str(self.user.id)
                     }
                 )
                 print(f"💬 Message from {self.user.first_name}: {message}")
@@ -107,37 +124,41 @@ class VideoConsumer(AsyncWebsocketConsumer):
             'user_id': event.get('user_id')
         }))
 
-    async def online_users(self, event):
+    async def presence_joined(self, event):
+        # The joining connection already has the full roster
+        if event['user']['user_id'] == str(self.user.pk):
+            return
         await self.send(text_data=json.dumps({
-            'type': 'online_users',
-            'users': event['users']
+            'type': 'user_joined',
+            'user': event['user']
         }))
 
-    async def send_online_users(self):
-        if hasattr(self, 'room_id'):
-            users_data = []
-            raw_users = list(ONLINE_USERS.get(self.room_id, set()))
-            
-            for user_info in raw_users:
-                if '|' in user_info:
-                    username, first_name = user_info.split('|', 1)
-                    users_data.append({
-                        'username': username,
-                        'first_name': first_name
-                    })
-                else:
-                    users_data.append({
-                        'username': user_info,
-                        'first_name': user_info
-                    })
-            
-            await self.channel_layer.group_send(
-                self.room_group_name,
-                {
-                    'type': 'online_users',
-                    'users': users_data
-                }
-            )
+    async def presence_left(self, event):
+        await self.send(text_data=json.dumps({
+            'type': 'user_left',
+            'user': event['user']
+        }))
+
+    async def broadcast_left(self, entry):
+        await self.channel_layer.group_send(
+            self.room_group_name,
+            {'type': 'presence_left', 'user': entry}
+        )
+
+    async def send_heartbeats(self):
+        """
+        Keep this user's presence entry fresh and drop users whose worker
+        went away without disconnecting them
+        """
+        interval = chat_presence_settings()['HEARTBEAT_SECONDS']
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.presence.touch(self.room_id, str(self.user.pk))
+                for entry in await self.presence.expire_stale(self.room_id):
+                    await self.broadcast_left(entry)
+            except Exception:
+                logger.exception(f"Presence heartbeat failed in room {self.room_id}")
 
     @database_sync_to_async
     def get_user_from_token(self, token):
@@ -166,30 +187,3 @@ class VideoConsumer(AsyncWebsocketConsumer):
         except Exception as e:
             print(f"❌ Token validation error: {str(e)}")
             return None
-
-    @database_sync_to_async
-    def add_online_user(self, room_id, username, first_name):
-        if room_id not in ONLINE_USERS:
-            ONLINE_USERS[room_id] = set()
-        
-        # Store user info as a string with pipe separator
-        user_info = f"{username}|{first_name or username}"
-        ONLINE_USERS[room_id].add(user_info)
-        print(f"👥 Added {first_name} to room {room_id}")
-
-    @database_sync_to_async
-    def remove_online_user(self, room_id, username):
-        if room_id in ONLINE_USERS:
-            # Remove any entry that starts with this username
-            to_remove = None
-            for user_info in ONLINE_USERS[room_id]:
-                if user_info.startswith(f"{username}|"):
-                    to_remove = user_info
-                    break
-            if to_remove:
-                ONLINE_USERS[room_id].discard(to_remove)
-                print(f"👥 Removed {username} from room {room_id}")
-            
-            # Clean up empty rooms
-            if not ONLINE_USERS[room_id]:
-                del ONLINE_USERS[room_id]
\ No newline at end of file
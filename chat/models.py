@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 # Create your models here.
 
 
@@ -7,7 +8,8 @@ class ChatMessage(models.Model):
     room_id = models.CharField(max_length=255)
     user = models.CharField(max_length=255)
     message = models.TextField()
-    timestamp = models.DateTimeField(auto_now_add=True)
+    # Set when sent, not when the buffered message is saved (chat.buffer)
+    timestamp = models.DateTimeField(default=timezone.now)
 
     def _str_(self):
         return f"{self.room_id} | {self.user}: {self.message}"
\ No newline at end of file
@@ -0,0 +1,243 @@
+# chat/presence.py
+import json
+import time
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+
+from lms.cache import CacheLock, LockTimeout
+from lms.conf import merged_settings
+
+DEFAULT_CHAT_PRESENCE = {
+    'REDIS_URL': None,
+    'TTL_SECONDS': 60,
+    'HEARTBEAT_SECONDS': 20,
+}
+
+
+def chat_presence_settings():
+    """Presence store and heartbeat options (CHAT_PRESENCE)"""
+    return merged_settings('CHAT_PRESENCE', DEFAULT_CHAT_PRESENCE)
+
+
+def presence_entry(user):
+    """What the room roster shows for a user"""
+    return {
+        'user_id': str(user.pk),
+        'username': user.username,
+        'first_name': user.first_name or user.username,
+    }
+
+
+class CachePresenceStore:
+    """
+    Room presence in the Django cache: one entry per room mapping user id
+    to their roster entry, open connection count and last heartbeat.
+
+    Shared by all workers when the cache is (Redis, Memcached); with the
+    default LocMemCache it is per process, which is enough for development
+    and tests. Updates are serialized per room with a CacheLock; waiting
+    for a busy room outlasts the lock's expiry, so only a live holder can
+    make an update fail with LockTimeout.
+    """
+    LOCK_TIMEOUT = 2
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+
+    def _key(self, room_id):
+        return f"chat_presence:{room_id}"
+
+    def _update(self, room_id, change):
+        """Apply ``change(room)`` to the room's entries under its lock"""
+        key = self._key(room_id)
+        lock = CacheLock(f"{key}:lock", self.LOCK_TIMEOUT)
+        token = lock.acquire(wait=self.LOCK_TIMEOUT + 0.5)
+        if token is None:
+            raise LockTimeout(f"Presence of room {room_id} is locked")
+        try:
+            room = cache.get(key) or {}
+            result = change(room)
+            if room:
+                # Rooms nobody refreshes expire on their own
+                cache.set(key, room, self.ttl * 2)
+            else:
+                cache.delete(key)
+            return result
+        finally:
+            lock.release(token)
+
+    def _join(self, room_id, entry):
+        def change(room):
+            member = room.setdefault(entry['user_id'], {'entry': entry, 'connections': 0})
+            member['entry'] = entry
+            member['connections'] += 1
+            member['seen'] = time.time()
+            return member['connections'] == 1
+        return self._update(room_id, change)
+
+    def _leave(self, room_id, user_id):
+        def change(room):
+            member = room.get(user_id)
+            if member is None:
+                return False
+            member['connections'] -= 1
+            if member['connections'] > 0:
+                return False
+            del room[user_id]
+            return True
+        return self._update(room_id, change)
+
+    def _touch(self, room_id, user_id):
+        def change(room):
+            if user_id in room:
+                room[user_id]['seen'] = time.time()
+        self._update(room_id, change)
+
+    def _expire_stale(self, room_id):
+        def change(room):
+            cutoff = time.time() - self.ttl
+            stale = [user_id for user_id, member in room.items() if member['seen'] < cutoff]
+            return [room.pop(user_id)['entry'] for user_id in stale]
+        return self._update(room_id, change)
+
+    def _members(self, room_id):
+        room = cache.get(self._key(room_id)) or {}
+        return [member['entry'] for member in room.values()]
+
+    async def join(self, room_id, entry):
+        """
+        Count a connection of ``entry``'s user to the room
+
+        Returns:
+            bool: True if it is the user's first connection (they joined)
+        """
+        return await sync_to_async(self._join)(room_id, entry)
+
+    async def leave(self, room_id, user_id):
+        """
+        Drop one of the user's connections
+
+        Returns:
+            bool: True if it was their last one (they left)
+        """
+        return await sync_to_async(self._leave)(room_id, user_id)
+
+    async def touch(self, room_id, user_id):
+        """Refresh the user's heartbeat"""
+        await sync_to_async(self._touch)(room_id, user_id)
+
+    async def expire_stale(self, room_id):
+        """
+        Drop users whose heartbeat is older than the TTL, e.g. when the
+        worker holding their connection died
+
+        Returns:
+            list: Roster entries of the users dropped
+        """
+        return await sync_to_async(self._expire_stale)(room_id)
+
+    async def members(self, room_id):
+        """Roster entries of everyone in the room"""
+        return await sync_to_async(self._members)(room_id)
+
+
+class RedisPresenceStore:
+    """
+    Room presence in Redis, shared by every worker. Per room:
+
+        chat:presence:<room>:entries      hash  user id -> roster entry (JSON)
+        chat:presence:<room>:connections  hash  user id -> open connections
+        chat:presence:<room>:seen         zset  user id scored by last heartbeat
+
+    Joins, leaves and expiry are Lua scripts, so each is atomic across
+    workers and only one of them reports a user as joined or left.
+    """
+
+    JOIN = """
+    local connections = redis.call('HINCRBY', KEYS[2], ARGV[1], 1)
+    redis.call('HSET', KEYS[1], ARGV[1], ARGV[2])
+    redis.call('ZADD', KEYS[3], ARGV[3], ARGV[1])
+    for _, key in ipairs(KEYS) do redis.call('EXPIRE', key, ARGV[4]) end
+    return connections
+    """
+
+    LEAVE = """
+    local connections = redis.call('HINCRBY', KEYS[2], ARGV[1], -1)
+    if connections > 0 then return 0 end
+    redis.call('HDEL', KEYS[1], ARGV[1])
+    redis.call('HDEL', KEYS[2], ARGV[1])
+    return redis.call('ZREM', KEYS[3], ARGV[1])
+    """
+
+    TOUCH = """
+    redis.call('ZADD', KEYS[3], 'XX', ARGV[2], ARGV[1])
+    for _, key in ipairs(KEYS) do redis.call('EXPIRE', key, ARGV[3]) end
+    """
+
+    EXPIRE_STALE = """
+    local stale = redis.call('ZRANGEBYSCORE', KEYS[3], '-inf', ARGV[1])
+    local entries = {}
+    for _, user_id in ipairs(stale) do
+        local entry = redis.call('HGET', KEYS[1], user_id)
+        if entry then table.insert(entries, entry) end
+        redis.call('HDEL', KEYS[1], user_id)
+        redis.call('HDEL', KEYS[2], user_id)
+        redis.call('ZREM', KEYS[3], user_id)
+    end
+    return entries
+    """
+
+    def __init__(self, url, ttl):
+        # Imported here so the cache store works without redis installed
+        from redis.asyncio import Redis
+
+        self.redis = Redis.from_url(url, decode_responses=True)
+        self.ttl = ttl
+        self._join_script = self.redis.register_script(self.JOIN)
+        self._leave_script = self.redis.register_script(self.LEAVE)
+        self._touch_script = self.redis.register_script(self.TOUCH)
+        self._expire_script = self.redis.register_script(self.EXPIRE_STALE)
+
+    def _keys(self, room_id):
+        prefix = f"chat:presence:{room_id}"
+        return [f"{prefix}:entries", f"{prefix}:connections", f"{prefix}:seen"]
+
+    async def join(self, room_id, entry):
+        connections = await self._join_script(
+            keys=self._keys(room_id),
+            args=[entry['user_id'], json.dumps(entry), time.time(), self.ttl * 2]
+        )
+        return int(connections) == 1
+
+    async def leave(self, room_id, user_id):
+        return bool(await self._leave_script(keys=self._keys(room_id), args=[user_id]))
+
+    async def touch(self, room_id, user_id):
+        await self._touch_script(keys=self._keys(room_id), args=[user_id, time.time(), self.ttl * 2])
+
+    async def expire_stale(self, room_id):
+        entries = await self._expire_script(keys=self._keys(room_id), args=[time.time() - self.ttl])
+        return [json.loads(entry) for entry in entries]
+
+    async def members(self, room_id):
+        entries = await self.redis.hvals(self._keys(room_id)[0])
+        return [json.loads(entry) for entry in entries]
+
+
+_store = None
+
+
+def get_presence_store():
+    """
+    The process-wide presence store: Redis when CHAT_PRESENCE['REDIS_URL']
+    is set, else the Django cache
+    """
+    global _store
+    if _store is None:
+        config = chat_presence_settings()
+        if config['REDIS_URL']:
+            _store = RedisPresenceStore(config['REDIS_URL'], config['TTL_SECONDS'])
+        else:
+            _store = CachePresenceStore(config['TTL_SECONDS'])
+    return _store
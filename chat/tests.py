@@ -1,3 +1,293 @@
-from django.test import TestCase
+import asyncio
+import json
+import os
+import time
+import unittest
+import uuid
+from unittest import mock
 
-# Create your tests here.
+from channels.db import database_sync_to_async
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from lms.asgi import application
+from lms.cache import LockTimeout
+
+from .buffer import ChatMessageBuffer
+from .checks import check_presence_store
+from .models import ChatMessage
+from .presence import CachePresenceStore, RedisPresenceStore
+
+try:
+    import fakeredis
+    from fakeredis import aioredis as fake_aioredis
+except ImportError:
+    fakeredis = None
+
+User = get_user_model()
+
+
+def saved_messages():
+    return list(ChatMessage.objects.order_by('id').values_list('room_id', 'user', 'message'))
+
+
+class ChatMessageBufferTests(TransactionTestCase):
+    """Ordering and durability of the write-behind chat buffer"""
+    # Flushing only these tables between tests keeps the suite fast
+    available_apps = ['chat']
+
+    def run_async(self, coroutine):
+        return asyncio.run(coroutine)
+
+    def test_flush_saves_messages_in_order_with_send_times(self):
+        buffer = ChatMessageBuffer(flush_interval=60, max_messages=100)
+
+        async def scenario():
+            for i in range(5):
+                buffer.add('room', f'user{i % 2}', f'message {i}')
+            self.assertEqual(await database_sync_to_async(ChatMessage.objects.count)(), 0)
+            return await buffer.flush()
+
+        self.assertEqual(self.run_async(scenario()), 5)
+
+        self.assertEqual(saved_messages(), [('room', f'user{i % 2}', f'message {i}') for i in range(5)])
+        timestamps = list(ChatMessage.objects.order_by('id').values_list('timestamp', flat=True))
+        self.assertEqual(timestamps, sorted(timestamps))
+        self.assertEqual(len(buffer), 0)
+
+    def test_flushes_when_max_messages_are_waiting(self):
+        buffer = ChatMessageBuffer(flush_interval=60, max_messages=3)
+
+        async def scenario():
+            for i in range(3):
+                buffer.add('room', 'user', f'message {i}')
+            # Wait for the flush scheduled by the third message, not the
+            # interval timer started by the first
+            self.assertEqual(len(buffer._tasks), 2)
+            await asyncio.gather(*(task for task in buffer._tasks if task not in buffer._timers.values()))
+
+        self.run_async(scenario())
+        self.assertEqual(ChatMessage.objects.count(), 3)
+
+    def test_flushes_after_the_interval(self):
+        buffer = ChatMessageBuffer(flush_interval=0.05, max_messages=100)
+
+        async def scenario():
+            buffer.add('room', 'user', 'hello')
+            await asyncio.sleep(0.3)
+
+        self.run_async(scenario())
+        self.assertEqual(saved_messages(), [('room', 'user', 'hello')])
+        # The timer stops once the buffer is empty
+        self.assertEqual(len(buffer._timers), 0)
+
+    def test_failed_flush_keeps_messages_ahead_of_newer_ones(self):
+        buffer = ChatMessageBuffer(flush_interval=60, max_messages=100)
+        bulk_create = ChatMessage.objects.bulk_create
+
+        async def scenario():
+            buffer.add('room', 'user', 'first')
+            buffer.add('room', 'user', 'second')
+            with mock.patch.object(ChatMessage.objects, 'bulk_create', side_effect=Exception('database down')):
+                self.assertEqual(await buffer.flush(), 0)
+            self.assertEqual(len(buffer), 2)
+
+            buffer.add('room', 'user', 'third')
+            with mock.patch.object(ChatMessage.objects, 'bulk_create', wraps=bulk_create) as patched:
+                self.assertEqual(await buffer.flush(), 3)
+                self.assertEqual(patched.call_count, 1)
+
+        self.run_async(scenario())
+        self.assertEqual(
+            [message for _, _, message in saved_messages()],
+            ['first', 'second', 'third']
+        )
+
+    def test_flush_sync_drains_at_shutdown(self):
+        buffer = ChatMessageBuffer(flush_interval=60, max_messages=100)
+
+        async def scenario():
+            buffer.add('room', 'user', 'last words')
+
+        self.run_async(scenario())
+        self.assertEqual(ChatMessage.objects.count(), 0)
+        self.assertEqual(buffer.flush_sync(), 1)
+        self.assertEqual(saved_messages(), [('room', 'user', 'last words')])
+
+
+class VideoConsumerChatTests(TransactionTestCase):
+    """Chat messages are broadcast before they are saved, and saved on disconnect"""
+    available_apps = ['chat', 'authentication']
+
+    def test_broadcast_does_not_wait_for_save_and_disconnect_drains(self):
+        user = User.objects.create_user(
+            username='ann', email='ann@example.com', password='pass', role='student', first_name='Ann'
+        )
+        cookie = f'access={AccessToken.for_user(user)}'.encode()
+        buffer = ChatMessageBuffer(flush_interval=60, max_messages=100)
+
+        async def scenario():
+            communicator = WebsocketCommunicator(
+                application, '/ws/meeting/room1/', headers=[(b'cookie', cookie)]
+            )
+            connected, _ = await communicator.connect()
+            self.assertTrue(connected)
+            roster = json.loads(await communicator.receive_from())
+            self.assertEqual(roster['type'], 'online_users')
+
+            for text in ('one', 'two', 'three'):
+                await communicator.send_to(text_data=json.dumps({'message': text}))
+            received = [json.loads(await communicator.receive_from())['message'] for _ in range(3)]
+            self.assertEqual(received, ['one', 'two', 'three'])
+
+            # Broadcast already happened; the messages are still buffered
+            self.assertEqual(await database_sync_to_async(ChatMessage.objects.count)(), 0)
+            self.assertEqual(len(buffer), 3)
+
+            await communicator.disconnect()
+
+        with mock.patch('chat.consumers.get_message_buffer', return_value=buffer):
+            asyncio.run(scenario())
+
+        self.assertEqual(
+            saved_messages(),
+            [('room1', 'ann', 'one'), ('room1', 'ann', 'two'), ('room1', 'ann', 'three')]
+        )
+
+
+class PresenceStoreTests:
+    """
+    Behaviour shared by the presence stores. Two store instances stand in
+    for two Daphne workers sharing the backend.
+    """
+    TTL = 60
+
+    def make_store(self):
+        raise NotImplementedError
+
+    def setUp(self):
+        self.room = f'room-{uuid.uuid4().hex}'
+        self.worker_a, self.worker_b = self.make_store(), self.make_store()
+
+    def entry(self, name):
+        return {'user_id': name, 'username': name, 'first_name': name.title()}
+
+    def run_async(self, coroutine):
+        return asyncio.run(coroutine)
+
+    def usernames(self, store):
+        return sorted(entry['username'] for entry in self.run_async(store.members(self.room)))
+
+    def test_joins_and_leaves_are_counted_per_connection(self):
+        async def scenario():
+            self.assertTrue(await self.worker_a.join(self.room, self.entry('ann')))
+            # A second tab on another worker is not a second join
+            self.assertFalse(await self.worker_b.join(self.room, self.entry('ann')))
+            self.assertTrue(await self.worker_b.join(self.room, self.entry('bob')))
+
+            self.assertFalse(await self.worker_a.leave(self.room, 'ann'))
+            self.assertTrue(await self.worker_b.leave(self.room, 'ann'))
+            self.assertFalse(await self.worker_b.leave(self.room, 'ann'))
+
+        self.run_async(scenario())
+        self.assertEqual(self.usernames(self.worker_a), ['bob'])
+        self.assertEqual(self.usernames(self.worker_b), ['bob'])
+
+    def test_users_without_heartbeats_expire(self):
+        # Cache expiry reads the same clock, so stay close to the real time
+        now = time.time()
+        with mock.patch('chat.presence.time.time', return_value=now):
+            self.run_async(self.worker_a.join(self.room, self.entry('ann')))
+            self.run_async(self.worker_b.join(self.room, self.entry('bob')))
+
+        with mock.patch('chat.presence.time.time', return_value=now + self.TTL - 1):
+            self.run_async(self.worker_a.touch(self.room, 'ann'))
+        with mock.patch('chat.presence.time.time', return_value=now + self.TTL + 1):
+            expired = self.run_async(self.worker_a.expire_stale(self.room))
+            # Only one worker reports a user as gone
+            self.assertEqual(self.run_async(self.worker_b.expire_stale(self.room)), [])
+
+        self.assertEqual(expired, [self.entry('bob')])
+        self.assertEqual(self.usernames(self.worker_b), ['ann'])
+
+    def test_touch_does_not_bring_back_users_who_left(self):
+        async def scenario():
+            await self.worker_a.join(self.room, self.entry('ann'))
+            await self.worker_a.leave(self.room, 'ann')
+            await self.worker_b.touch(self.room, 'ann')
+            return await self.worker_b.members(self.room)
+
+        self.assertEqual(self.run_async(scenario()), [])
+
+
+class CachePresenceStoreTests(PresenceStoreTests, SimpleTestCase):
+
+    def make_store(self):
+        return CachePresenceStore(ttl=self.TTL)
+
+    def setUp(self):
+        cache.clear()
+        super().setUp()
+
+    def test_busy_room_is_not_taken_over(self):
+        store = self.make_store()
+        store.LOCK_TIMEOUT = 0.1
+        lock_key = f"{store._key('room')}:lock"
+        cache.set(lock_key, 'holder', 60)
+
+        with self.assertRaises(LockTimeout):
+            self.run_async(store.touch('room', 'user'))
+        self.assertEqual(cache.get(lock_key), 'holder')
+
+
+@unittest.skipIf(fakeredis is None, 'fakeredis[lua] is not installed')
+class RedisPresenceStoreTests(PresenceStoreTests, SimpleTestCase):
+    """The Lua scripts against fakeredis (pip install "fakeredis[lua]")"""
+
+    def setUp(self):
+        self.server = fakeredis.FakeServer()
+        super().setUp()
+
+    def make_store(self):
+        # Each store gets its own client of the one fake server
+        client = fake_aioredis.FakeRedis(server=self.server, decode_responses=True)
+        with mock.patch('redis.asyncio.Redis.from_url', return_value=client):
+            return RedisPresenceStore('redis://fake', ttl=self.TTL)
+
+
+@unittest.skipUnless(os.environ.get('REDIS_URL'), 'REDIS_URL is not set')
+class LiveRedisPresenceStoreTests(PresenceStoreTests, SimpleTestCase):
+    """The Lua scripts against the Redis at REDIS_URL"""
+
+    def make_store(self):
+        return RedisPresenceStore(os.environ['REDIS_URL'], ttl=self.TTL)
+
+    def run_async(self, coroutine):
+        # Redis clients are bound to the loop they first ran on
+        async def scenario():
+            try:
+                return await coroutine
+            finally:
+                for store in (self.worker_a, self.worker_b):
+                    await store.redis.aclose()
+                    store.redis.connection_pool.reset()
+        return asyncio.run(scenario())
+
+
+class PresenceStoreCheckTests(SimpleTestCase):
+    """Presence needs Redis or a shared cache once there are several workers"""
+
+    def check(self, redis_url=None, backend='locmem.LocMemCache'):
+        with override_settings(
+            CHAT_PRESENCE={'REDIS_URL': redis_url},
+            CACHES={'default': {'BACKEND': f'django.core.cache.backends.{backend}'}},
+        ):
+            return [warning.id for warning in check_presence_store(None)]
+
+    def test_warns_without_a_shared_store(self):
+        self.assertEqual(self.check(), ['chat.W001'])
+        self.assertEqual(self.check(redis_url='redis://localhost:6379/1'), [])
+        self.assertEqual(self.check(backend='redis.RedisCache'), [])
@@ -8,7 +8,8 @@ from .models import (
     EmailLog,
     EmailPreference,
     WeeklyProgressReport,
-    EmailQueue
+    EmailQueue,
+    EmailEngagementStats
 )
 
 
@@ -165,7 +166,7 @@ class EmailQueueAdmin(admin.ModelAdmin):
     search_fields = ['recipient__email', 'subject']
     readonly_fields = [
         'recipient', 'email_type', 'subject', 'content',
-        'context_data', 'created_at'
+        'context_data', 'claimed_at', 'created_at'
     ]
     
     def recipient_email(self, obj):
@@ -207,3 +208,14 @@ class EmailQueueAdmin(admin.ModelAdmin):
         updated = queryset.update(retry_count=0)
         self.message_user(request, f'Retry count reset for {updated} emails.')
     reset_retry_count.short_description = 'Reset retry count for selected emails'
+
+
+@admin.register(EmailEngagementStats)
+class EmailEngagementStatsAdmin(admin.ModelAdmin):
+    list_display = [
+        'email_type', 'sent_count', 'opened_count', 'clicked_count',
+        'open_rate', 'click_rate', 'updated_at'
+    ]
+    readonly_fields = [
+        'email_type', 'sent_count', 'opened_count', 'clicked_count', 'updated_at'
+    ]
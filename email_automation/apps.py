@@ -6,4 +6,5 @@ class EmailAutomationConfig(AppConfig):
     name = 'email_automation'
 
     def ready(self):
+        import email_automation.checks
         import email_automation.signals
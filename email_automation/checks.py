@@ -0,0 +1,26 @@
+# email_automation/checks.py
+
+from django.conf import settings
+from django.core.checks import Warning, register
+
+from lms.cache import PROCESS_LOCAL_CACHES
+
+
+@register()
+def check_rate_limit_cache(app_configs, **kwargs):
+    """
+    The EMAIL_RATE_LIMITS token buckets live in the default cache; a
+    per-process cache gives every worker its own full bucket
+    """
+    backend = getattr(settings, 'CACHES', {}).get('default', {}).get('BACKEND', '')
+    if backend not in PROCESS_LOCAL_CACHES:
+        return []
+    return [
+        Warning(
+            f"The default cache ({backend.rsplit('.', 1)[-1]}) is not shared between processes, "
+            "so each web and Celery worker enforces EMAIL_RATE_LIMITS on its own and the "
+            "combined send rate can exceed the provider's limits.",
+            hint="Set REDIS_URL to use a shared Redis cache.",
+            id='email_automation.W001',
+        )
+    ]
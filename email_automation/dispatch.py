@@ -0,0 +1,32 @@
+# email_automation/dispatch.py
+from functools import partial
+
+from django.conf import settings
+from django.db import transaction
+
+from .tasks import send_mail_task
+
+
+def enqueue_on_commit(task, *args, **kwargs):
+    """
+    Queue a Celery task once the current transaction commits (right away
+    outside of one), so the worker sees the committed rows and a rolled
+    back request sends nothing
+    """
+    transaction.on_commit(partial(task.delay, *args, **kwargs))
+
+
+def send_mail_async(subject, message, from_email, recipient_list, fail_silently=False, html_message=None):
+    """
+    Drop-in for django.core.mail.send_mail that hands the SMTP work to
+    the email queue instead of doing it in the request
+    """
+    enqueue_on_commit(
+        send_mail_task,
+        subject,
+        message,
+        from_email or settings.DEFAULT_FROM_EMAIL,
+        list(recipient_list),
+        fail_silently=fail_silently,
+        html_message=html_message
+    )
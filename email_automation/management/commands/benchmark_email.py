@@ -0,0 +1,275 @@
+import socketserver
+import threading
+import time
+import tracemalloc
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.backends.signals import connection_created
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from authentication.models import StudentProfile
+from courses.models import Course, Enrollment, Progress, Video
+from email_automation.models import EmailQueue, EmailTemplate, WeeklyProgressReport
+from email_automation.services import EmailService, EmailTemplateService, template_cache
+from email_automation.tasks import generate_weekly_progress_reports, process_email_queue
+
+User = get_user_model()
+
+SCENARIOS = ['bulk', 'queue', 'weekly']
+
+
+class SMTPSinkHandler(socketserver.StreamRequestHandler):
+    """Speaks just enough SMTP to accept and discard messages"""
+
+    def reply(self, line):
+        self.wfile.write(f"{line}\r\n".encode())
+
+    def handle(self):
+        sink = self.server
+        self.reply('220 localhost SMTP sink')
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode(errors='replace').strip().upper()
+
+            if command.startswith('EHLO'):
+                self.reply('250-localhost')
+                self.reply('250-8BITMIME')
+                self.reply('250 SMTPUTF8')
+            elif command.startswith('DATA'):
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                while self.rfile.readline() not in (b'.\r\n', b'.\n', b''):
+                    pass
+                if sink.latency:
+                    time.sleep(sink.latency)
+                with sink.lock:
+                    sink.messages += 1
+                self.reply('250 OK')
+            elif command.startswith('QUIT'):
+                self.reply('221 Bye')
+                return
+            elif command.startswith(('HELO', 'MAIL', 'RCPT', 'RSET', 'NOOP')):
+                self.reply('250 OK')
+            else:
+                self.reply('502 Command not implemented')
+
+
+class SMTPSink(socketserver.ThreadingTCPServer):
+    """
+    In-process SMTP server on a free local port that counts the messages
+    it receives, optionally holding each one for ``latency`` seconds
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, latency=0):
+        super().__init__(('127.0.0.1', 0), SMTPSinkHandler)
+        self.latency = latency
+        self.messages = 0
+        self.lock = threading.Lock()
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.shutdown()
+        self.server_close()
+
+
+class QueryCounter:
+    """Counts queries on every database connection, including worker threads'"""
+
+    def __init__(self):
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        with self.lock:
+            self.count += 1
+        return execute(sql, params, many, context)
+
+    def install(self, sender=None, connection=None, **kwargs):
+        if self not in connection.execute_wrappers:
+            connection.execute_wrappers.append(self)
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark the email pipeline against a local SMTP sink in a throwaway '
+        'test database, reporting emails/sec, queries per email and peak memory'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--users',
+            type=int,
+            default=500,
+            help='Number of students to seed (each enrolled in the benchmark course)',
+        )
+        parser.add_argument(
+            '--scenario',
+            action='append',
+            choices=SCENARIOS,
+            help='Scenario to run (repeatable, default: all)',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=None,
+            help='Sender threads for the queue scenario (default: EMAIL_QUEUE_WORKERS)',
+        )
+        parser.add_argument(
+            '--latency',
+            type=float,
+            default=0,
+            help='Seconds the sink holds each message, to mimic a remote provider',
+        )
+        parser.add_argument(
+            '--paced',
+            action='store_true',
+            help='Keep EMAIL_RATE_LIMITS instead of lifting them for the run',
+        )
+
+    def handle(self, *args, **options):
+        if options['users'] < 1:
+            raise CommandError('--users must be at least 1')
+        scenarios = options['scenario'] or SCENARIOS
+
+        self.stdout.write('Creating benchmark database...')
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            with SMTPSink(latency=options['latency']) as sink:
+                overrides = {
+                    'EMAIL_BACKEND': 'django.core.mail.backends.smtp.EmailBackend',
+                    'EMAIL_HOST': '127.0.0.1',
+                    'EMAIL_PORT': sink.port,
+                    'EMAIL_USE_TLS': False,
+                    'EMAIL_USE_SSL': False,
+                    'EMAIL_HOST_USER': '',
+                    'EMAIL_HOST_PASSWORD': '',
+                    # Tasks fanned out by the scenarios run in-process; the
+                    # Celery app reads its CELERY_ settings from Django
+                    'CELERY_TASK_ALWAYS_EAGER': True,
+                }
+                if not options['paced']:
+                    overrides['EMAIL_RATE_LIMITS'] = {
+                        'PROVIDER_RATE': 10 ** 6,
+                        'PROVIDER_BURST': 10 ** 6,
+                        'DOMAIN_RATE': 10 ** 6,
+                        'DOMAIN_BURST': 10 ** 6,
+                    }
+                with override_settings(**overrides):
+                    template_cache.invalidate()
+                    users, course = self.seed(options['users'])
+
+                    self.stdout.write(
+                        f"\n{'scenario':<10}{'emails':>8}{'seconds':>10}{'emails/s':>10}"
+                        f"{'queries':>9}{'q/email':>9}{'peak MB':>9}"
+                    )
+                    for scenario in scenarios:
+                        runner = getattr(self, f'run_{scenario}')
+                        self.report(scenario, sink, lambda: runner(users, course, options))
+        finally:
+            template_cache.invalidate()
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def seed(self, count):
+        """Seed templates, a course with videos and ``count`` enrolled students"""
+        EmailTemplateService.create_default_templates()
+
+        teacher = User.objects.create_user(
+            username='bench_teacher', email='bench_teacher@example.com', password='bench', role='teacher'
+        )
+        course = Course.objects.create(
+            title='Benchmark Course', description='Benchmark', teacher=teacher.teacher_profile,
+            price=0, course_type='free'
+        )
+        videos = Video.objects.bulk_create(
+            [Video(course=course, title=f'Video {i}', video_file='benchmark.mp4') for i in range(5)]
+        )
+
+        # bulk_create skips the profile signal, so profiles are created explicitly
+        password = make_password('bench')
+        users = User.objects.bulk_create([
+            User(
+                username=f'bench_{i}', email=f'bench_{i}@example{i % 10}.com',
+                password=password, role='student'
+            )
+            for i in range(count)
+        ], batch_size=1000)
+        profiles = StudentProfile.objects.bulk_create([
+            StudentProfile(user=user, email=user.email, full_name=user.username)
+            for user in users
+        ], batch_size=1000)
+        Enrollment.objects.bulk_create(
+            [Enrollment(student=profile, course=course) for profile in profiles], batch_size=1000
+        )
+        Progress.objects.bulk_create([
+            Progress(student=profile, course=course, video=videos[i % len(videos)])
+            for i, profile in enumerate(profiles)
+        ], batch_size=1000)
+
+        self.stdout.write(f'Seeded {count} students, {EmailTemplate.objects.count()} templates')
+        return users, course
+
+    def report(self, scenario, sink, run):
+        counter = QueryCounter()
+        counter.install(connection=connection)
+        connection_created.connect(counter.install)
+        sent_before = sink.messages
+
+        tracemalloc.start()
+        started = time.perf_counter()
+        try:
+            run()
+        finally:
+            elapsed = time.perf_counter() - started
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            connection_created.disconnect(counter.install)
+            if counter in connection.execute_wrappers:
+                connection.execute_wrappers.remove(counter)
+
+        emails = sink.messages - sent_before
+        self.stdout.write(
+            f"{scenario:<10}{emails:>8}{elapsed:>10.2f}{emails / elapsed if elapsed else 0:>10.1f}"
+            f"{counter.count:>9}{counter.count / emails if emails else 0:>9.1f}{peak / 2 ** 20:>9.1f}"
+        )
+
+    def run_bulk(self, users, course, options):
+        EmailService().send_bulk_email(users, 'new_content', course=course)
+
+    def run_queue(self, users, course, options):
+        due = timezone.now() - timedelta(minutes=1)
+        priorities = [choice for choice, _ in EmailQueue.PRIORITY_CHOICES]
+        EmailQueue.objects.bulk_create([
+            EmailQueue(
+                recipient=user, email_type='new_content', subject='Benchmark', content='Benchmark',
+                priority=priorities[i % len(priorities)],
+                priority_level=EmailQueue.PRIORITY_LEVELS[priorities[i % len(priorities)]],
+                scheduled_at=due
+            )
+            for i, user in enumerate(users)
+        ], batch_size=1000)
+        batch_size = getattr(settings, 'EMAIL_QUEUE_BATCH_SIZE', 50)
+        process_email_queue(
+            workers=options['workers'],
+            max_batches=len(users) // batch_size + 1
+        )
+
+    def run_weekly(self, users, course, options):
+        WeeklyProgressReport.objects.all().delete()
+        generate_weekly_progress_reports()
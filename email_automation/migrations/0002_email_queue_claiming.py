@@ -0,0 +1,47 @@
+# Generated by Django 5.2.1 on 2026-10-19 05:03
+
+from django.conf import settings
+from django.db import migrations, models
+
+PRIORITY_LEVELS = {
+    'urgent': 0,
+    'high': 1,
+    'normal': 2,
+    'low': 3,
+}
+
+
+def populate_priority_levels(apps, schema_editor):
+    EmailQueue = apps.get_model('email_automation', 'EmailQueue')
+    for priority, level in PRIORITY_LEVELS.items():
+        EmailQueue.objects.filter(priority=priority).update(priority_level=level)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('email_automation', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='emailqueue',
+            options={'ordering': ['priority_level', 'scheduled_at']},
+        ),
+        migrations.AddField(
+            model_name='emailqueue',
+            name='claimed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='emailqueue',
+            name='priority_level',
+            field=models.PositiveSmallIntegerField(default=2, editable=False),
+        ),
+        migrations.RunPython(populate_priority_levels, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='emailqueue',
+            index=models.Index(condition=models.Q(('is_processed', False)), fields=['priority_level', 'scheduled_at'], name='email_queue_pending_idx'),
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.1 on 2026-10-19 05:13
+
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def populate_engagement_stats(apps, schema_editor):
+    EmailLog = apps.get_model('email_automation', 'EmailLog')
+    EmailEngagementStats = apps.get_model('email_automation', 'EmailEngagementStats')
+    rows = EmailLog.objects.values('email_type').annotate(
+        sent=Count('id', filter=Q(sent_at__isnull=False) | Q(status__in=['sent', 'delivered', 'opened', 'clicked'])),
+        opened=Count('id', filter=Q(opened_at__isnull=False)),
+        clicked=Count('id', filter=Q(clicked_at__isnull=False)),
+    )
+    EmailEngagementStats.objects.bulk_create([
+        EmailEngagementStats(
+            email_type=row['email_type'],
+            sent_count=row['sent'],
+            opened_count=row['opened'],
+            clicked_count=row['clicked'],
+        )
+        for row in rows
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('email_automation', '0002_email_queue_claiming'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EmailEngagementStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('email_type', models.CharField(choices=[('enrollment', 'Course Enrollment'), ('demo_completed', 'Post-Demo Class'), ('payment_confirmation', 'Payment Confirmation'), ('weekly_progress', 'Weekly Progress'), ('new_content', 'New Content Notification')], max_length=20, unique=True)),
+                ('sent_count', models.PositiveIntegerField(default=0)),
+                ('opened_count', models.PositiveIntegerField(default=0)),
+                ('clicked_count', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'email_engagement_stats',
+            },
+        ),
+        migrations.RunPython(populate_engagement_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.1 on 2026-10-19 06:12
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('email_automation', '0003_email_engagement_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EmailTrackingEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('log_id', models.BigIntegerField()),
+                ('event', models.CharField(choices=[('open', 'Open'), ('click', 'Click')], max_length=5)),
+                ('occurred_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'db_table': 'email_tracking_events',
+                'ordering': ['id'],
+            },
+        ),
+    ]
@@ -3,6 +3,7 @@ from django.db import models
 from django.contrib.auth import get_user_model
 from django.utils import timezone
 from courses.models import Course, Enrollment
+from lms.db import increment_or_create
 from payments.models import Payment
 
 User = get_user_model()
@@ -71,6 +72,74 @@ class EmailLog(models.Model):
         ordering = ['-created_at']
 
 
+class EmailEngagementStats(models.Model):
+    """
+    Running sent/opened/clicked totals per email type, so open and click
+    rates don't require scanning EmailLog. Opens and clicks count once per
+    email (the first one recorded).
+    """
+    email_type = models.CharField(max_length=20, choices=EmailTemplate.EMAIL_TYPES, unique=True)
+    sent_count = models.PositiveIntegerField(default=0)
+    opened_count = models.PositiveIntegerField(default=0)
+    clicked_count = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"Engagement for {self.email_type} emails"
+    
+    @property
+    def open_rate(self):
+        if not self.sent_count:
+            return 0
+        return round(self.opened_count / self.sent_count * 100, 2)
+    
+    @property
+    def click_rate(self):
+        if not self.sent_count:
+            return 0
+        return round(self.clicked_count / self.sent_count * 100, 2)
+    
+    @classmethod
+    def add(cls, email_type, sent=0, opened=0, clicked=0):
+        """Add to the totals of an email type, creating its row if needed"""
+        if not sent and not opened and not clicked:
+            return
+        
+        increment_or_create(
+            cls,
+            {'email_type': email_type},
+            {'sent_count': sent, 'opened_count': opened, 'clicked_count': clicked},
+            updated_at=timezone.now()
+        )
+    
+    class Meta:
+        db_table = 'email_engagement_stats'
+
+
+class EmailTrackingEvent(models.Model):
+    """
+    Open or click waiting to be applied to its EmailLog. The tracking
+    endpoints only insert here; flush_tracking_events applies the rows in
+    bulk and deletes them.
+    """
+    EVENT_CHOICES = [
+        ('open', 'Open'),
+        ('click', 'Click'),
+    ]
+    
+    # Not a foreign key: the log may be purged before its events are flushed
+    log_id = models.BigIntegerField()
+    event = models.CharField(max_length=5, choices=EVENT_CHOICES)
+    occurred_at = models.DateTimeField(default=timezone.now)
+    
+    def __str__(self):
+        return f"{self.event} of email log {self.log_id}"
+    
+    class Meta:
+        db_table = 'email_tracking_events'
+        ordering = ['id']
+
+
 class EmailPreference(models.Model):
     """User email preferences and unsubscribe management"""
     user = models.OneToOneField(User, on_delete=models.CASCADE)
@@ -164,11 +233,20 @@ class EmailQueue(models.Model):
         ('urgent', 'Urgent'),
     ]
     
+    # Sort rank of each priority, most urgent first
+    PRIORITY_LEVELS = {
+        'urgent': 0,
+        'high': 1,
+        'normal': 2,
+        'low': 3,
+    }
+    
     recipient = models.ForeignKey(User, on_delete=models.CASCADE)
     email_type = models.CharField(max_length=20, choices=EmailTemplate.EMAIL_TYPES)
     subject = models.CharField(max_length=200)
     content = models.TextField()
     priority = models.CharField(max_length=10, choices=PRIORITY_CHOICES, default='normal')
+    priority_level = models.PositiveSmallIntegerField(default=2, editable=False)
     
     # Scheduling
     scheduled_at = models.DateTimeField()
@@ -181,12 +259,29 @@ class EmailQueue(models.Model):
     # Status
     is_processed = models.BooleanField(default=False)
     processed_at = models.DateTimeField(null=True, blank=True)
+    # Set while a worker is sending the entry; stale claims expire
+    claimed_at = models.DateTimeField(null=True, blank=True)
     
     created_at = models.DateTimeField(auto_now_add=True)
     
     def __str__(self):
         return f"Queued email: {self.email_type} to {self.recipient.email}"
     
+    def save(self, *args, **kwargs):
+        self.priority_level = self.PRIORITY_LEVELS.get(self.priority, self.PRIORITY_LEVELS['normal'])
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'priority' in update_fields:
+            kwargs['update_fields'] = set(update_fields) | {'priority_level'}
+        super().save(*args, **kwargs)
+    
     class Meta:
         db_table = 'email_queue'
-        ordering = ['priority', 'scheduled_at']
+        ordering = ['priority_level', 'scheduled_at']
+        indexes = [
+            # Only unprocessed rows are ever claimed, so keep the index small
+            models.Index(
+                fields=['priority_level', 'scheduled_at'],
+                condition=models.Q(is_processed=False),
+                name='email_queue_pending_idx'
+            ),
+        ]
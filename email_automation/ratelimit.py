@@ -0,0 +1,206 @@
+# email_automation/ratelimit.py
+import logging
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from lms.cache import CacheLock
+from lms.conf import merged_settings
+
+from .models import EmailQueue
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_EMAIL_RATE_LIMITS = {
+    'PROVIDER_RATE': 5,
+    'PROVIDER_BURST': 20,
+    'DOMAIN_RATE': 2,
+    'DOMAIN_BURST': 10,
+    'DOMAIN_LIMITS': {},
+    'MAX_WAIT_SECONDS': 30,
+}
+
+# Per-minute send/throttle counters are kept this long
+METRICS_TTL = 180
+
+
+def email_rate_limits():
+    """Provider and per-domain send rates (EMAIL_RATE_LIMITS)"""
+    return merged_settings('EMAIL_RATE_LIMITS', DEFAULT_EMAIL_RATE_LIMITS)
+
+
+class TokenBucket:
+    """
+    Token bucket whose state lives in the Django cache, so every worker
+    sharing the cache draws from the same bucket. It holds up to
+    ``capacity`` tokens and refills at ``rate`` tokens per second.
+
+    Updates are serialized with a CacheLock held for a few cache calls,
+    far less than its timeout.
+    """
+    LOCK_TIMEOUT = 5
+    LOCK_WAIT = 1
+
+    def __init__(self, key, rate, capacity):
+        self.key = key
+        self.lock = CacheLock(f"{key}:lock", self.LOCK_TIMEOUT)
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        # Long enough that an idle bucket is full again when it expires
+        self.ttl = int(self.capacity / self.rate) + 60
+
+    def _level(self, state, now):
+        if not state:
+            return self.capacity
+        tokens, updated_at = state
+        return min(self.capacity, tokens + max(0, now - updated_at) * self.rate)
+
+    def available(self):
+        """Tokens currently in the bucket"""
+        return self._level(cache.get(self.key), time.time())
+
+    def take(self, tokens=1):
+        """
+        Take ``tokens`` from the bucket if they are available
+
+        Returns:
+            float: 0 if taken, else seconds until enough tokens accumulate
+        """
+        lock_token = self.lock.acquire(self.LOCK_WAIT)
+        if lock_token is None:
+            return 1 / self.rate
+        try:
+            now = time.time()
+            level = self._level(cache.get(self.key), now)
+            if level >= tokens:
+                cache.set(self.key, (level - tokens, now), self.ttl)
+                return 0.0
+            cache.set(self.key, (level, now), self.ttl)
+            return (tokens - level) / self.rate
+        finally:
+            self.lock.release(lock_token)
+
+    def refund(self, tokens=1):
+        """Put back tokens taken for a send that did not happen"""
+        lock_token = self.lock.acquire(self.LOCK_WAIT)
+        if lock_token is None:
+            return
+        try:
+            now = time.time()
+            level = self._level(cache.get(self.key), now)
+            cache.set(self.key, (min(self.capacity, level + tokens), now), self.ttl)
+        finally:
+            self.lock.release(lock_token)
+
+
+class SendRateGovernor:
+    """
+    Paces outbound email across all workers: one token bucket for the
+    SMTP provider and one per recipient domain (see EMAIL_RATE_LIMITS).
+
+    Usage:
+        governor = SendRateGovernor()
+        if governor.wait(user.email):
+            ...send...
+    """
+
+    def __init__(self, provider=None):
+        self.limits = email_rate_limits()
+        self.provider = provider or getattr(settings, 'EMAIL_HOST', 'default')
+        self.provider_bucket = TokenBucket(
+            f"email_rate:provider:{self.provider}",
+            self.limits['PROVIDER_RATE'],
+            self.limits['PROVIDER_BURST']
+        )
+        self._domain_buckets = {}
+
+    def domain_bucket(self, domain):
+        bucket = self._domain_buckets.get(domain)
+        if bucket is None:
+            limits = self.limits['DOMAIN_LIMITS'].get(domain, {})
+            bucket = TokenBucket(
+                f"email_rate:domain:{self.provider}:{domain}",
+                limits.get('RATE', self.limits['DOMAIN_RATE']),
+                limits.get('BURST', self.limits['DOMAIN_BURST'])
+            )
+            self._domain_buckets[domain] = bucket
+        return bucket
+
+    def acquire(self, to_email):
+        """
+        Take a send slot for ``to_email`` from the domain and provider buckets
+
+        Returns:
+            float: 0 if the send may go now, else seconds to wait
+        """
+        domain = to_email.rsplit('@', 1)[-1].lower()
+        domain_bucket = self.domain_bucket(domain)
+
+        delay = domain_bucket.take()
+        if delay:
+            return delay
+
+        delay = self.provider_bucket.take()
+        if delay:
+            # Don't spend the domain's token on a send that has to wait
+            domain_bucket.refund()
+        return delay
+
+    def wait(self, to_email, max_wait=None):
+        """
+        Block until ``to_email`` may be sent
+
+        Returns:
+            bool: False if that would take longer than ``max_wait`` seconds
+        """
+        if max_wait is None:
+            max_wait = self.limits['MAX_WAIT_SECONDS']
+        deadline = time.monotonic() + max_wait
+
+        while True:
+            delay = self.acquire(to_email)
+            if not delay:
+                self._count('sent')
+                return True
+            if time.monotonic() + delay > deadline:
+                self._count('throttled')
+                logger.info(f"Email to {to_email} throttled, next slot in {delay:.1f}s")
+                return False
+            time.sleep(delay)
+
+    def _metric_key(self, metric, minute):
+        return f"email_rate:{metric}:{self.provider}:{minute}"
+
+    def _count(self, metric):
+        key = self._metric_key(metric, int(time.time() // 60))
+        cache.add(key, 0, METRICS_TTL)
+        try:
+            cache.incr(key)
+        except ValueError:
+            # Expired between add and incr
+            cache.set(key, 1, METRICS_TTL)
+
+    def metrics(self):
+        """Current pacing state, recent throughput and queue backlog"""
+        minute = int(time.time() // 60)
+        counts = {
+            f"{metric}_{label}": cache.get(self._metric_key(metric, key_minute), 0)
+            for metric in ('sent', 'throttled')
+            for label, key_minute in (('this_minute', minute), ('last_minute', minute - 1))
+        }
+
+        now = timezone.now()
+        pending = EmailQueue.objects.filter(is_processed=False)
+
+        return {
+            'provider': self.provider,
+            'provider_rate': self.provider_bucket.rate,
+            'provider_burst': self.provider_bucket.capacity,
+            'available_tokens': round(self.provider_bucket.available(), 2),
+            **counts,
+            'throughput_per_second': round(counts['sent_last_minute'] / 60, 2),
+            'queue_backlog': pending.filter(scheduled_at__lte=now).count(),
+            'queue_scheduled': pending.filter(scheduled_at__gt=now).count(),
+        }
@@ -0,0 +1,122 @@
+# email_automation/retention.py
+import gzip
+import json
+import logging
+import os
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Min, Q
+from django.utils import timezone
+
+from lms.conf import merged_settings
+
+from .models import EmailLog, EmailQueue
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_EMAIL_RETENTION = {
+    'LOG_DAYS': 90,
+    'QUEUE_DAYS': 30,
+    'BATCH_SIZE': 1000,
+    'TIME_BUDGET_SECONDS': 60,
+    'ARCHIVE': False,
+    'ARCHIVE_ROOT': os.path.join(settings.BASE_DIR, 'email_archive'),
+}
+
+
+def email_retention_settings():
+    """Retention periods and archive options (EMAIL_RETENTION)"""
+    return merged_settings('EMAIL_RETENTION', DEFAULT_EMAIL_RETENTION)
+
+
+def archive_rows(model, rows, storage):
+    """
+    Write rows (dicts) to a gzip'd JSONL file named after the table and
+    their primary key range
+
+    Returns:
+        str: Name of the stored file
+    """
+    lines = ''.join(json.dumps(row, cls=DjangoJSONEncoder) + '\n' for row in rows)
+    pk_name = model._meta.pk.attname
+    name = (
+        f"{model._meta.db_table}/{timezone.now():%Y%m%dT%H%M%S}-"
+        f"{rows[0][pk_name]}-{rows[-1][pk_name]}.jsonl.gz"
+    )
+    return storage.save(name, ContentFile(gzip.compress(lines.encode('utf-8'))))
+
+
+def purge_expired(model, expired, cutoff, batch_size, deadline, archive=False, storage=None):
+    """
+    Delete rows matching the ``expired`` filter from ``model`` in bounded
+    primary key ranges, oldest first, until ``deadline`` (time.monotonic)
+
+    Each range is its own short transaction deleted with a single DELETE
+    (no cascades to collect), so locks are held briefly. Rows are
+    numbered in creation order, so the walk stops at the first range
+    created entirely after ``cutoff``. With ``archive`` every batch is
+    written to compressed JSONL before it is deleted.
+
+    Returns:
+        int: Number of rows deleted
+    """
+    pk_name = model._meta.pk.attname
+    ordered_pks = model.objects.order_by('pk').values_list('pk', flat=True)
+
+    deleted = 0
+    start = ordered_pks.first()
+    while start is not None and time.monotonic() < deadline:
+        window = model.objects.filter(pk__gte=start, pk__lt=start + batch_size)
+
+        oldest = window.aggregate(oldest=Min('created_at'))['oldest']
+        if oldest is None or oldest >= cutoff:
+            break
+
+        with transaction.atomic():
+            batch = window.filter(expired)
+            if archive:
+                rows = list(batch.order_by('pk').values())
+                if rows:
+                    name = archive_rows(model, rows, storage)
+                    logger.info(f"Archived {len(rows)} {model._meta.db_table} rows to {name}")
+                    # Delete exactly what was archived
+                    batch = model.objects.filter(pk__in=[row[pk_name] for row in rows])
+            deleted += batch.delete()[0]
+
+        start = ordered_pks.filter(pk__gte=start + batch_size).first()
+
+    return deleted
+
+
+def purge_email_history(config=None):
+    """
+    Apply email retention: EmailLog rows older than LOG_DAYS and processed
+    EmailQueue rows older than QUEUE_DAYS, within one shared time budget
+
+    Returns:
+        dict: Rows deleted per table
+    """
+    config = config or email_retention_settings()
+    now = timezone.now()
+    deadline = time.monotonic() + config['TIME_BUDGET_SECONDS']
+    storage = FileSystemStorage(location=config['ARCHIVE_ROOT']) if config['ARCHIVE'] else None
+
+    log_cutoff = now - timedelta(days=config['LOG_DAYS'])
+    queue_cutoff = now - timedelta(days=config['QUEUE_DAYS'])
+
+    return {
+        'email_logs': purge_expired(
+            EmailLog, Q(created_at__lt=log_cutoff), log_cutoff,
+            config['BATCH_SIZE'], deadline, config['ARCHIVE'], storage
+        ),
+        'email_queue': purge_expired(
+            EmailQueue, Q(is_processed=True, processed_at__lt=queue_cutoff), queue_cutoff,
+            config['BATCH_SIZE'], deadline, config['ARCHIVE'], storage
+        ),
+    }
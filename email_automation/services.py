@@ -1,22 +1,287 @@
 import logging
+import re
+import smtplib
+import threading
+import time
+from collections import OrderedDict, defaultdict
 from typing import Dict, Any, Optional, List
-from django.core.mail import EmailMultiAlternatives
+from django.core.mail import EmailMultiAlternatives, get_connection
 from django.template import Template, Context
 from django.conf import settings
 from django.utils import timezone
 from django.contrib.auth import get_user_model
 
-from .models import EmailTemplate, EmailLog, EmailPreference, EmailQueue
+from .models import EmailTemplate, EmailLog, EmailPreference, EmailQueue, EmailEngagementStats
+from .ratelimit import SendRateGovernor
+from .tracking import add_tracking
 
 User = get_user_model()
 logger = logging.getLogger(__name__)
 
+# Users whose email preferences are loaded per query
+PREFERENCE_CHUNK_SIZE = 1000
+
+# Template tags/variables that reference the recipient
+USER_VARIABLE_RE = re.compile(r'{[{%][^}]*\buser\b')
+# Variable tags, and the names a variable expression reads
+VARIABLE_TAG_RE = re.compile(r'{{(.*?)}}', re.DOTALL)
+STRING_LITERAL_RE = re.compile(r'"[^"]*"|\'[^\']*\'')
+VARIABLE_NAME_RE = re.compile(r'(?<![\w.|])[A-Za-z_]\w*')
+LITERAL_NAMES = {'True', 'False', 'None'}
+# Tags that transform the text inside them or render other templates, so a
+# placeholder can't stand in for a value rendered separately
+UNSPLITTABLE_TAG_RE = re.compile(r'{%\s*(?:autoescape|filter|spaceless|include|extends)\b')
+# Marks where a per-recipient field goes in a pre-rendered part
+FIELD_MARK = '\x1f'
+FIELD_MARK_RE = re.compile(f'{FIELD_MARK}(\\d+){FIELD_MARK}')
+
+
+class CompiledEmailTemplate:
+    """
+    Compiled subject/HTML/text of an EmailTemplate, noting which parts
+    depend on the recipient and so must be rendered per user.
+    
+    When a part mentions the recipient only in ``{{ user... }}`` variables
+    (filters allowed, no other context names), it is also compiled as a
+    layout with those variables swapped for placeholders, plus one small
+    template per variable, so bulk sends can render it once.
+    """
+    PARTS = ('subject', 'html_content', 'text_content')
+    
+    def __init__(self, template: EmailTemplate):
+        self.parts = {}
+        self.per_user = {}
+        self.layouts = {}
+        for part in self.PARTS:
+            source = getattr(template, part)
+            if source:
+                self.parts[part] = Template(source)
+                self.per_user[part] = bool(USER_VARIABLE_RE.search(source))
+                if self.per_user[part]:
+                    layout = self._compile_layout(source)
+                    if layout is not None:
+                        self.layouts[part] = layout
+    
+    @staticmethod
+    def _compile_layout(source: str):
+        """
+        Returns:
+            tuple: (layout template, per-user field templates), or None if
+            the part can't be split this way
+        """
+        fields = []
+        
+        def replace(match):
+            expression = match.group(1).strip()
+            names = set(VARIABLE_NAME_RE.findall(STRING_LITERAL_RE.sub('', expression))) - LITERAL_NAMES
+            if 'user' not in names:
+                return match.group(0)
+            if names != {'user'}:
+                raise ValueError(expression)
+            fields.append(Template(f'{{{{ {expression} }}}}'))
+            return f'{FIELD_MARK}{len(fields) - 1}{FIELD_MARK}'
+        
+        try:
+            layout = VARIABLE_TAG_RE.sub(replace, source)
+        except ValueError:
+            return None
+        if USER_VARIABLE_RE.search(layout) or UNSPLITTABLE_TAG_RE.search(layout):
+            return None
+        return Template(layout), fields
+    
+    def render(self, part: str, context: Dict[str, Any]) -> Optional[str]:
+        if part not in self.parts:
+            return None
+        return self.parts[part].render(Context(context))
+
+
+class BulkEmailRenderer:
+    """
+    Renders one compiled template for many recipients. Parts that don't
+    mention the recipient are rendered once; parts with a layout are
+    rendered once into text segments joined with each recipient's field
+    values; anything else is rendered in full per recipient.
+    
+    Usage:
+        renderer = BulkEmailRenderer(compiled, shared_context)
+        subject, html_content, text_content = renderer.render(user)
+    """
+    
+    def __init__(self, compiled: CompiledEmailTemplate, context: Dict[str, Any]):
+        self.compiled = compiled
+        self.context = context
+        self.static = {}
+        self.segments = {}
+        for part in compiled.parts:
+            if not compiled.per_user[part]:
+                self.static[part] = compiled.render(part, context)
+            elif part in compiled.layouts:
+                layout, fields = compiled.layouts[part]
+                pieces = FIELD_MARK_RE.split(layout.render(Context(context)))
+                # Even pieces are text, odd ones the field each gap takes
+                indexes = [int(index) for index in pieces[1::2]]
+                if all(index < len(fields) for index in indexes):
+                    self.segments[part] = (pieces[0::2], indexes, fields)
+    
+    def render(self, recipient) -> tuple:
+        """
+        Returns:
+            tuple: (subject, html_content, text_content or None)
+        """
+        user_context = None
+        rendered = []
+        for part in CompiledEmailTemplate.PARTS:
+            if part in self.static:
+                rendered.append(self.static[part])
+            elif part in self.segments:
+                texts, indexes, fields = self.segments[part]
+                if user_context is None:
+                    user_context = Context({'user': recipient})
+                values = [fields[index].render(user_context) for index in indexes]
+                pieces = [texts[0]]
+                for value, text in zip(values, texts[1:]):
+                    pieces.append(value)
+                    pieces.append(text)
+                rendered.append(''.join(pieces))
+            elif part in self.compiled.parts:
+                rendered.append(self.compiled.render(part, {**self.context, 'user': recipient}))
+            else:
+                rendered.append(None)
+        return tuple(rendered)
+
+
+class EmailTemplateCache:
+    """
+    In-process cache of active EmailTemplate rows (for ``ttl`` seconds) and
+    an LRU of their compiled templates keyed by (email_type, updated_at).
+    Saving a template invalidates its entries (see signals); other
+    processes pick up the change when their row cache expires, and the
+    new updated_at makes them compile the new version.
+    """
+    
+    def __init__(self, maxsize=64, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._rows = {}
+        self._compiled = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get_template(self, email_type: str) -> Optional[EmailTemplate]:
+        now = time.monotonic()
+        cached = self._rows.get(email_type)
+        if cached and now - cached[1] < self.ttl:
+            return cached[0]
+        
+        template = EmailTemplate.objects.filter(email_type=email_type, is_active=True).first()
+        self._rows[email_type] = (template, now)
+        return template
+    
+    def compile(self, template: EmailTemplate) -> CompiledEmailTemplate:
+        key = (template.email_type, template.updated_at)
+        with self._lock:
+            compiled = self._compiled.get(key)
+            if compiled is not None:
+                self._compiled.move_to_end(key)
+                return compiled
+        
+        compiled = CompiledEmailTemplate(template)
+        with self._lock:
+            self._compiled[key] = compiled
+            while len(self._compiled) > self.maxsize:
+                self._compiled.popitem(last=False)
+        return compiled
+    
+    def invalidate(self, email_type: str = None):
+        """Drop cached rows and compiled templates of a type (or everything)"""
+        with self._lock:
+            if email_type is None:
+                self._rows.clear()
+                self._compiled.clear()
+                return
+            self._rows.pop(email_type, None)
+            for key in [key for key in self._compiled if key[0] == email_type]:
+                del self._compiled[key]
+
+
+template_cache = EmailTemplateCache(
+    maxsize=getattr(settings, 'EMAIL_TEMPLATE_CACHE_SIZE', 64),
+    ttl=getattr(settings, 'EMAIL_TEMPLATE_CACHE_SECONDS', 60)
+)
+
+
+class PooledEmailSender:
+    """
+    Send many messages over a single SMTP connection instead of opening a
+    new session (and TLS handshake) per message. The connection is
+    re-opened once if the server drops it mid-batch. Given a
+    SendRateGovernor, each send first waits for a send slot.
+
+    Usage:
+        with PooledEmailSender(governor=SendRateGovernor()) as sender:
+            for message in messages:
+                sent, error = sender.send(message)
+    """
+    
+    def __init__(self, connection=None, governor=None):
+        self.connection = connection or get_connection()
+        self.governor = governor
+    
+    def __enter__(self):
+        self.connection.open()
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+    
+    def close(self):
+        try:
+            self.connection.close()
+        except Exception as e:
+            logger.warning(f"Error closing email connection: {str(e)}")
+    
+    def send(self, message):
+        """
+        Send one message over the pooled connection
+
+        Returns:
+            tuple: (sent, error message)
+        """
+        if self.governor is not None and not self.governor.wait(message.to[0]):
+            return False, 'Send rate limit exceeded'
+        
+        message.connection = self.connection
+        for attempt in range(2):
+            try:
+                return bool(self.connection.send_messages([message])), ''
+            except smtplib.SMTPServerDisconnected as e:
+                error = e
+            except smtplib.SMTPException as e:
+                # Rejected by the server (e.g. refused recipient): don't retry
+                return False, str(e)
+            except OSError as e:
+                # Socket-level failure
+                error = e
+            except Exception as e:
+                return False, str(e)
+            
+            if attempt:
+                return False, str(error)
+            logger.warning(f"Email connection lost, reconnecting: {str(error)}")
+            self.close()
+            try:
+                self.connection.open()
+            except Exception as e:
+                return False, str(e)
+        return False, 'Failed to send email'
+
 
 class EmailService:
     """Service class for handling email operations"""
     
     def __init__(self):
         self.from_email = getattr(settings, 'DEFAULT_FROM_EMAIL', 'noreply@lms.com')
+        self.batch_size = getattr(settings, 'EMAIL_SEND_BATCH_SIZE', 50)
+        self.governor = SendRateGovernor()
     
     def send_email(
         self,
@@ -25,7 +290,8 @@ class EmailService:
         context: Dict[str, Any] = None,
         course=None,
         enrollment=None,
-        payment=None
+        payment=None,
+        sender: PooledEmailSender = None
     ) -> bool:
         """
         Send an email to a user based on email type
@@ -37,6 +303,7 @@ class EmailService:
             course: Related course object
             enrollment: Related enrollment object
             payment: Related payment object
+            sender: Pooled connection to send over (one per call if omitted)
         
         Returns:
             bool: True if email was sent successfully
@@ -53,23 +320,10 @@ class EmailService:
                 logger.error(f"No template found for email type: {email_type}")
                 return False
             
-            # Prepare context
-            if context is None:
-                context = {}
-            
-            context.update({
-                'user': recipient,
-                'course': course,
-                'enrollment': enrollment,
-                'payment': payment,
-                'site_name': getattr(settings, 'SITE_NAME', 'LMS Platform'),
-                'site_url': getattr(settings, 'SITE_URL', 'http://localhost:8000'),
-            })
-            
             # Render email content
-            subject = self._render_template(template.subject, context)
-            html_content = self._render_template(template.html_content, context)
-            text_content = self._render_template(template.text_content, context) if template.text_content else None
+            subject, html_content, text_content = self._render_email(
+                template, recipient, context, course=course, enrollment=enrollment, payment=payment
+            )
             
             # Create email log entry
             email_log = EmailLog.objects.create(
@@ -82,13 +336,20 @@ class EmailService:
                 payment=payment
             )
             
-            # Send email
-            success = self._send_email_message(
-                recipient.email,
-                subject,
-                html_content,
-                text_content
-            )
+            # Send email (the log keeps the untracked content)
+            tracked_html = add_tracking(html_content, email_log.id)
+            error = "Failed to send email"
+            if sender is not None:
+                success, error = sender.send(
+                    self._build_message(recipient.email, subject, tracked_html, text_content)
+                )
+            else:
+                success = self._send_email_message(
+                    recipient.email,
+                    subject,
+                    tracked_html,
+                    text_content
+                )
             
             # Update log
             if success:
@@ -96,10 +357,13 @@ class EmailService:
                 email_log.sent_at = timezone.now()
             else:
                 email_log.status = 'failed'
-                email_log.error_message = "Failed to send email"
+                email_log.error_message = error or "Failed to send email"
             
             email_log.save()
             
+            if success:
+                EmailEngagementStats.add(email_type, sent=1)
+            
             return success
             
         except Exception as e:
@@ -141,8 +405,9 @@ class EmailService:
         }
         basic_context.update(context)
         
-        subject = self._render_template(template.subject, basic_context)
-        content = self._render_template(template.html_content, basic_context)
+        compiled = template_cache.compile(template)
+        subject = compiled.render('subject', basic_context)
+        content = compiled.render('html_content', basic_context)
         
         return EmailQueue.objects.create(
             recipient=recipient,
@@ -158,29 +423,193 @@ class EmailService:
         self,
         recipients: List[User],
         email_type: str,
-        context: Dict[str, Any] = None
+        context: Dict[str, Any] = None,
+        course=None,
+        batch_size: int = None
     ) -> Dict[str, int]:
         """
         Send bulk emails to multiple users
         
+        The template is rendered once for everyone (see BulkEmailRenderer)
+        and messages are built one at a time as they are sent over a single
+        pooled SMTP connection. EmailLog rows are created and updated once
+        per batch.
+        
         Args:
             recipients: List of users to send email to
             email_type: Type of email
             context: Template context variables
+            course: Related course object
+            batch_size: Emails logged per insert/update (defaults to EMAIL_SEND_BATCH_SIZE)
         
         Returns:
             Dict with success and failure counts
         """
         results = {'success': 0, 'failed': 0}
+        recipients = list(recipients)
         
+        template = self._get_template(email_type)
+        if not template:
+            logger.error(f"No template found for email type: {email_type}")
+            results['failed'] = len(recipients)
+            return results
+        
+        renderer = BulkEmailRenderer(
+            template_cache.compile(template),
+            self._build_context(None, context, course=course)
+        )
+        
+        # Resolve everyone's preferences up front instead of per recipient
+        recipients, opted_out = self.filter_recipients(recipients, email_type)
+        results['failed'] += len(opted_out)
+        if not recipients:
+            return results
+        
+        sender = PooledEmailSender(governor=self.governor)
+        connection_error = None
+        try:
+            sender.connection.open()
+        except Exception as e:
+            logger.error(f"Failed to open email connection for {email_type}: {str(e)}")
+            connection_error = str(e)
+        
+        batch_size = batch_size or self.batch_size
+        try:
+            for start in range(0, len(recipients), batch_size):
+                batch = self._send_bulk_batch(
+                    recipients[start:start + batch_size], email_type, renderer, course,
+                    sender, connection_error
+                )
+                results['success'] += batch['success']
+                results['failed'] += batch['failed']
+        finally:
+            sender.close()
+        
+        return results
+    
+    def _send_bulk_batch(self, recipients, email_type, renderer, course, sender, connection_error=None):
+        """Render, log and send one batch of a bulk email over ``sender``"""
+        results = {'success': 0, 'failed': 0}
+        
+        logs = []
+        text_parts = []
         for recipient in recipients:
-            if self.send_email(recipient, email_type, context):
-                results['success'] += 1
-            else:
+            try:
+                subject, html_content, text_content = renderer.render(recipient)
+            except Exception as e:
+                logger.error(f"Error rendering {email_type} email for {recipient.email}: {str(e)}")
                 results['failed'] += 1
+                continue
+            
+            logs.append(EmailLog(
+                recipient=recipient,
+                email_type=email_type,
+                subject=subject,
+                content=html_content,
+                course=course
+            ))
+            text_parts.append(text_content)
+        
+        if not logs:
+            return results
+        
+        logs = EmailLog.objects.bulk_create(logs)
+        
+        if connection_error:
+            for email_log in logs:
+                self._mark_log(email_log, False, connection_error)
+        else:
+            for email_log, message in zip(logs, self._bulk_messages(logs, text_parts)):
+                sent, error = sender.send(message)
+                self._mark_log(email_log, sent, error)
+        
+        # Outcomes are few (sent, or a handful of errors), so one UPDATE per
+        # outcome is much cheaper than a per-row CASE from bulk_update
+        outcomes = defaultdict(list)
+        for email_log in logs:
+            outcomes[email_log.status, email_log.error_message].append(email_log.id)
+        now = timezone.now()
+        for (status, error_message), log_ids in outcomes.items():
+            EmailLog.objects.filter(id__in=log_ids).update(
+                status=status,
+                sent_at=now if status == 'sent' else None,
+                error_message=error_message,
+                updated_at=now
+            )
+            if status == 'sent':
+                results['success'] += len(log_ids)
+            else:
+                results['failed'] += len(log_ids)
+        
+        EmailEngagementStats.add(email_type, sent=results['success'])
         
         return results
     
+    def _bulk_messages(self, logs, text_parts):
+        """
+        Yield each logged email's message as it is about to be sent, so only
+        one MIME message is held at a time. Tracking links need the log ids,
+        so they are added here, after the insert.
+        """
+        for email_log, text_content in zip(logs, text_parts):
+            yield self._build_message(
+                email_log.recipient.email,
+                email_log.subject,
+                add_tracking(email_log.content, email_log.id),
+                text_content
+            )
+    
+    def _mark_log(self, email_log, sent, error=''):
+        """Set a log's outcome in memory (saved by the caller)"""
+        now = timezone.now()
+        if sent:
+            email_log.status = 'sent'
+            email_log.sent_at = now
+        else:
+            email_log.status = 'failed'
+            email_log.error_message = error or "Failed to send email"
+            logger.error(f"Failed to send email to {email_log.recipient.email}: {email_log.error_message}")
+        email_log.updated_at = now
+    
+    def filter_recipients(self, recipients: List[User], email_type: str):
+        """
+        Split recipients into those who accept ``email_type`` and those who
+        opted out, loading their EmailPreference rows in bulk and creating
+        default preferences for users who have none
+        
+        Returns:
+            tuple: (allowed recipients, opted-out recipients)
+        """
+        recipients = list(recipients)
+        preferences = {}
+        chunk_size = PREFERENCE_CHUNK_SIZE
+        for start in range(0, len(recipients), chunk_size):
+            user_ids = [recipient.pk for recipient in recipients[start:start + chunk_size]]
+            preferences.update(
+                (preference.user_id, preference)
+                for preference in EmailPreference.objects.filter(user_id__in=user_ids)
+            )
+        
+        missing = {recipient.pk for recipient in recipients} - preferences.keys()
+        if missing:
+            EmailPreference.objects.bulk_create(
+                [EmailPreference(user_id=user_id) for user_id in missing],
+                batch_size=chunk_size,
+                ignore_conflicts=True
+            )
+        
+        allowed = []
+        opted_out = []
+        for recipient in recipients:
+            preference = preferences.get(recipient.pk)
+            if preference is None or preference.can_receive_email(email_type):
+                allowed.append(recipient)
+            else:
+                logger.info(f"User {recipient.email} has opted out of {email_type} emails")
+                opted_out.append(recipient)
+        
+        return allowed, opted_out
+    
     def _can_send_email(self, user: User, email_type: str) -> bool:
         """Check if user can receive this type of email"""
         try:
@@ -192,36 +621,71 @@ class EmailService:
             return True
     
     def _get_template(self, email_type: str) -> Optional[EmailTemplate]:
-        """Get email template by type"""
-        try:
-            return EmailTemplate.objects.get(email_type=email_type, is_active=True)
-        except EmailTemplate.DoesNotExist:
-            return None
+        """Get email template by type (cached in-process)"""
+        return template_cache.get_template(email_type)
+    
+    def _build_context(self, recipient, context=None, course=None, enrollment=None, payment=None):
+        """Template context for a recipient"""
+        context = dict(context or {})
+        context.update({
+            'user': recipient,
+            'course': course,
+            'enrollment': enrollment,
+            'payment': payment,
+            'site_name': getattr(settings, 'SITE_NAME', 'LMS Platform'),
+            'site_url': getattr(settings, 'SITE_URL', 'http://localhost:8000'),
+        })
+        return context
+    
+    def _render_email(self, template, recipient, context=None, course=None, enrollment=None, payment=None):
+        """
+        Render a template's subject, HTML and text content for a recipient
+        
+        Returns:
+            tuple: (subject, html_content, text_content or None)
+        """
+        compiled = template_cache.compile(template)
+        context = self._build_context(recipient, context, course, enrollment, payment)
+        
+        return tuple(compiled.render(part, context) for part in CompiledEmailTemplate.PARTS)
     
-    def _render_template(self, template_string: str, context: Dict[str, Any]) -> str:
-        """Render Django template string with context"""
-        template = Template(template_string)
-        return template.render(Context(context))
+    def _build_message(
+        self,
+        to_email: str,
+        subject: str,
+        html_content: str,
+        text_content: str = None,
+        connection=None
+    ) -> EmailMultiAlternatives:
+        """Build a multipart email message"""
+        msg = EmailMultiAlternatives(
+            subject=subject,
+            body=text_content or html_content,
+            from_email=self.from_email,
+            to=[to_email],
+            connection=connection
+        )
+        
+        if html_content:
+            msg.attach_alternative(html_content, "text/html")
+        
+        return msg
     
     def _send_email_message(
         self,
         to_email: str,
         subject: str,
         html_content: str,
-        text_content: str = None
+        text_content: str = None,
+        connection=None
     ) -> bool:
-        """Send the actual email message"""
+        """Send the actual email message, over ``connection`` if given"""
+        if not self.governor.wait(to_email):
+            logger.warning(f"Email to {to_email} not sent: send rate limit exceeded")
+            return False
+        
         try:
-            msg = EmailMultiAlternatives(
-                subject=subject,
-                body=text_content or html_content,
-                from_email=self.from_email,
-                to=[to_email]
-            )
-            
-            if html_content:
-                msg.attach_alternative(html_content, "text/html")
-            
+            msg = self._build_message(to_email, subject, html_content, text_content, connection)
             msg.send()
             return True
             
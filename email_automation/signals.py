@@ -1,13 +1,16 @@
 # email_automation/signals.py
 
 import logging
-from django.db.models.signals import post_save, pre_save
+from django.db.models.signals import post_save, pre_save, post_delete
 from django.dispatch import receiver
 from django.contrib.auth import get_user_model
 
 from courses.models import Enrollment, Video
 from payments.models import Payment
 from meetings.models import Participant
+from .dispatch import enqueue_on_commit
+from .models import EmailTemplate
+from .services import template_cache
 from .tasks import (
     send_enrollment_email,
     send_payment_confirmation_email,
@@ -28,9 +31,10 @@ def handle_enrollment_created(sender, instance, created, **kwargs):
         logger.info(f"New enrollment created: {instance.student.email} -> {instance.course.title}")
         
         # Trigger enrollment email task
-        send_enrollment_email(
-            user_id=instance.student.id,
-            course_id=instance.course.id,
+        enqueue_on_commit(
+            send_enrollment_email,
+            user_id=instance.student.user_id,
+            course_id=instance.course_id,
             enrollment_id=instance.id
         )
 
@@ -51,8 +55,9 @@ def handle_payment_success(sender, instance, created, **kwargs):
                     # Payment status changed from unsuccessful to successful
                     logger.info(f"Payment successful: {instance.user.email} -> {instance.course.title}")
                     
-                    send_payment_confirmation_email(
-                        user_id=instance.user.id,
+                    enqueue_on_commit(
+                        send_payment_confirmation_email,
+                        user_id=instance.user_id,
                         payment_id=instance.id
                     )
             except Payment.DoesNotExist:
@@ -61,8 +66,9 @@ def handle_payment_success(sender, instance, created, **kwargs):
             # New payment created with success=True
             logger.info(f"New successful payment: {instance.user.email} -> {instance.course.title}")
             
-            send_payment_confirmation_email.delay(
-                user_id=instance.user.id,
+            enqueue_on_commit(
+                send_payment_confirmation_email,
+                user_id=instance.user_id,
                 payment_id=instance.id
             )
 
@@ -78,13 +84,26 @@ def handle_demo_class_completion(sender, instance, created, **kwargs):
         if 'demo' in instance.meeting.title.lower():
             logger.info(f"Demo class completed: {instance.user.email} -> {instance.meeting.course.title}")
             
-            send_demo_completed_email.delay(
-                user_id=instance.user.id,
-                course_id=instance.meeting.course.id,
-                meeting_id=instance.meeting.id
+            enqueue_on_commit(
+                send_demo_completed_email,
+                user_id=instance.user_id,
+                course_id=instance.meeting.course_id,
+                meeting_id=instance.meeting_id
             )
 
 
+@receiver(post_save, sender=EmailTemplate)
+@receiver(post_delete, sender=EmailTemplate)
+def invalidate_email_template_cache(sender, instance, **kwargs):
+    """
+    Drop the cached row and compiled versions of an edited template
+    """
+    template_cache.invalidate(instance.email_type)
+
+
+# New content emails go out once per coalesced burst of uploads, when
+# notifications.tasks.deliver_notification_fanout completes; sending them
+# per item from signals like these would undo that.
 # @receiver(post_save, sender=Video)
 # def handle_new_video_added(sender, instance, created, **kwargs):
 #     """
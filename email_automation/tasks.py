@@ -1,22 +1,52 @@
 # email_automations/tasks.py
 import logging
+import smtplib
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timedelta
+from itertools import islice
 from typing import List, Dict, Any
 
 from celery import shared_task
+from django.conf import settings
+from django.core.mail import send_mail
 from django.utils import timezone
 from django.contrib.auth import get_user_model
+from django.db import connection, transaction
 from django.db.models import Count, Q
 
-from courses.models import Course, Enrollment, Progress, Video
+from courses.models import Assignment, Course, Enrollment, Progress, Quiz, Video
 from meetings.models import Meeting, Participant
 from payments.models import Payment
 from .models import EmailQueue, WeeklyProgressReport, EmailPreference
-from .services import EmailService
+from .services import EmailService, PooledEmailSender
+from .retention import purge_email_history
+from .tracking import flush_tracking_events
 
 User = get_user_model()
 logger = logging.getLogger(__name__)
 
+# Enrollments turned into reports per bulk insert
+WEEKLY_REPORT_BATCH_SIZE = 1000
+# Weekly progress emails sent per task
+WEEKLY_REPORT_EMAIL_CHUNK_SIZE = 100
+
+
+@shared_task(autoretry_for=(smtplib.SMTPServerDisconnected, ConnectionError), retry_backoff=True, max_retries=3)
+def send_mail_task(subject, message, from_email, recipient_list, fail_silently=False, html_message=None):
+    """
+    Send a plain django.core.mail email from the worker (see
+    email_automation.dispatch.send_mail_async)
+    """
+    return send_mail(
+        subject,
+        message,
+        from_email,
+        recipient_list,
+        fail_silently=fail_silently,
+        html_message=html_message
+    )
+
 
 @shared_task
 def send_enrollment_email(user_id: int, course_id: int, enrollment_id: int):
@@ -113,53 +143,89 @@ def send_payment_confirmation_email(user_id: int, payment_id: int):
 def generate_weekly_progress_reports():
     """
     Generate weekly progress reports for all enrolled students
+
+    The week's progress is computed with one grouped aggregate over
+    Progress and per-course item totals, reports are bulk inserted (rows
+    that already exist for the week are skipped) and emails are enqueued
+    in chunks.
     """
     try:
         # Get current week boundaries
-        today = timezone.now().date()
+        started_at = timezone.now()
+        today = started_at.date()
         week_start = today - timedelta(days=today.weekday())
         week_end = week_start + timedelta(days=6)
+        week_start_dt = timezone.make_aware(datetime.combine(week_start, datetime.min.time()))
+        week_end_dt = timezone.make_aware(datetime.combine(week_end, datetime.max.time()))
         
         # Get all active enrollments
         enrollments = Enrollment.objects.filter(
             is_completed=False,
             course__is_active=True
-        ).select_related('student', 'course')
-        
-        reports_created = 0
-        
-        for enrollment in enrollments:
-            # Check if report already exists for this week
-            if WeeklyProgressReport.objects.filter(
-                user=enrollment.student,
-                course=enrollment.course,
-                week_start=week_start
-            ).exists():
-                continue
-            
-            # Calculate progress for the week
-            progress_data = calculate_weekly_progress(
-                enrollment.student,
-                enrollment.course,
-                week_start,
-                week_end
-            )
-            
-            # Create progress report
-            report = WeeklyProgressReport.objects.create(
-                user=enrollment.student,
-                course=enrollment.course,
-                week_start=week_start,
-                week_end=week_end,
-                **progress_data,
-                report_generated=True
+        )
+        course_ids = enrollments.values('course_id')
+        
+        # Total items per course, one grouped query per item type
+        totals = defaultdict(dict)
+        for field, model in (('total_videos', Video), ('total_quizzes', Quiz), ('total_assignments', Assignment)):
+            rows = model.objects.filter(course_id__in=course_ids).values('course_id').annotate(total=Count('id'))
+            for row in rows:
+                totals[row['course_id']][field] = row['total']
+        
+        # Items completed this week per (student, course)
+        week_progress = {
+            (row['student_id'], row['course_id']): row
+            for row in Progress.objects.filter(
+                course_id__in=course_ids,
+                completed_at__gte=week_start_dt,
+                completed_at__lte=week_end_dt
+            ).values('student_id', 'course_id').annotate(
+                videos_completed=Count('id', filter=Q(video__isnull=False)),
+                quizzes_completed=Count('id', filter=Q(quiz__isnull=False)),
+                assignments_completed=Count('id', filter=Q(assignment__isnull=False)),
             )
-            
-            reports_created += 1
-            
-            # Schedule email to be sent
-            send_weekly_progress_email.delay(report.id)
+        }
         
+        rows = enrollments.values_list('student_id', 'student__user_id', 'course_id').iterator(
+            chunk_size=WEEKLY_REPORT_BATCH_SIZE
+        )
+        while True:
+            batch = list(islice(rows, WEEKLY_REPORT_BATCH_SIZE))
+            if not batch:
+                break
+            
+            reports = []
+            for student_id, user_id, course_id in batch:
+                progress = week_progress.get((student_id, course_id), {})
+                course_totals = totals.get(course_id, {})
+                reports.append(WeeklyProgressReport(
+                    user_id=user_id,
+                    course_id=course_id,
+                    week_start=week_start,
+                    week_end=week_end,
+                    videos_completed=progress.get('videos_completed', 0),
+                    total_videos=course_totals.get('total_videos', 0),
+                    quizzes_completed=progress.get('quizzes_completed', 0),
+                    total_quizzes=course_totals.get('total_quizzes', 0),
+                    assignments_completed=progress.get('assignments_completed', 0),
+                    total_assignments=course_totals.get('total_assignments', 0),
+                    time_spent=0,  # You can implement time tracking separately
+                    report_generated=True
+                ))
+            WeeklyProgressReport.objects.bulk_create(reports, ignore_conflicts=True)
+        
+        # ignore_conflicts doesn't return ids, so look up this run's reports
+        report_ids = list(WeeklyProgressReport.objects.filter(
+            week_start=week_start,
+            email_sent=False,
+            created_at__gte=started_at
+        ).order_by('id').values_list('id', flat=True))
+        
+        # Schedule emails to be sent
+        for i in range(0, len(report_ids), WEEKLY_REPORT_EMAIL_CHUNK_SIZE):
+            send_weekly_progress_emails.delay(report_ids[i:i + WEEKLY_REPORT_EMAIL_CHUNK_SIZE])
+        
+        reports_created = len(report_ids)
         logger.info(f"Generated {reports_created} weekly progress reports")
         return reports_created
         
@@ -168,6 +234,34 @@ def generate_weekly_progress_reports():
         return 0
 
 
+@shared_task
+def send_weekly_progress_emails(report_ids: List[int]):
+    """
+    Send a chunk of weekly progress emails over one pooled SMTP connection
+    """
+    reports = WeeklyProgressReport.objects.filter(
+        id__in=report_ids,
+        email_sent=False
+    ).select_related('user', 'course')
+    
+    sent_ids = []
+    email_service = EmailService()
+    with PooledEmailSender(governor=email_service.governor) as sender:
+        for report in reports:
+            if email_service.send_email(
+                recipient=report.user,
+                email_type='weekly_progress',
+                course=report.course,
+                context={'progress_report': report},
+                sender=sender
+            ):
+                sent_ids.append(report.id)
+    
+    WeeklyProgressReport.objects.filter(id__in=sent_ids).update(email_sent=True)
+    logger.info(f"Sent {len(sent_ids)} of {len(report_ids)} weekly progress emails")
+    return len(sent_ids)
+
+
 @shared_task
 def send_weekly_progress_email(report_id: int):
     """
@@ -212,14 +306,14 @@ def send_new_content_notification(course_id: int, content_description: str = Non
         enrollments = Enrollment.objects.filter(
             course=course,
             is_completed=False
-        ).select_related('student')
+        ).select_related('student__user')
         
         if not enrollments.exists():
             logger.info(f"No enrolled students found for course {course.title}")
             return 0
         
         email_service = EmailService()
-        recipients = [enrollment.student for enrollment in enrollments]
+        recipients = [enrollment.student.user for enrollment in enrollments]
         
         context = {}
         if content_description:
@@ -228,7 +322,8 @@ def send_new_content_notification(course_id: int, content_description: str = Non
         results = email_service.send_bulk_email(
             recipients=recipients,
             email_type='new_content',
-            context=context
+            context=context,
+            course=course
         )
         
         logger.info(f"New content notification sent to {results['success']} students for course {course.title}")
@@ -239,74 +334,187 @@ def send_new_content_notification(course_id: int, content_description: str = Non
         return 0
 
 
+def claim_queued_emails(limit, claim_timeout):
+    """
+    Claim up to ``limit`` due queue entries for this worker
+
+    Rows are locked with SELECT ... FOR UPDATE SKIP LOCKED, so concurrent
+    workers claim disjoint sets, and stamped with claimed_at before the
+    lock is released. Claims older than ``claim_timeout`` (a worker that
+    died mid-batch) become claimable again.
+
+    Returns:
+        list: Claimed EmailQueue ids, most urgent first
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        claimed_ids = list(
+            EmailQueue.objects.select_for_update(skip_locked=True)
+            .filter(is_processed=False, scheduled_at__lte=now)
+            .filter(Q(claimed_at__isnull=True) | Q(claimed_at__lt=now - claim_timeout))
+            .order_by('priority_level', 'scheduled_at')
+            .values_list('id', flat=True)[:limit]
+        )
+        EmailQueue.objects.filter(id__in=claimed_ids).update(claimed_at=now)
+    return claimed_ids
+
+
+def _send_queued_emails(queue_ids):
+    """
+    Send claimed queue entries over one pooled SMTP connection (runs in a
+    worker thread)
+
+    Returns:
+        list: (EmailQueue, success) pairs, success None if throttled
+    """
+    results = []
+    try:
+        email_service = EmailService()
+        queued_emails = list(EmailQueue.objects.filter(id__in=queue_ids).select_related('recipient'))
+        opted_out = set()
+        for email_type in {queued_email.email_type for queued_email in queued_emails}:
+            _, skipped = email_service.filter_recipients(
+                [queued_email.recipient for queued_email in queued_emails if queued_email.email_type == email_type],
+                email_type
+            )
+            opted_out.update((email_type, recipient.pk) for recipient in skipped)
+
+        with PooledEmailSender() as sender:
+            for queued_email in queued_emails:
+                if (queued_email.email_type, queued_email.recipient_id) in opted_out:
+                    # Nothing will ever be sent; don't spend a send slot or a retry on it
+                    results.append((queued_email, True))
+                    continue
+                # Wait for a send slot here so a throttled entry is deferred
+                # instead of spending one of its retries
+                if not email_service.governor.wait(queued_email.recipient.email):
+                    results.append((queued_email, None))
+                    continue
+                try:
+                    success = email_service.send_email(
+                        recipient=queued_email.recipient,
+                        email_type=queued_email.email_type,
+                        context=queued_email.context_data,
+                        sender=sender
+                    )
+                except Exception as e:
+                    logger.error(f"Failed to process queued email {queued_email.id}: {str(e)}")
+                    success = False
+                results.append((queued_email, success))
+    finally:
+        # Threads get their own DB connection; don't leak it
+        connection.close()
+    return results
+
+
+def _finish_queued_email(queued_email, success, now):
+    """Mark a sent entry processed, or release it for a retry"""
+    queued_email.claimed_at = None
+    if success is None:
+        # Throttled: try again shortly without counting a retry
+        queued_email.scheduled_at = now + timedelta(minutes=1)
+    elif success:
+        queued_email.is_processed = True
+        queued_email.processed_at = now
+    else:
+        # Retry logic
+        queued_email.retry_count += 1
+        if queued_email.retry_count >= queued_email.max_retries:
+            queued_email.is_processed = True
+            queued_email.processed_at = now
+        else:
+            # Reschedule for retry (exponential backoff)
+            retry_delay = 2 ** queued_email.retry_count  # 2, 4, 8 minutes
+            queued_email.scheduled_at = now + timedelta(minutes=retry_delay)
+    
+    queued_email.save(update_fields=[
+        'claimed_at', 'is_processed', 'processed_at', 'retry_count', 'scheduled_at'
+    ])
+
+
 @shared_task
-def process_email_queue():
+def process_email_queue(batch_size=None, workers=None, max_batches=10):
     """
     Process queued emails that are ready to be sent
+
+    Each batch is claimed with SKIP LOCKED so several workers can drain
+    the queue concurrently without sending an entry twice, then split
+    across a thread pool with one SMTP connection per thread.
     """
+    batch_size = batch_size or getattr(settings, 'EMAIL_QUEUE_BATCH_SIZE', 50)
+    workers = workers or getattr(settings, 'EMAIL_QUEUE_WORKERS', 4)
+    claim_timeout = timedelta(seconds=getattr(settings, 'EMAIL_QUEUE_CLAIM_TIMEOUT', 600))
+    if connection.vendor == 'sqlite':
+        # SQLite allows a single writer; parallel threads would just hit "database is locked"
+        workers = 1
+    
+    processed_count = 0
     try:
-        # Get emails that are ready to be sent
-        now = timezone.now()
-        queued_emails = EmailQueue.objects.filter(
-            is_processed=False,
-            scheduled_at__lte=now
-        ).order_by('priority', 'scheduled_at')[:50]  # Process 50 at a time
-        
-        processed_count = 0
-        
-        for queued_email in queued_emails:
-            try:
-                email_service = EmailService()
-                success = email_service.send_email(
-                    recipient=queued_email.recipient,
-                    email_type=queued_email.email_type,
-                    context=queued_email.context_data
-                )
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for _ in range(max_batches):
+                claimed_ids = claim_queued_emails(batch_size, claim_timeout)
+                if not claimed_ids:
+                    break
                 
-                if success:
-                    queued_email.is_processed = True
-                    queued_email.processed_at = now
-                    queued_email.save()
-                    processed_count += 1
-                else:
-                    # Retry logic
-                    queued_email.retry_count += 1
-                    if queued_email.retry_count >= queued_email.max_retries:
-                        queued_email.is_processed = True
-                        queued_email.processed_at = now
-                    else:
-                        # Reschedule for retry (exponential backoff)
-                        retry_delay = 2 ** queued_email.retry_count  # 2, 4, 8 minutes
-                        queued_email.scheduled_at = now + timedelta(minutes=retry_delay)
-                    
-                    queued_email.save()
+                # Round-robin so every thread gets a share of the urgent rows
+                chunks = [claimed_ids[i::workers] for i in range(workers)]
+                futures = [
+                    executor.submit(_send_queued_emails, chunk)
+                    for chunk in chunks if chunk
+                ]
+                
+                now = timezone.now()
+                for future in as_completed(futures):
+                    try:
+                        results = future.result()
+                    except Exception as e:
+                        # Entries stay claimed and are retried once the claim expires
+                        logger.error(f"Email queue worker failed: {str(e)}")
+                        continue
                     
-            except Exception as e:
-                logger.error(f"Failed to process queued email {queued_email.id}: {str(e)}")
-                continue
+                    for queued_email, success in results:
+                        _finish_queued_email(queued_email, success, now)
+                        if success:
+                            processed_count += 1
+                
+                if len(claimed_ids) < batch_size:
+                    break
         
         logger.info(f"Processed {processed_count} queued emails")
         return processed_count
         
     except Exception as e:
         logger.error(f"Failed to process email queue: {str(e)}")
-        return 0
+        return processed_count
+
+
+@shared_task
+def flush_email_tracking_events():
+    """
+    Apply staged email opens/clicks to EmailLog (scheduled every minute)
+    """
+    flushed = flush_tracking_events()
+    if flushed:
+        logger.info(f"Applied {flushed} email tracking events")
+    return flushed
 
 
 @shared_task
 def cleanup_old_email_logs():
     """
-    Clean up old email logs to prevent database bloat
+    Clean up old email logs and processed queue entries to prevent
+    database bloat (see EMAIL_RETENTION). Deletes in bounded batches
+    within a time budget, so a large backlog is worked off over several
+    daily runs.
     """
     try:
-        # Delete email logs older than 90 days
-        cutoff_date = timezone.now() - timedelta(days=90)
-        
-        from .models import EmailLog
-        deleted_count = EmailLog.objects.filter(created_at__lt=cutoff_date).delete()[0]
+        deleted = purge_email_history()
         
-        logger.info(f"Cleaned up {deleted_count} old email logs")
-        return deleted_count
+        logger.info(
+            f"Cleaned up {deleted['email_logs']} old email logs and "
+            f"{deleted['email_queue']} processed queue entries"
+        )
+        return deleted['email_logs'] + deleted['email_queue']
         
     except Exception as e:
         logger.error(f"Failed to cleanup old email logs: {str(e)}")
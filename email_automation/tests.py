@@ -1,3 +1,389 @@
-from django.test import TestCase
+import gzip
+import json
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.db import connection, transaction
+from django.template import Context, Template
+from django.test import Client, SimpleTestCase, TestCase, TransactionTestCase, override_settings, skipUnlessDBFeature
+from django.urls import reverse
+from django.utils import timezone
+
+from .checks import check_rate_limit_cache
+from .dispatch import enqueue_on_commit, send_mail_async
+from .models import EmailEngagementStats, EmailLog, EmailPreference, EmailQueue, EmailTemplate, EmailTrackingEvent
+from .retention import email_retention_settings, purge_email_history
+from .services import BulkEmailRenderer, CompiledEmailTemplate
+from .tasks import _send_queued_emails, claim_queued_emails, process_email_queue, send_mail_task
+from .tracking import click_token, flush_tracking_events, open_token, record_event
+
+User = get_user_model()
+
+CLAIM_TIMEOUT = timedelta(minutes=10)
+
+
+class QueueMixin:
+    """Creates due queue entries for ``self.user``"""
+
+    def queue(self, priority='normal', scheduled_at=None, **fields):
+        return EmailQueue.objects.create(
+            recipient=self.user, email_type='enrollment', subject='Hi', content='',
+            priority=priority, scheduled_at=scheduled_at or timezone.now() - timedelta(minutes=1), **fields
+        )
+
+
+class EmailQueueClaimTests(QueueMixin, TestCase):
+    """Workers claim disjoint, most urgent first batches of the email queue"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='student', email='student@example.com')
+
+    def test_claims_due_entries_most_urgent_first(self):
+        now = timezone.now()
+        low = self.queue('low', now - timedelta(hours=2))
+        normal_late = self.queue('normal', now - timedelta(minutes=5))
+        normal_early = self.queue('normal', now - timedelta(minutes=30))
+        urgent = self.queue('urgent')
+        self.queue('urgent', now + timedelta(hours=1))
+        self.queue('urgent', is_processed=True)
+
+        self.assertEqual(
+            claim_queued_emails(10, CLAIM_TIMEOUT),
+            [urgent.id, normal_early.id, normal_late.id, low.id]
+        )
+        self.assertEqual(claim_queued_emails(2, CLAIM_TIMEOUT), [])
+
+    def test_claimed_entries_are_not_claimed_again(self):
+        entries = [self.queue() for _ in range(5)]
+
+        first = claim_queued_emails(3, CLAIM_TIMEOUT)
+        second = claim_queued_emails(3, CLAIM_TIMEOUT)
+
+        self.assertEqual(len(first), 3)
+        self.assertEqual(sorted(first + second), [entry.id for entry in entries])
+        self.assertFalse(EmailQueue.objects.filter(claimed_at__isnull=True).exists())
+
+    def test_stale_claims_are_reclaimed(self):
+        stale = self.queue(claimed_at=timezone.now() - CLAIM_TIMEOUT - timedelta(seconds=1))
+        self.queue(claimed_at=timezone.now() - timedelta(minutes=1))
+
+        self.assertEqual(claim_queued_emails(10, CLAIM_TIMEOUT), [stale.id])
+        stale.refresh_from_db()
+        self.assertGreater(stale.claimed_at, timezone.now() - timedelta(minutes=1))
+
+    def test_processing_releases_claims(self):
+        sent, failed, throttled = self.queue('high'), self.queue(), self.queue('low')
+        entries = {entry.id: entry for entry in (sent, failed, throttled)}
+        outcome = {sent.id: True, failed.id: False, throttled.id: None}
+
+        def send(queue_ids):
+            return [(entries[pk], outcome[pk]) for pk in queue_ids]
+
+        with mock.patch('email_automation.tasks._send_queued_emails', side_effect=send):
+            self.assertEqual(process_email_queue(batch_size=10), 1)
+
+        for entry in entries.values():
+            entry.refresh_from_db()
+            self.assertIsNone(entry.claimed_at)
+        self.assertTrue(sent.is_processed)
+        self.assertEqual((failed.is_processed, failed.retry_count), (False, 1))
+        self.assertEqual((throttled.is_processed, throttled.retry_count), (False, 0))
+        self.assertGreater(throttled.scheduled_at, timezone.now())
+
+
+    def test_opted_out_entries_take_no_send_slot(self):
+        EmailPreference.objects.create(user=self.user, enrollment_emails=False)
+        opted_out = self.queue()
+
+        with mock.patch('email_automation.ratelimit.SendRateGovernor.wait') as wait:
+            results = _send_queued_emails([opted_out.id])
+
+        wait.assert_not_called()
+        self.assertEqual(results, [(opted_out, True)])
+        self.assertFalse(EmailLog.objects.exists())
+
+
+@skipUnlessDBFeature('has_select_for_update_skip_locked')
+class EmailQueueConcurrentClaimTests(QueueMixin, TransactionTestCase):
+    """Rows locked by another worker's claim are skipped, not waited on"""
+    available_apps = ['email_automation', 'authentication']
+
+    def test_locked_rows_are_skipped(self):
+        self.user = User.objects.create_user(username='student', email='student@example.com')
+        entries = [self.queue() for _ in range(4)]
+
+        def claim_in_other_worker():
+            try:
+                return claim_queued_emails(10, CLAIM_TIMEOUT)
+            finally:
+                connection.close()
+
+        with transaction.atomic():
+            locked = list(EmailQueue.objects.select_for_update().filter(id__in=[e.id for e in entries[:2]]))
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                claimed = executor.submit(claim_in_other_worker).result(timeout=10)
+
+        self.assertEqual(sorted(claimed), [entry.id for entry in entries[2:]])
+        self.assertEqual(len(locked), 2)
+
+
+class RateLimitCacheCheckTests(SimpleTestCase):
+    """The token buckets need a cache shared by every worker"""
+
+    def caches(self, backend):
+        return {'default': {'BACKEND': f'django.core.cache.backends.{backend}'}}
+
+    def test_warns_about_process_local_caches(self):
+        for backend in ('locmem.LocMemCache', 'dummy.DummyCache'):
+            with self.subTest(backend=backend), override_settings(CACHES=self.caches(backend)):
+                self.assertEqual([w.id for w in check_rate_limit_cache(None)], ['email_automation.W001'])
+
+    def test_shared_caches_pass(self):
+        with override_settings(CACHES=self.caches('redis.RedisCache')):
+            self.assertEqual(check_rate_limit_cache(None), [])
+
+
+class EmailTrackingTests(TestCase):
+    """Opens and clicks are staged by the endpoints and applied in bulk"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='student', email='student@example.com')
+
+    def setUp(self):
+        self.logs = [
+            EmailLog.objects.create(
+                recipient=self.user, email_type='enrollment', subject='Hi', content='', status='sent',
+                sent_at=timezone.now()
+            )
+            for _ in range(3)
+        ]
+
+    def engagement(self):
+        row = EmailEngagementStats.objects.get(email_type='enrollment')
+        return row.opened_count, row.clicked_count
+
+    def test_endpoints_only_stage_events(self):
+        client = Client()
+        log = self.logs[0]
+
+        response = client.get(reverse('email-automation-track-open'), {'t': open_token(log.id)})
+        self.assertEqual(response['Content-Type'], 'image/gif')
+        response = client.get(
+            reverse('email-automation-track-click'), {'t': click_token(log.id, 'https://example.com/a?b=1')}
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(response['Location'], 'https://example.com/a?b=1')
+        self.assertEqual(client.get(reverse('email-automation-track-click'), {'t': 'forged'}).status_code, 404)
+
+        self.assertEqual(list(EmailTrackingEvent.objects.values_list('log_id', 'event')), [
+            (log.id, 'open'), (log.id, 'click')
+        ])
+        log.refresh_from_db()
+        self.assertEqual((log.status, log.opened_at), ('sent', None))
+
+    def test_flush_applies_first_events_once(self):
+        opened, clicked, untouched = self.logs
+        earlier = timezone.now() - timedelta(minutes=5)
+        record_event(opened.id, 'open')
+        EmailTrackingEvent.objects.create(log_id=opened.id, event='open', occurred_at=earlier)
+        record_event(clicked.id, 'click')
+        # An event for a purged log is dropped
+        record_event(untouched.id + 100, 'open')
+
+        self.assertEqual(flush_tracking_events(batch_size=2), 4)
+
+        self.assertFalse(EmailTrackingEvent.objects.exists())
+        for log in self.logs:
+            log.refresh_from_db()
+        self.assertEqual((opened.status, opened.opened_at, opened.delivered_at), ('opened', earlier, earlier))
+        self.assertIsNone(opened.clicked_at)
+        # A click implies an open
+        self.assertEqual(clicked.status, 'clicked')
+        self.assertEqual(clicked.opened_at, clicked.clicked_at)
+        self.assertEqual((untouched.status, untouched.opened_at), ('sent', None))
+        self.assertEqual(self.engagement(), (2, 1))
+
+        # Later opens neither move the first open nor count again
+        record_event(opened.id, 'open')
+        record_event(clicked.id, 'open')
+        self.assertEqual(flush_tracking_events(), 2)
+        self.assertEqual(self.engagement(), (2, 1))
+        opened.refresh_from_db()
+        self.assertEqual(opened.opened_at, earlier)
+        self.assertEqual(flush_tracking_events(), 0)
+
+
+class EmailRetentionTests(QueueMixin, TestCase):
+    """Old logs and processed queue entries are purged in bounded ranges"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='student', email='student@example.com')
+
+    def setUp(self):
+        long_ago = timezone.now() - timedelta(days=120)
+        self.old_logs = [self.log() for _ in range(5)]
+        EmailLog.objects.filter(pk__in=[log.pk for log in self.old_logs]).update(created_at=long_ago)
+        self.recent_logs = [self.log() for _ in range(2)]
+
+        self.old_sent = [self.queue(is_processed=True, processed_at=long_ago) for _ in range(3)]
+        self.old_pending = self.queue()
+        self.recent_sent = self.queue(is_processed=True, processed_at=timezone.now())
+        EmailQueue.objects.update(created_at=long_ago)
+        EmailQueue.objects.filter(pk=self.recent_sent.pk).update(created_at=timezone.now())
+
+    def log(self):
+        return EmailLog.objects.create(recipient=self.user, email_type='enrollment', subject='Hi', content='')
+
+    def config(self, **overrides):
+        return {**email_retention_settings(), 'BATCH_SIZE': 2, **overrides}
+
+    def remaining(self, model):
+        return set(model.objects.values_list('pk', flat=True))
+
+    def test_purges_only_expired_rows(self):
+        self.assertEqual(purge_email_history(self.config()), {'email_logs': 5, 'email_queue': 3})
+
+        self.assertEqual(self.remaining(EmailLog), {log.pk for log in self.recent_logs})
+        self.assertEqual(self.remaining(EmailQueue), {self.old_pending.pk, self.recent_sent.pk})
+        self.assertEqual(purge_email_history(self.config()), {'email_logs': 0, 'email_queue': 0})
+
+    def test_stops_when_the_time_budget_is_spent(self):
+        self.assertEqual(
+            purge_email_history(self.config(TIME_BUDGET_SECONDS=0)), {'email_logs': 0, 'email_queue': 0}
+        )
+        self.assertEqual(EmailLog.objects.count(), 7)
+
+    def test_archives_exactly_the_deleted_rows(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+
+        purge_email_history(self.config(ARCHIVE=True, ARCHIVE_ROOT=directory.name))
+
+        archived = {}
+        for table in ('email_logs', 'email_queue'):
+            folder = os.path.join(directory.name, table)
+            rows = []
+            for name in sorted(os.listdir(folder)):
+                with gzip.open(os.path.join(folder, name), 'rt') as archive:
+                    rows.extend(json.loads(line) for line in archive)
+            archived[table] = [row['id'] for row in rows]
+        self.assertEqual(archived, {
+            'email_logs': [log.pk for log in self.old_logs],
+            'email_queue': [entry.pk for entry in self.old_sent],
+        })
+        # Two rows per batch
+        self.assertEqual(len(os.listdir(os.path.join(directory.name, 'email_logs'))), 3)
+
+
+class OnCommitDispatchTests(TestCase):
+    """Tasks are queued only once the request's transaction commits"""
+
+    def test_task_is_queued_after_commit(self):
+        task = mock.Mock()
+        with self.captureOnCommitCallbacks() as callbacks:
+            enqueue_on_commit(task, 1, title='Algebra')
+            task.delay.assert_not_called()
+
+        self.assertEqual(len(callbacks), 1)
+        callbacks[0]()
+        task.delay.assert_called_once_with(1, title='Algebra')
+
+    def test_rolled_back_work_queues_nothing(self):
+        task = mock.Mock()
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with self.assertRaises(RuntimeError), transaction.atomic():
+                enqueue_on_commit(task)
+                raise RuntimeError('request failed')
+
+        self.assertEqual(callbacks, [])
+        task.delay.assert_not_called()
+
+    def test_send_mail_async_sends_from_the_worker(self):
+        with mock.patch.object(send_mail_task, 'delay', wraps=send_mail_task.delay) as delay:
+            with self.captureOnCommitCallbacks(execute=True):
+                send_mail_async('Welcome', 'Hello', None, ('student@example.com',), html_message='<p>Hello</p>')
+                self.assertEqual(mail.outbox, [])
+
+        delay.assert_called_once_with(
+            'Welcome', 'Hello', settings.DEFAULT_FROM_EMAIL, ['student@example.com'],
+            fail_silently=False, html_message='<p>Hello</p>'
+        )
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['student@example.com'])
+
+
+class BulkEmailRendererTests(SimpleTestCase):
+    """Bulk rendering matches rendering each recipient's email in full"""
+
+    context = {
+        'course': {'title': 'Algebra & Geometry'},
+        'lessons': ['Sets', 'Functions'],
+        'site_url': 'https://lms.example.com',
+    }
+    recipients = [
+        User(username='ann', first_name='Ann', last_name='Lee', email='ann@example.com'),
+        User(username='bob', first_name='<b>Bob</b> & "Co"', last_name='{{ site_url }}', email='bob@example.com'),
+        User(username='cy', email='cy@example.com'),
+    ]
+
+    def assertRendersLikeTemplate(self, subject='Hello', html_content='', text_content=''):
+        template = EmailTemplate(subject=subject, html_content=html_content, text_content=text_content)
+        renderer = BulkEmailRenderer(CompiledEmailTemplate(template), self.context)
+        for recipient in self.recipients:
+            context = Context({**self.context, 'user': recipient})
+            expected = tuple(
+                Template(source).render(context) if source else None
+                for source in (subject, html_content, text_content)
+            )
+            with self.subTest(user=recipient.username):
+                self.assertEqual(renderer.render(recipient), expected)
+        return renderer
+
+    def test_shared_parts_are_rendered_once(self):
+        renderer = self.assertRendersLikeTemplate(
+            subject='New in {{ course.title }}', html_content='<p>{{ course.title|upper }}</p>'
+        )
+        self.assertEqual(set(renderer.static), {'subject', 'html_content'})
+
+    def test_user_variables_and_filters(self):
+        renderer = self.assertRendersLikeTemplate(
+            subject='{{ user.first_name|default:"Student" }}, welcome to {{ course.title }}',
+            html_content=(
+                '<p>Hi {{ user.first_name|upper }} {{ user.last_name|default:"" }}</p>'
+                '<p>{{ user.email|urlize }} at {{ site_url }}/u/{{ user.username|urlencode }}</p>'
+                '<p>{{ user.first_name|safe }} {{ user.first_name|length }}</p>'
+            ),
+            text_content='Hi {{ user.get_full_name }}\n{{ user.email }}',
+        )
+        self.assertEqual(set(renderer.segments), {'subject', 'html_content', 'text_content'})
+
+    def test_blocks_around_user_variables(self):
+        renderer = self.assertRendersLikeTemplate(
+            html_content=(
+                '{% if lessons %}<ul>{% for lesson in lessons %}'
+                '<li>{{ forloop.counter }}. {{ lesson }} for {{ user.first_name }}</li>'
+                '{% endfor %}</ul>{% endif %}'
+            ),
+        )
+        self.assertIn('html_content', renderer.segments)
+
+    def test_parts_that_cannot_be_split_are_rendered_in_full(self):
+        renderer = self.assertRendersLikeTemplate(
+            subject='{% if user.first_name %}Hi {{ user.first_name }}{% else %}Hello{% endif %}',
+            html_content=(
+                '{% autoescape off %}{{ user.first_name }}{% endautoescape %}'
+                '{% with name=user.first_name %}{{ name }}{% endwith %}'
+            ),
+            text_content='{{ user.first_name|default:course.title }}',
+        )
+        self.assertEqual(renderer.segments, {})
+        self.assertEqual(renderer.static, {})
@@ -0,0 +1,196 @@
+# email_automation/tracking.py
+import html
+import logging
+import re
+from collections import defaultdict
+from datetime import timedelta
+from functools import lru_cache
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core import signing
+from django.db import transaction
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import EmailEngagementStats, EmailLog, EmailTrackingEvent
+
+logger = logging.getLogger(__name__)
+
+OPEN_SALT = 'email_automation.tracking.open'
+CLICK_SALT = 'email_automation.tracking.click'
+
+# Tracking links stop working after this long
+TOKEN_MAX_AGE = timedelta(days=90)
+
+# 1x1 transparent GIF served for opens
+PIXEL = (
+    b'GIF89a\x01\x00\x01\x00\x80\x00\x00\x00\x00\x00\xff\xff\xff!\xf9\x04'
+    b'\x01\x00\x00\x00\x00,\x00\x00\x00\x00\x01\x00\x01\x00\x00\x02\x02D\x01\x00;'
+)
+
+# Later statuses win; an open implies delivery and a click implies an open
+STATUS_RANK = {
+    'pending': 0,
+    'failed': 0,
+    'sent': 1,
+    'delivered': 2,
+    'opened': 3,
+    'clicked': 4,
+}
+
+LINK_RE = re.compile(r'''(<a\b[^>]*?\bhref\s*=\s*)(["'])(https?://.+?)\2''', re.IGNORECASE)
+
+
+def tracking_enabled():
+    return getattr(settings, 'EMAIL_TRACKING_ENABLED', True)
+
+
+# ===========================
+# Signed tokens and links
+# ===========================
+def open_token(log_id):
+    return signing.dumps(log_id, salt=OPEN_SALT)
+
+
+def click_token(log_id, url):
+    return signing.dumps([log_id, url], salt=CLICK_SALT, compress=True)
+
+
+def read_open_token(token):
+    """
+    Raises:
+        signing.BadSignature: If the token was tampered with or has expired
+    """
+    return signing.loads(token, salt=OPEN_SALT, max_age=TOKEN_MAX_AGE)
+
+
+def read_click_token(token):
+    """
+    Returns:
+        tuple: (log id, target url)
+
+    Raises:
+        signing.BadSignature: If the token was tampered with or has expired
+    """
+    log_id, url = signing.loads(token, salt=CLICK_SALT, max_age=TOKEN_MAX_AGE)
+    return log_id, url
+
+
+@lru_cache(maxsize=None)
+def _tracking_path(url_name):
+    # Resolved once per process rather than for every link of every message
+    return reverse(url_name)
+
+
+def _tracking_url(url_name, token):
+    site_url = getattr(settings, 'SITE_URL', '').rstrip('/')
+    return f"{site_url}{_tracking_path(url_name)}?{urlencode({'t': token})}"
+
+
+def add_tracking(html_content, log_id):
+    """
+    Route the links of an email's HTML through the click endpoint and
+    append the open pixel
+    """
+    if not html_content or not tracking_enabled():
+        return html_content
+
+    def wrap_link(match):
+        prefix, quote, url = match.groups()
+        tracked = _tracking_url('email-automation-track-click', click_token(log_id, html.unescape(url)))
+        return f"{prefix}{quote}{html.escape(tracked)}{quote}"
+
+    tracked_html = LINK_RE.sub(wrap_link, html_content)
+
+    pixel_url = html.escape(_tracking_url('email-automation-track-open', open_token(log_id)))
+    pixel = f'<img src="{pixel_url}" width="1" height="1" alt="" style="display:none">'
+
+    closing = tracked_html.lower().rfind('</body>')
+    if closing == -1:
+        return tracked_html + pixel
+    return tracked_html[:closing] + pixel + tracked_html[closing:]
+
+
+# ===========================
+# Event buffer
+# ===========================
+def record_event(log_id, event):
+    """
+    Append an 'open' or 'click' event to the EmailTrackingEvent staging
+    table without touching EmailLog; flush_tracking_events applies them
+    in bulk
+    """
+    EmailTrackingEvent.objects.create(log_id=log_id, event=event)
+
+
+def flush_tracking_events(batch_size=1000, max_batches=100):
+    """
+    Apply staged opens/clicks to EmailLog with bulk_update, add first
+    opens/clicks to EmailEngagementStats and delete the applied events
+
+    Each batch is claimed with SELECT ... FOR UPDATE SKIP LOCKED, so
+    overlapping flushes apply disjoint events.
+
+    Returns:
+        int: Number of events applied
+    """
+    flushed = 0
+    for _ in range(max_batches):
+        with transaction.atomic():
+            events = list(
+                EmailTrackingEvent.objects.select_for_update(skip_locked=True)
+                .order_by('id')
+                .values_list('id', 'log_id', 'event', 'occurred_at')[:batch_size]
+            )
+            if not events:
+                break
+            _apply_events(events)
+            EmailTrackingEvent.objects.filter(id__in=[event[0] for event in events]).delete()
+        flushed += len(events)
+        if len(events) < batch_size:
+            break
+    return flushed
+
+
+def _apply_events(events):
+    # Earliest open and click per email
+    first_seen = defaultdict(dict)
+    for _, log_id, event, occurred_at in events:
+        previous = first_seen[log_id].get(event)
+        if previous is None or occurred_at < previous:
+            first_seen[log_id][event] = occurred_at
+
+    # Locked so a concurrent flush can't count the same first open twice;
+    # events of purged logs simply find no row
+    logs = list(
+        EmailLog.objects.select_for_update()
+        .filter(id__in=first_seen)
+        .order_by('id')
+        .only('id', 'email_type', 'status', 'delivered_at', 'opened_at', 'clicked_at')
+    )
+    now = timezone.now()
+    stats = defaultdict(lambda: {'opened': 0, 'clicked': 0})
+    for email_log in logs:
+        seen = first_seen[email_log.id]
+        clicked_at = seen.get('click')
+        opened_at = min(filter(None, [seen.get('open'), clicked_at]))
+
+        if email_log.opened_at is None:
+            email_log.opened_at = opened_at
+            stats[email_log.email_type]['opened'] += 1
+        if clicked_at and email_log.clicked_at is None:
+            email_log.clicked_at = clicked_at
+            stats[email_log.email_type]['clicked'] += 1
+        if email_log.delivered_at is None:
+            email_log.delivered_at = email_log.opened_at
+
+        status = 'clicked' if email_log.clicked_at else 'opened'
+        if STATUS_RANK[status] > STATUS_RANK.get(email_log.status, 0):
+            email_log.status = status
+        email_log.updated_at = now
+
+    EmailLog.objects.bulk_update(logs, ['status', 'delivered_at', 'opened_at', 'clicked_at', 'updated_at'])
+
+    for email_type, counts in stats.items():
+        EmailEngagementStats.add(email_type, opened=counts['opened'], clicked=counts['clicked'])
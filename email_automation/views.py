@@ -1,16 +1,20 @@
+from django.core import signing
+from django.http import HttpResponse, HttpResponseRedirect, Http404
 from django.shortcuts import render
 from django.utils import timezone
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated, IsAdminUser
+from rest_framework.permissions import AllowAny, IsAuthenticated, IsAdminUser
 from django.contrib.auth import get_user_model
 from django.shortcuts import get_object_or_404
 
 from courses.models import Course, Enrollment
 from payments.models import Payment
-from .models import EmailTemplate, EmailLog, EmailPreference
+from .models import EmailTemplate, EmailLog, EmailPreference, EmailEngagementStats
+from .ratelimit import SendRateGovernor
 from .services import EmailService
+from .tracking import PIXEL, read_click_token, read_open_token, record_event
 from .tasks import (
     send_enrollment_email,
     send_payment_confirmation_email,
@@ -132,7 +136,7 @@ class EmailAutomationViewSet(viewsets.ViewSet):
         
         try:
             course = get_object_or_404(Course, id=course_id)
-            send_new_content_notification.delay(course_id, content_type, content_title)
+            send_new_content_notification.delay(course_id, f"New {content_type}: {content_title}")
             
             return Response({
                 'message': 'New content notification emails queued successfully'
@@ -144,6 +148,52 @@ class EmailAutomationViewSet(viewsets.ViewSet):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
     
+    @action(detail=False, methods=['get'], permission_classes=[IsAdminUser])
+    def send_rate(self, request):
+        """Outbound email pacing, throughput and queue backlog"""
+        return Response(SendRateGovernor().metrics())
+    
+    @action(detail=False, methods=['get'], permission_classes=[IsAdminUser])
+    def engagement(self, request):
+        """Open and click rates per email type"""
+        stats = EmailEngagementStats.objects.order_by('email_type')
+        return Response({
+            'engagement': [
+                {
+                    'email_type': row.email_type,
+                    'sent': row.sent_count,
+                    'opened': row.opened_count,
+                    'clicked': row.clicked_count,
+                    'open_rate': row.open_rate,
+                    'click_rate': row.click_rate,
+                }
+                for row in stats
+            ]
+        })
+    
+    @action(detail=False, methods=['get'], permission_classes=[AllowAny], authentication_classes=[])
+    def track_open(self, request):
+        """Open-tracking pixel; the open is staged, not applied here"""
+        try:
+            record_event(read_open_token(request.query_params.get('t', '')), 'open')
+        except signing.BadSignature:
+            pass
+        
+        response = HttpResponse(PIXEL, content_type='image/gif')
+        response['Cache-Control'] = 'no-store, no-cache, must-revalidate, max-age=0'
+        return response
+    
+    @action(detail=False, methods=['get'], permission_classes=[AllowAny], authentication_classes=[])
+    def track_click(self, request):
+        """Record a link click and redirect to the signed target URL"""
+        try:
+            log_id, url = read_click_token(request.query_params.get('t', ''))
+        except (signing.BadSignature, ValueError, TypeError):
+            raise Http404('Invalid tracking link')
+        
+        record_event(log_id, 'click')
+        return HttpResponseRedirect(url)
+    
     @action(detail=False, methods=['get'])
     def email_logs(self, request):
         """Get email logs for the current user"""
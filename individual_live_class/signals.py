@@ -7,6 +7,7 @@ from authentication.models import User
 from .models import LiveClassSchedule, LiveClassSubscription, LiveClassPayment, LiveClassSession
 from .utils import send_schedule_creation_notification, send_payment_confirmation_email
 from notifications.models import Notification
+from payments.models import RevenueDaily
 
 @receiver(post_save, sender=LiveClassSchedule)
 def schedule_created_handler(sender, instance, created, **kwargs):
@@ -84,6 +85,39 @@ def payment_completed_handler(sender, instance, created, **kwargs):
             message=f'Your payment of ${instance.amount} for {instance.schedule.subject} has been confirmed. You can now join your classes.'
         )
 
+@receiver(pre_save, sender=LiveClassPayment)
+def remember_payment_status(sender, instance, **kwargs):
+    """Remember the payment status before this save for the revenue rollup"""
+    instance._previous_status = None
+    if instance.pk:
+        instance._previous_status = LiveClassPayment.objects.filter(
+            pk=instance.pk
+        ).values_list('status', flat=True).first()
+    # Completed payments always carry their completion time, which is the
+    # day their revenue is counted on
+    if instance.status == 'completed' and instance.completed_at is None:
+        instance.completed_at = timezone.now()
+
+@receiver(post_save, sender=LiveClassPayment)
+def update_revenue_rollup(sender, instance, created, **kwargs):
+    """Keep the daily revenue rollup in sync with completed live class payments"""
+    was_completed = getattr(instance, '_previous_status', None) == 'completed'
+    is_completed = instance.status == 'completed'
+    if was_completed == is_completed:
+        return
+    
+    sign = 1 if is_completed else -1
+    RevenueDaily.record(
+        # Same rule as backfill_revenue_daily: completed_at, or initiated_at
+        # for payments completed before it was always set
+        date=timezone.localdate(instance.completed_at or instance.initiated_at),
+        amount=sign * instance.amount,
+        count=sign,
+        source='live_class',
+        teacher=instance.schedule.teacher,
+        gateway=instance.payment_method,
+    )
+
 @receiver(post_save, sender=LiveClassSession)
 def session_created_handler(sender, instance, created, **kwargs):
     """Handle actions when a session is created"""
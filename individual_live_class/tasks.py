@@ -8,6 +8,7 @@ from datetime import datetime, timedelta
 
 from .models import LiveClassPayment, LiveClassSchedule, LiveClassSubscription, LiveClassSession
 from notifications.models import Notification
+from payments.models import RevenueDaily
 
 
 @shared_task
@@ -254,10 +255,11 @@ def generate_monthly_reports():
         created_at__lt=current_month
     ).count()
     
-    total_revenue = LiveClassPayment.objects.filter(
-        completed_at__gte=last_month,
-        completed_at__lt=current_month,
-        status='completed'
+    # Revenue comes from the daily rollup instead of summing raw payments
+    total_revenue = RevenueDaily.objects.filter(
+        source='live_class',
+        date__gte=last_month.date(),
+        date__lt=current_month.date()
     ).aggregate(Sum('amount'))['amount__sum'] or 0
     
     sessions_completed = LiveClassSession.objects.filter(
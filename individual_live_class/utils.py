@@ -1,7 +1,7 @@
 # live_classes/utils.py
 
 from django.utils import timezone
-from django.core.mail import send_mail
+from email_automation.dispatch import send_mail_async
 from django.conf import settings
 from datetime import datetime, timedelta, date
 from calendar import monthrange
@@ -112,7 +112,7 @@ def send_schedule_creation_notification(schedule):
     Your LMS Team
     """
     
-    send_mail(
+    send_mail_async(
         f'New Live Class Schedule - {schedule.subject}',
         student_message,
         settings.DEFAULT_FROM_EMAIL,
@@ -158,7 +158,7 @@ def send_payment_confirmation_email(payment):
     Your LMS Team
     """
     
-    send_mail(
+    send_mail_async(
         f'Payment Confirmation - {schedule.subject}',
         message,
         settings.DEFAULT_FROM_EMAIL,
@@ -13,4 +13,18 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'lms.settings')
 
-application = get_asgi_application()
+# Initialise Django before importing consumers that touch the ORM
+django_asgi_app = get_asgi_application()
+
+from channels.routing import ProtocolTypeRouter, URLRouter
+
+from alerts.middleware import JWTAuthMiddleware
+from alerts.routing import websocket_urlpatterns as alert_websocket_urlpatterns
+from chat.routing import websocket_urlpatterns as chat_websocket_urlpatterns
+
+application = ProtocolTypeRouter({
+    'http': django_asgi_app,
+    'websocket': JWTAuthMiddleware(
+        URLRouter(chat_websocket_urlpatterns + alert_websocket_urlpatterns)
+    ),
+})
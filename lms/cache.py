@@ -0,0 +1,75 @@
+# lms/cache.py
+import time
+import uuid
+
+from django.core.cache import caches
+from django.core.cache.backends.redis import RedisCache
+
+# Cache backends whose state is not shared between processes
+PROCESS_LOCAL_CACHES = {
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+}
+
+
+class LockTimeout(Exception):
+    """The lock was still held by someone else when the wait ran out"""
+
+
+class CacheLock:
+    """
+    Mutex held in the default cache, shared by every process using it.
+
+    Taken with cache.add, which is atomic on shared backends such as Redis
+    and Memcached, and expiring after ``timeout`` seconds so a holder that
+    died cannot block others for longer. A lock is only ever released by
+    the token that took it: with Django's RedisCache the check and delete
+    are one Lua script; on other backends they are two calls, so keep the
+    critical section well under ``timeout``.
+
+    Usage:
+        lock = CacheLock('report:lock', timeout=5)
+        token = lock.acquire(wait=1)
+        if token is not None:
+            try:
+                ...
+            finally:
+                lock.release(token)
+    """
+
+    RELEASE = """
+    if redis.call('GET', KEYS[1]) == ARGV[1] then
+        return redis.call('DEL', KEYS[1])
+    end
+    return 0
+    """
+
+    def __init__(self, key, timeout):
+        self.key = key
+        self.timeout = timeout
+
+    def acquire(self, wait):
+        """
+        Take the lock, waiting up to ``wait`` seconds for its holder
+
+        Returns:
+            str: Token to release it with, or None if it is still held
+        """
+        cache = caches['default']
+        token = uuid.uuid4().hex
+        deadline = time.monotonic() + wait
+        while not cache.add(self.key, token, self.timeout):
+            if time.monotonic() > deadline:
+                return None
+            time.sleep(0.005)
+        return token
+
+    def release(self, token):
+        """Release the lock if ``token`` still holds it (it may have expired)"""
+        cache = caches['default']
+        if isinstance(cache, RedisCache):
+            key = cache.make_and_validate_key(self.key)
+            client = cache._cache.get_client(key, write=True)
+            client.eval(self.RELEASE, 1, key, cache._cache._serializer.dumps(token))
+        elif cache.get(self.key) == token:
+            cache.delete(self.key)
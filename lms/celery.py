@@ -1,6 +1,9 @@
 import os
+from functools import cache
+
 from celery import Celery
 from celery.schedules import crontab 
+from celery.signals import before_task_publish, worker_init
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'lms.settings')
 
@@ -8,6 +11,24 @@ app = Celery('authentication')
 app.config_from_object('django.conf:settings', namespace='CELERY')
 app.autodiscover_tasks()
 
+
+@cache
+def ensure_broker_folders():
+    """
+    Create the folders of the development filesystem broker, once per
+    process, when it first starts a worker or publishes a task
+    """
+    options = app.conf.broker_transport_options or {}
+    for key in ('data_folder_in', 'data_folder_out', 'processed_folder', 'control_folder'):
+        if options.get(key):
+            os.makedirs(options[key], exist_ok=True)
+
+
+@worker_init.connect
+@before_task_publish.connect
+def create_broker_folders(**kwargs):
+    ensure_broker_folders()
+
 app.conf.beat_schedule = {
     'auto-renew-calendar-watch-daily': {
         'task': 'calendersync.tasks.auto_renew_calendar_watches',
@@ -26,8 +47,30 @@ app.conf.beat_schedule = {
         'task': 'email_automation.tasks.process_email_queue',
         'schedule': crontab(minute='*/5'),  # Every 5 minutes
     },
+    'flush-email-tracking-events': {
+        'task': 'email_automation.tasks.flush_email_tracking_events',
+        'schedule': crontab(minute='*'),  # Every minute
+    },
     'cleanup-old-email-logs': {
         'task': 'email_automation.tasks.cleanup_old_email_logs',
         'schedule': crontab(hour=2, minute=0),  # Daily at 2 AM
     },
+    # Admin dashboard tasks
+    'refresh-platform-metrics': {
+        'task': 'admin_dashboard.tasks.refresh_platform_metrics',
+        'schedule': crontab(minute='*'),  # Every minute
+    },
+    # Notification tasks
+    'reconcile-notification-counters': {
+        'task': 'notifications.tasks.reconcile_notification_counters',
+        'schedule': crontab(minute=30),  # Hourly at half past
+    },
+    'deliver-due-notification-fanouts': {
+        'task': 'notifications.tasks.deliver_due_notification_fanouts',
+        'schedule': crontab(minute='*'),  # Every minute
+    },
+    'archive-old-notifications': {
+        'task': 'notifications.tasks.archive_old_notifications',
+        'schedule': crontab(hour=3, minute=0),  # Daily at 3 AM
+    },
 }
\ No newline at end of file
@@ -0,0 +1,10 @@
+# lms/conf.py
+from django.conf import settings
+
+
+def merged_settings(name, defaults):
+    """
+    The dict setting ``name`` with ``defaults`` filling in the keys it
+    leaves out. Read on every call, so override_settings applies.
+    """
+    return {**defaults, **getattr(settings, name, {})}
@@ -0,0 +1,29 @@
+# lms/db.py
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+
+def increment_or_create(model, key, increments, initial=None, **values):
+    """
+    Add ``increments`` ({field: amount}) to the row of ``model`` matching
+    ``key``, creating the row if there is none. The row must be unique on
+    ``key`` so that concurrent creates collide.
+
+    The UPDATE runs first, so an existing row costs one query. A new row
+    is inserted with the increments, or ``initial`` if given; if another
+    worker inserts it first, the update is applied to theirs. ``values``
+    are set on the row as they are, e.g. ``updated_at``.
+    """
+    manager = model._default_manager
+    update = {field: F(field) + amount for field, amount in increments.items()}
+    update.update(values)
+
+    with transaction.atomic(using=manager.db):
+        if manager.filter(**key).update(**update):
+            return
+        try:
+            with transaction.atomic(using=manager.db):
+                manager.create(**key, **(increments if initial is None else initial))
+        except IntegrityError:
+            # Another worker created the row first
+            manager.filter(**key).update(**update)
@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 
 from pathlib import Path
 import os
+import sys
 from datetime import timedelta
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -188,6 +189,51 @@ DEFAULT_FROM_EMAIL = EMAIL_HOST_USER
 DEFAULT_FROM_EMAIL = 'noreply@lms.com'
 SITE_NAME = 'LMS Platform'
 SITE_URL = 'http://localhost:8000'
+# Emails sent over one SMTP connection by EmailService.send_bulk_email
+EMAIL_SEND_BATCH_SIZE = 50
+# Queue entries claimed per batch, sender threads (one SMTP connection
+# each) and seconds before an unfinished claim can be taken over
+EMAIL_QUEUE_BATCH_SIZE = 50
+EMAIL_QUEUE_WORKERS = 4
+EMAIL_QUEUE_CLAIM_TIMEOUT = 600
+# In-process cache of email templates (compiled versions kept per LRU)
+EMAIL_TEMPLATE_CACHE_SIZE = 64
+EMAIL_TEMPLATE_CACHE_SECONDS = 60
+# Outbound send rate (messages per second, bursts up to BURST) shared by
+# all workers through the cache; needs a shared CACHES backend (REDIS_URL)
+# in production
+EMAIL_RATE_LIMITS = {
+    'PROVIDER_RATE': 5,
+    'PROVIDER_BURST': 20,
+    # Default per recipient domain, overridable per domain
+    'DOMAIN_RATE': 2,
+    'DOMAIN_BURST': 10,
+    'DOMAIN_LIMITS': {
+        # 'gmail.com': {'RATE': 3, 'BURST': 15},
+    },
+    # Longest a send waits for a slot before it is deferred/failed
+    'MAX_WAIT_SECONDS': 30,
+}
+# Add an open pixel and click-tracking links to outgoing HTML emails
+EMAIL_TRACKING_ENABLED = True
+# Retention of email history, applied daily in bounded batches
+EMAIL_RETENTION = {
+    # Email logs older than this many days are removed
+    'LOG_DAYS': 90,
+    # Processed queue entries older than this many days are removed
+    'QUEUE_DAYS': 30,
+    'BATCH_SIZE': 1000,
+    # Each run stops after this long; the rest is picked up the next day
+    'TIME_BUDGET_SECONDS': 60,
+    # Write removed rows to gzip'd JSONL under ARCHIVE_ROOT first
+    'ARCHIVE': False,
+    'ARCHIVE_ROOT': os.path.join(BASE_DIR, 'email_archive'),
+}
+
+# Admin list exports (admin_dashboard.ExportJob) contain personal data:
+# they are written here, outside MEDIA_ROOT, and only served through the
+# permission-checked download endpoint
+ADMIN_EXPORT_ROOT = os.path.join(BASE_DIR, 'admin_exports')
 
 # Job Board specific settings
 JOB_BOARD_SETTINGS = {
@@ -199,17 +245,68 @@ JOB_BOARD_SETTINGS = {
     'JOB_ALERT_BATCH_SIZE': 50,
 }
 
+# Notification specific settings
+NOTIFICATION_SETTINGS = {
+    # The first new video/quiz/live class of a course is delivered at once;
+    # later ones within this many seconds of the previous delivery are
+    # merged into one notification per student (0 delivers each at once)
+    'COALESCE_WINDOW_SECONDS': 60,
+    # A fan-out still running this long after its last batch (the worker
+    # died) is taken over by the next delivery attempt
+    'FANOUT_CLAIM_TIMEOUT_SECONDS': 600,
+    # Merge all content types of a course into a single digest notification
+    'DIGEST_MODE': False,
+    # Read notifications older than this many days leave the hot table
+    'RETENTION_DAYS': 90,
+    # 'archive' moves them to the archive table, 'delete' drops them
+    'RETENTION_MODE': 'archive',
+}
+
+# Meeting specific settings
+MEETING_SETTINGS = {
+    # How long a meeting's access policy (id and status) is cached for
+    # joins; saving the meeting clears it
+    'ACCESS_POLICY_CACHE_SECONDS': 30,
+}
+
 
 # Celery Configuration
-# CELERY_BROKER_URL = 'redis://localhost:6379/0'
+# Production: CELERY_BROKER_URL=redis://localhost:6379/0 in the environment.
+# Development falls back to a broker on the local filesystem, so the API
+# only writes a file and a local worker does the sending:
+#   celery -A lms worker -Q celery,email -l info
+CELERY_BROKER_URL = os.environ.get('CELERY_BROKER_URL', 'filesystem://')
 # CELERY_RESULT_BACKEND = 'redis://localhost:6379/0'
+if CELERY_BROKER_URL.startswith('filesystem://'):
+    # The folders are created by the first worker or publisher (lms.celery)
+    CELERY_BROKER_FOLDER = os.path.join(BASE_DIR, '.celery_broker')
+    CELERY_BROKER_TRANSPORT_OPTIONS = {
+        'data_folder_in': os.path.join(CELERY_BROKER_FOLDER, 'queue'),
+        'data_folder_out': os.path.join(CELERY_BROKER_FOLDER, 'queue'),
+        'processed_folder': os.path.join(CELERY_BROKER_FOLDER, 'processed'),
+        'control_folder': os.path.join(CELERY_BROKER_FOLDER, 'control'),
+        'store_processed': False,
+    }
 CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = 'UTC'
-# Add this in settings.py:
-CELERY_TASK_ALWAYS_EAGER = True
+# Email tasks get their own queue so SMTP work never waits behind (or
+# delays) other background jobs
+CELERY_TASK_ROUTES = {
+    'email_automation.tasks.*': {'queue': 'email'},
+    'individual_live_class.tasks.send_subscription_expiry_email': {'queue': 'email'},
+    'individual_live_class.tasks.send_class_reminder_email': {'queue': 'email'},
+    'meetings.views.send_meeting_reminder': {'queue': 'email'},
+}
+# Tasks only run inline under `manage.py test`; everywhere else they go
+# through the broker so requests never wait on SMTP
+TESTING = len(sys.argv) > 1 and sys.argv[1] == 'test'
+CELERY_TASK_ALWAYS_EAGER = TESTING
 CELERY_TASK_EAGER_PROPAGATES = True
+# The test run is one process, so the warnings about state shared between
+# workers don't apply to it
+SILENCED_SYSTEM_CHECKS = ['notifications.W001', 'email_automation.W001', 'chat.W001'] if TESTING else []
 
 
 # Password validation
@@ -252,10 +349,59 @@ STATIC_URL = 'static/'
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
-CHANNEL_LAYERS = {
-    "default": {
-        "BACKEND": "channels.layers.InMemoryChannelLayer"
+
+# Redis shared by every web, Daphne and Celery process (REDIS_URL, e.g.
+# redis://localhost:6379/1). Required in production: without it the
+# channel layer below is in-process, so notifications pushed from Celery
+# workers never reach sockets held by Daphne, and the cache is per process,
+# so each worker gets its own EMAIL_RATE_LIMITS buckets.
+REDIS_URL = os.environ.get('REDIS_URL')
+if REDIS_URL:
+    CHANNEL_LAYERS = {
+        "default": {
+            "BACKEND": "channels_redis.core.RedisChannelLayer",
+            "CONFIG": {"hosts": [REDIS_URL]},
+        }
+    }
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": REDIS_URL,
+            "KEY_PREFIX": "lms",
+        }
+    }
+else:
+    # Development only: one process, see notifications.checks and
+    # email_automation.checks
+    CHANNEL_LAYERS = {
+        "default": {
+            "BACKEND": "channels.layers.InMemoryChannelLayer"
+        }
     }
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        }
+    }
+
+# Who is in which meeting room (chat.presence). With a Redis URL
+# (CHAT_PRESENCE_REDIS_URL, else REDIS_URL) presence lives in Redis and is
+# shared by all Daphne workers; otherwise it is kept in the Django cache,
+# which is per process with LocMemCache. Running more than one Daphne
+# worker requires one of the two (see chat.checks).
+CHAT_PRESENCE = {
+    'REDIS_URL': os.environ.get('CHAT_PRESENCE_REDIS_URL') or REDIS_URL,
+    # Users whose connection stopped sending heartbeats for this long are
+    # dropped from the room (e.g. their worker died)
+    'TTL_SECONDS': 60,
+    'HEARTBEAT_SECONDS': 20,
+}
+
+# Meeting chat messages are broadcast at once and saved in batches
+# (chat.buffer): every FLUSH_INTERVAL_MS or once MAX_MESSAGES are waiting
+CHAT_MESSAGE_BUFFER = {
+    'FLUSH_INTERVAL_MS': 200,
+    'MAX_MESSAGES': 100,
 }
 
 
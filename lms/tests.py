@@ -0,0 +1,102 @@
+import unittest
+from datetime import date
+from decimal import Decimal
+from unittest import mock
+
+from django.core.cache import caches
+from django.db.models import QuerySet
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from payments.models import RevenueDaily
+
+from .cache import CacheLock
+from .conf import merged_settings
+from .db import increment_or_create
+
+try:
+    import fakeredis
+except ImportError:
+    fakeredis = None
+
+
+class MergedSettingsTests(SimpleTestCase):
+    """Dict settings merged over their defaults"""
+
+    def test_setting_overrides_only_its_own_keys(self):
+        defaults = {'RATE': 1, 'BURST': 5}
+        self.assertEqual(merged_settings('LMS_TEST_OPTIONS', defaults), defaults)
+        with override_settings(LMS_TEST_OPTIONS={'RATE': 3}):
+            self.assertEqual(merged_settings('LMS_TEST_OPTIONS', defaults), {'RATE': 3, 'BURST': 5})
+        self.assertEqual(defaults, {'RATE': 1, 'BURST': 5})
+
+
+class IncrementOrCreateTests(TestCase):
+    """Counter rows updated in place or created once"""
+
+    key = {'date': date(2026, 1, 1), 'source': 'course', 'course': None, 'teacher': None, 'gateway': ''}
+
+    def totals(self):
+        return list(RevenueDaily.objects.values_list('amount', 'payment_count'))
+
+    def test_creates_then_increments(self):
+        increment_or_create(RevenueDaily, self.key, {'amount': Decimal('10'), 'payment_count': 1})
+        increment_or_create(RevenueDaily, self.key, {'amount': Decimal('-4'), 'payment_count': 2})
+        self.assertEqual(self.totals(), [(Decimal('6'), 3)])
+
+    def test_row_created_by_another_worker_is_incremented(self):
+        calls = []
+
+        def update(queryset, **fields):
+            calls.append(fields)
+            if len(calls) == 1:
+                # Our UPDATE found no row, then another worker inserted it
+                RevenueDaily.objects.bulk_create([RevenueDaily(amount=Decimal('5'), payment_count=1, **self.key)])
+                return 0
+            return real_update(queryset, **fields)
+
+        real_update = QuerySet.update
+        with mock.patch.object(QuerySet, 'update', autospec=True, side_effect=update):
+            increment_or_create(RevenueDaily, self.key, {'amount': Decimal('10'), 'payment_count': 1})
+
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(self.totals(), [(Decimal('15'), 2)])
+
+
+class CacheLockTests(SimpleTestCase):
+    """Mutual exclusion through the default cache"""
+
+    def setUp(self):
+        caches['default'].clear()
+
+    def test_held_lock_is_not_taken(self):
+        lock = CacheLock('lock', timeout=5)
+        token = lock.acquire(wait=0)
+        self.assertIsNotNone(token)
+        self.assertIsNone(lock.acquire(wait=0.05))
+
+        lock.release(token)
+        self.assertIsNotNone(lock.acquire(wait=0))
+
+    def test_expired_holder_does_not_release_the_next_one(self):
+        lock = CacheLock('lock', timeout=5)
+        expired = lock.acquire(wait=0)
+        # The lock expired and another worker took it
+        caches['default'].set('lock', 'other', 5)
+
+        lock.release(expired)
+        self.assertEqual(caches['default'].get('lock'), 'other')
+
+
+@unittest.skipIf(fakeredis is None, 'fakeredis[lua] is not installed')
+class RedisCacheLockTests(CacheLockTests):
+    """Compare-and-delete release with Django's RedisCache"""
+
+    def setUp(self):
+        settings = override_settings(CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': 'redis://fake',
+            'OPTIONS': {'connection_class': fakeredis.FakeConnection},
+        }})
+        settings.enable()
+        self.addCleanup(settings.disable)
+        super().setUp()
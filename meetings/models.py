@@ -1,6 +1,10 @@
 # meeting/models.py
 
+from django.conf import settings
+from django.core.cache import cache
 from django.db import models
+from django.db.models import Count, Exists, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
 from authentication.models import User
 from courses.models import Course,Enrollment,Video,Progress
 from payments.models import Payment
@@ -10,6 +14,42 @@ import uuid
 import random
 import string
 
+# Meeting fields joins can be turned away on before touching the database.
+# No secrets: the cache may be shared, and everything else is checked on
+# the meeting row the join loads anyway
+ACCESS_POLICY_FIELDS = ('id', 'status')
+
+
+class MeetingQuerySet(models.QuerySet):
+    """
+    Join checks are resolved in the meeting query itself, so a join costs
+    one query for the meeting, enrollment, payment, invite and join
+    request status instead of one each.
+    """
+    
+    def with_join_access(self, user):
+        """
+        Annotate each meeting with what ``user`` may do: is_enrolled and
+        has_paid (for the meeting's course), is_invited, their latest
+        join request and the number of participants still in the meeting
+        """
+        meeting = OuterRef('pk')
+        join_requests = JoinRequest.objects.filter(meeting=meeting, user=user).order_by('-requested_at')
+        return self.select_related('host', 'course__teacher__user').annotate(
+            is_enrolled=Exists(Enrollment.objects.filter(course=OuterRef('course'), student__user=user)),
+            has_paid=Exists(Payment.objects.filter(course=OuterRef('course'), user=user, is_successful=True)),
+            is_invited=Exists(MeetingInvite.objects.filter(Q(user=user) | Q(email=user.email), meeting=meeting)),
+            join_request_id=Subquery(join_requests.values('id')[:1]),
+            join_request_status=Subquery(join_requests.values('status')[:1]),
+            active_participants=Coalesce(
+                Subquery(
+                    Participant.objects.filter(meeting=meeting, left_at__isnull=True)
+                    .order_by().values('meeting').annotate(count=Count('id')).values('count')
+                ),
+                Value(0)
+            ),
+        )
+
 
 class Meeting(models.Model):
     MEETING_STATUS = [
@@ -69,6 +109,8 @@ class Meeting(models.Model):
         #     self.password = self.generate_password()
         # super().save(*args, **kwargs)
 
+    objects = MeetingQuerySet.as_manager()
+
     def save(self, *args, **kwargs):
         if not self.meeting_id:
             self.meeting_id = self.generate_meeting_id()
@@ -76,6 +118,44 @@ class Meeting(models.Model):
             print("save passwrod")
             self.password = self.generate_password()
         super().save(*args, **kwargs)
+        cache.delete(self.access_policy_cache_key(self.meeting_id))
+    
+    def delete(self, *args, **kwargs):
+        cache.delete(self.access_policy_cache_key(self.meeting_id))
+        return super().delete(*args, **kwargs)
+    
+    @staticmethod
+    def access_policy_cache_key(meeting_id):
+        return f"meeting_access_policy:{meeting_id}"
+    
+    @classmethod
+    def get_access_policy(cls, meeting_id):
+        """
+        The meeting's ACCESS_POLICY_FIELDS, cached for a few seconds so a
+        lecture's students joining at once don't each look it up
+
+        Saving the meeting clears the entry only in a shared cache, so
+        another worker may see a stale status. Only 'ended' is final and
+        safe to reject on; joins recheck status and password on the
+        meeting they load.
+
+        Returns:
+            dict: Policy fields, or None if there is no such meeting
+        """
+        try:
+            meeting_id = uuid.UUID(str(meeting_id))
+        except ValueError:
+            return None
+        
+        key = cls.access_policy_cache_key(meeting_id)
+        policy = cache.get(key)
+        if policy is None:
+            policy = cls.objects.filter(meeting_id=meeting_id).values(*ACCESS_POLICY_FIELDS).first()
+            if policy is None:
+                return None
+            timeout = getattr(settings, 'MEETING_SETTINGS', {}).get('ACCESS_POLICY_CACHE_SECONDS', 30)
+            cache.set(key, policy, timeout)
+        return policy
     
     @staticmethod
     def generate_meeting_id():
@@ -93,8 +173,7 @@ class Meeting(models.Model):
     def get_enrolled_students(self):
         """Get students enrolled in course for lecture meetings"""
         if self.meeting_type == 'lecture' and self.course:
-            return self.course.enrollments.filter(studentt__student_profile__isnull=False
-        ).select_related('student__student_profile')
+            return self.course.enrollments.select_related('student__user')
         return []
 
     def start_meeting(self):
@@ -128,31 +207,31 @@ class Meeting(models.Model):
         return None
     
     def can_user_join(self, user):
-        """Check if user can join the meeting"""
+        """
+        Check if user can join the meeting
+
+        Uses the with_join_access annotations when the meeting was loaded
+        with them (for this user), otherwise looks them up in one query.
+        """
         # Host can always join
-        if self.host == user:
+        if self.host_id == user.pk:
             return True, "Host can join"
         
         # For course lectures, check enrollment and payment
-        if self.meeting_type == 'lecture' and self.course:
-            # Check if user is enrolled in the course
-          
-            try:
-                enrollment = Enrollment.objects.get(student=user, course=self.course,student__student_profile__isnull=False)
-            except Enrollment.DoesNotExist:
+        if self.meeting_type == 'lecture' and self.course_id:
+            if hasattr(self, 'is_enrolled'):
+                access = {'is_enrolled': self.is_enrolled, 'has_paid': self.has_paid}
+            else:
+                access = Meeting.objects.with_join_access(user).filter(pk=self.pk).values(
+                    'is_enrolled', 'has_paid'
+                ).get()
+            
+            if not access['is_enrolled']:
                 return False, "You are not enrolled in this course"
             
             # Check payment for paid courses
-            if self.course.course_type == 'paid':
-              
-                payment_exists = Payment.objects.filter(
-                    user=user,
-                    is_successful=True,
-                    # You might want to link payment to course instead of meeting
-                ).exists()
-                
-                if not payment_exists:
-                    return False, "Please complete payment first to attend this lecture"
+            if self.course.course_type == 'paid' and not access['has_paid']:
+                return False, "Please complete payment first to attend this lecture"
         
         return True, "Can join"
     
@@ -30,6 +30,8 @@ class MeetingSerializer(serializers.ModelSerializer):
     
     def get_participants_count(self, obj):
         """Get count of active participants"""
+        if hasattr(obj, 'active_participants'):
+            return obj.active_participants
         return obj.participants.filter(left_at__isnull=True).count()
     
     def get_is_active(self, obj):
@@ -157,26 +159,37 @@ class JoinMeetingSerializer(serializers.Serializer):
     
     def validate_meeting_id(self, value):
         """Validate meeting exists and is joinable"""
-        try:
-            meeting = Meeting.objects.get(meeting_id=value)
-            if meeting.status == 'ended':
-                raise serializers.ValidationError("Meeting has ended")
-            return value
-        except Meeting.DoesNotExist:
+        policy = Meeting.get_access_policy(value)
+        if policy is None:
             raise serializers.ValidationError("Meeting not found")
+        if policy['status'] == 'ended':
+            raise serializers.ValidationError("Meeting has ended")
+        return value
     
     def validate(self, data):
         """Validate join request"""
         try:
-            meeting = Meeting.objects.get(meeting_id=data['meeting_id'])
+            policy = Meeting.get_access_policy(data['meeting_id'])
+            if policy is None:
+                raise Meeting.DoesNotExist
+            
+            request = self.context.get('request')
+            authenticated = request and request.user.is_authenticated
+            if authenticated:
+                meeting = Meeting.objects.with_join_access(request.user).get(pk=policy['id'])
+            else:
+                meeting = Meeting.objects.get(pk=policy['id'])
+            
+            # The cached policy may be stale; the loaded row decides
+            if meeting.status == 'ended':
+                raise serializers.ValidationError("Meeting has ended")
             
             # Check password if meeting has one
             if meeting.password and data.get('password') != meeting.password:
                 raise serializers.ValidationError("Invalid meeting password")
             
             # Check if user can join (payment, enrollment, etc.)
-            request = self.context.get('request')
-            if request and request.user.is_authenticated:
+            if authenticated:
                 can_join, message = meeting.can_user_join(request.user)
                 if not can_join:
                     raise serializers.ValidationError(message)
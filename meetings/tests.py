@@ -1,3 +1,115 @@
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.test import TestCase
+from rest_framework.test import APIClient
+
+from courses.models import Course, Enrollment
+from payments.models import Payment
+
+from .models import Meeting, MeetingInvite, Participant
+
+User = get_user_model()
+
+
+class MeetingJoinTests(TestCase):
+    """Who may join a meeting, and what the cached access policy decides"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.host = User.objects.create_user(username='teacher', email='teacher@example.com', role='teacher')
+        cls.student = User.objects.create_user(username='student', email='student@example.com', role='student')
+        cls.course = Course.objects.create(
+            title='Algebra', description='', teacher=cls.host.teacher_profile, course_type='paid', price=50
+        )
+        cls.other_course = Course.objects.create(
+            title='Geometry', description='', teacher=cls.host.teacher_profile, course_type='paid', price=50
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.student)
+
+    def meeting(self, **fields):
+        return Meeting.objects.create(host=self.host, title='Class', **fields)
+
+    def join(self, meeting, password=None):
+        data = {'meeting_id': str(meeting.meeting_id)}
+        if password is not None:
+            data['password'] = password
+        return self.client.post(f'/api/meetings/join/{meeting.meeting_id}/', data)
+
+    def assertJoined(self, response):
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertTrue(Participant.objects.filter(user=self.student, left_at__isnull=True).exists())
+
+    def assertRefused(self, response, message, status_code=400):
+        self.assertEqual(response.status_code, status_code)
+        self.assertIn(message, str(response.data))
+
+    def pay(self, course):
+        Payment.objects.create(
+            user=self.student, course=course, gateway='jazzcash', txn_ref=f'txn-{course.pk}',
+            amount=Decimal('50'), is_successful=True
+        )
+
+    def test_lecture_requires_enrollment_in_its_course(self):
+        meeting = self.meeting(meeting_type='lecture', course=self.course)
+        self.pay(self.course)
+        self.assertRefused(self.join(meeting), 'You are not enrolled in this course')
+
+        Enrollment.objects.create(student=self.student.student_profile, course=self.course)
+        self.assertJoined(self.join(meeting))
+
+    def test_lecture_requires_payment_for_its_own_course(self):
+        meeting = self.meeting(meeting_type='lecture', course=self.course)
+        Enrollment.objects.create(student=self.student.student_profile, course=self.course)
+        self.pay(self.other_course)
+        self.assertRefused(self.join(meeting), 'Please complete payment first')
+
+        self.pay(self.course)
+        self.assertJoined(self.join(meeting))
+
+    def test_private_meeting_accepts_invites_by_user_or_email(self):
+        meeting = self.meeting(access_type='private')
+        self.assertRefused(self.join(meeting), 'not invited', status_code=403)
+
+        MeetingInvite.objects.create(meeting=meeting, user=self.student, email='old@example.com', invited_by=self.host)
+        self.assertJoined(self.join(meeting))
+
+        by_email = self.meeting(access_type='private')
+        MeetingInvite.objects.create(meeting=by_email, email=self.student.email, invited_by=self.host)
+        self.assertJoined(self.join(by_email))
+
+    def test_cached_policy_holds_no_password(self):
+        meeting = self.meeting(is_password_required=True)
+
+        policy = Meeting.get_access_policy(meeting.meeting_id)
+
+        self.assertEqual(policy, {'id': meeting.pk, 'status': 'waiting'})
+        self.assertNotIn(meeting.password, str(cache.get(Meeting.access_policy_cache_key(meeting.meeting_id))))
+
+    def test_stale_policy_does_not_admit_joins(self):
+        meeting = self.meeting(is_password_required=True)
+        old_password = meeting.password
+        Meeting.get_access_policy(meeting.meeting_id)
+
+        # Changed by another worker, whose save cleared only its own cache
+        Meeting.objects.filter(pk=meeting.pk).update(password='changed')
+        self.assertRefused(self.join(meeting, old_password), 'Invalid meeting password')
+        self.assertJoined(self.join(meeting, 'changed'))
+
+        Meeting.objects.filter(pk=meeting.pk).update(status='ended')
+        self.assertEqual(Meeting.get_access_policy(meeting.meeting_id)['status'], 'waiting')
+        self.assertRefused(self.join(meeting, 'changed'), 'Meeting has ended')
+
+    def test_saving_clears_the_cached_policy(self):
+        meeting = self.meeting()
+        Meeting.get_access_policy(meeting.meeting_id)
+
+        meeting.end_meeting()
 
-# Create your tests here.
+        self.assertEqual(Meeting.get_access_policy(meeting.meeting_id)['status'], 'ended')
+        self.assertRefused(self.join(meeting), 'Meeting has ended')
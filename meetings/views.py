@@ -15,7 +15,7 @@ from asgiref.sync import async_to_sync
 import random
 from authentication.models import User
 from django.utils.text import slugify
-from django.core.mail import send_mail
+from email_automation.dispatch import send_mail_async
 from django.conf import settings
 from calendersync.utils import create_google_event
 from celery import shared_task
@@ -49,7 +49,7 @@ def send_meeting_reminder(meeting_id):
         elif meeting.meeting_type == 'lecture' and meeting.course:
             enrolled_students = meeting.get_enrolled_students()
             for enrollment in enrolled_students:
-                send_meeting_start_notification(enrollment.student, meeting, is_host=False)
+                send_meeting_start_notification(enrollment.student.user, meeting, is_host=False)
         
         # For public meetings, only notify host
         elif meeting.access_type == 'public':
@@ -127,7 +127,7 @@ def send_meeting_start_email(email, meeting, is_host=False):
             Your Meeting Platform
             """
         
-        send_mail(
+        send_mail_async(
             subject=subject,
             message=message,
             from_email=settings.DEFAULT_FROM_EMAIL,
@@ -160,7 +160,7 @@ def send_meeting_start_email_to_guest(email, meeting):
         Your Meeting Platform
         """
         
-        send_mail(
+        send_mail_async(
             subject=subject,
             message=message,
             from_email=settings.DEFAULT_FROM_EMAIL,
@@ -199,7 +199,7 @@ def send_meeting_invitation_email(email, meeting, invited_by):
         Your Meeting Platform
         """
         
-        send_mail(
+        send_mail_async(
             subject=subject,
             message=message,
             from_email=settings.DEFAULT_FROM_EMAIL,
@@ -298,7 +298,7 @@ def create_meeting(request):
     if meeting.meeting_type == 'lecture' and meeting.course:
         enrolled_students = meeting.get_enrolled_students()
         for enrollment in enrolled_students:
-            send_meeting_invitation_email(enrollment.student, meeting, request.user)
+            send_meeting_invitation_email(enrollment.student.user.email, meeting, request.user)
     
     # Host automatically joins as participant
     participant = Participant.objects.create(
@@ -339,7 +339,7 @@ def create_meeting(request):
             Your Meeting Platform
             """
             
-            send_mail(
+            send_mail_async(
                 subject=subject,
                 message=message,
                 from_email=settings.DEFAULT_FROM_EMAIL,
@@ -389,9 +389,23 @@ def join_meeting(request, meeting_id):
         )
     
     try:
-        meeting = Meeting.objects.get(meeting_id=meeting_id)
+        # The briefly cached policy turns away ended meetings early
+        policy = Meeting.get_access_policy(meeting_id)
+        if policy is None:
+            raise Meeting.DoesNotExist
+        
+        if policy['status'] == 'ended':
+            return Response({
+                'error': 'Meeting has ended'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        # The serializer already loaded the meeting with the user's
+        # enrollment, payment, invite and join request status
+        meeting = serializer.validated_data['meeting']
+        if meeting.pk != policy['id'] or not hasattr(meeting, 'active_participants'):
+            meeting = Meeting.objects.with_join_access(request.user).get(pk=policy['id'])
         
-        # Check if meeting exists and is active
+        # The policy may be stale on this worker; the loaded row decides
         if meeting.status == 'ended':
             return Response({
                 'error': 'Meeting has ended'
@@ -399,7 +413,6 @@ def join_meeting(request, meeting_id):
         
         # 🔐 Handle password check
         if meeting.is_password_required:
-            print("passowrd :",meeting.is_password_required)
             password = serializer.validated_data.get('password', None)
             if not password:
                 return Response({
@@ -411,8 +424,7 @@ def join_meeting(request, meeting_id):
                 }, status=status.HTTP_401_UNAUTHORIZED)
         
         # Check max participants
-        active_participants = meeting.participants.filter(left_at__isnull=True).count()
-        if active_participants >= meeting.max_participants:
+        if meeting.active_participants >= meeting.max_participants:
             return Response({
                 'error': 'Meeting is full'
             }, status=status.HTTP_400_BAD_REQUEST)
@@ -445,12 +457,7 @@ def join_meeting(request, meeting_id):
         
         elif meeting.access_type == 'private':
             # Check if user is invited
-            invite_exists = MeetingInvite.objects.filter(
-                meeting=meeting,
-                email=user.email
-            ).exists()
-            
-            if invite_exists or user == meeting.host:
+            if meeting.is_invited or user.pk == meeting.host_id:
                 access_granted = True
             else:
                 return Response({
@@ -459,7 +466,7 @@ def join_meeting(request, meeting_id):
         
         elif meeting.access_type == 'approval_required':
             # Check if user is host
-            if user == meeting.host:
+            if user.pk == meeting.host_id or meeting.join_request_status == 'approved':
                 access_granted = True
             else:
                 # Create or get existing join request
@@ -495,7 +502,7 @@ def join_meeting(request, meeting_id):
             }, status=status.HTTP_403_FORBIDDEN)
         
         # Check if user already in meeting
-        participant, created = Participant.objects.get_or_create(
+        participant, created = Participant.objects.select_related('user').get_or_create(
             meeting=meeting,
             user=user,
             defaults={
@@ -503,6 +510,8 @@ def join_meeting(request, meeting_id):
                 'guest_name': user.username
             }
         )
+        if created or participant.left_at is not None:
+            meeting.active_participants += 1
         
         # if not created and participant.is_active:
         #     return Response({
@@ -513,7 +522,7 @@ def join_meeting(request, meeting_id):
         if not created:
             participant.left_at = None
             participant.guest_name = user.username
-            participant.save()
+            participant.save(update_fields=['left_at', 'guest_name'])
         
         # Start meeting if host joins
         if meeting.status == 'waiting' and participant.role == 'host':
@@ -1042,7 +1051,7 @@ def send_meeting_invitation(invite):
         Meeting Team
         """
         
-        send_mail(
+        send_mail_async(
             subject,
             message,
             settings.DEFAULT_FROM_EMAIL,
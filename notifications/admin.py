@@ -1,7 +1,25 @@
 # notifications/admin.py
 
 from django.contrib import admin
-from .models import Notification
+from .models import (
+    ArchivedNotification, Notification, NotificationCounter, NotificationFanout,
+    NotificationReadMark, NotificationReadState
+)
+
+
+class ReadStatusFilter(admin.SimpleListFilter):
+    title = 'read'
+    parameter_name = 'is_read'
+    
+    def lookups(self, request, model_admin):
+        return [('true', 'Yes'), ('false', 'No')]
+    
+    def queryset(self, request, queryset):
+        if self.value() == 'true':
+            return queryset.filter(is_read=True)
+        if self.value() == 'false':
+            return queryset.filter(is_read=False)
+        return queryset
 
 
 @admin.register(Notification)
@@ -11,12 +29,12 @@ class NotificationAdmin(admin.ModelAdmin):
         'recipient', 
         'sender', 
         'notification_type', 
-        'is_read', 
+        'read_status', 
         'created_at'
     ]
     list_filter = [
         'notification_type', 
-        'is_read', 
+        ReadStatusFilter, 
         'created_at',
         'course'
     ]
@@ -27,7 +45,7 @@ class NotificationAdmin(admin.ModelAdmin):
         'sender__email',
         'course__title'
     ]
-    readonly_fields = ['created_at', 'read_at']
+    readonly_fields = ['created_at', 'read_status', 'read_at']
     date_hierarchy = 'created_at'
     
     fieldsets = (
@@ -39,23 +57,24 @@ class NotificationAdmin(admin.ModelAdmin):
             'classes': ('collapse',)
         }),
         ('Status', {
-            'fields': ('is_read', 'created_at', 'read_at')
+            'fields': ('read_status', 'created_at', 'read_at')
         }),
     )
     
     def get_queryset(self, request):
         queryset = super().get_queryset(request)
-        return queryset.select_related(
+        return queryset.with_read_state().select_related(
             'recipient', 'sender', 'course', 'video', 'quiz', 'meeting'
         )
     
+    @admin.display(boolean=True, description='Read')
+    def read_status(self, obj):
+        return obj.is_read
+    
     actions = ['mark_as_read', 'mark_as_unread']
     
     def mark_as_read(self, request, queryset):
-        updated = 0
-        for notification in queryset.filter(is_read=False):
-            notification.mark_as_read()
-            updated += 1
+        updated = NotificationReadMark.set_state(queryset, is_read=True)
         
         self.message_user(
             request, 
@@ -64,9 +83,39 @@ class NotificationAdmin(admin.ModelAdmin):
     mark_as_read.short_description = "Mark selected notifications as read"
     
     def mark_as_unread(self, request, queryset):
-        updated = queryset.filter(is_read=True).update(is_read=False, read_at=None)
+        updated = NotificationReadMark.set_state(queryset, is_read=False)
         self.message_user(
             request, 
             f'{updated} notifications were successfully marked as unread.'
         )
-    mark_as_unread.short_description = "Mark selected notifications as unread"
\ No newline at end of file
+    mark_as_unread.short_description = "Mark selected notifications as unread"
+
+
+@admin.register(NotificationCounter)
+class NotificationCounterAdmin(admin.ModelAdmin):
+    list_display = ['user', 'notification_type', 'total_count', 'unread_count', 'updated_at']
+    list_filter = ['notification_type']
+    search_fields = ['user__email']
+    readonly_fields = ['updated_at']
+
+
+@admin.register(NotificationFanout)
+class NotificationFanoutAdmin(admin.ModelAdmin):
+    list_display = ['title', 'course', 'notification_type', 'event_count', 'status', 'processed_recipients', 'total_recipients', 'deliver_after', 'created_at']
+    list_filter = ['notification_type', 'status']
+    search_fields = ['title', 'course__title']
+    readonly_fields = ['created_at', 'started_at', 'completed_at', 'last_enrollment_id']
+
+
+@admin.register(NotificationReadState)
+class NotificationReadStateAdmin(admin.ModelAdmin):
+    list_display = ['user', 'last_read_id', 'last_read_at']
+    search_fields = ['user__email']
+
+
+@admin.register(ArchivedNotification)
+class ArchivedNotificationAdmin(admin.ModelAdmin):
+    list_display = ['title', 'recipient', 'notification_type', 'created_at', 'archived_at']
+    list_filter = ['notification_type']
+    search_fields = ['title', 'recipient__email']
+    date_hierarchy = 'created_at'
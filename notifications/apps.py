@@ -6,4 +6,5 @@ class NotificationsConfig(AppConfig):
     name = 'notifications'
     
     def ready(self):
+        import notifications.checks
         import notifications.signals
\ No newline at end of file
@@ -0,0 +1,23 @@
+# notifications/checks.py
+
+from django.conf import settings
+from django.core.checks import Warning, register
+
+
+@register()
+def check_channel_layer(app_configs, **kwargs):
+    """
+    Notifications are pushed from Celery workers as well as web requests;
+    an in-process channel layer only reaches sockets of the same process
+    """
+    backend = getattr(settings, 'CHANNEL_LAYERS', {}).get('default', {}).get('BACKEND', '')
+    if backend != 'channels.layers.InMemoryChannelLayer':
+        return []
+    return [
+        Warning(
+            "CHANNEL_LAYERS uses InMemoryChannelLayer, so notifications created "
+            "by Celery workers are never pushed to sockets held by Daphne.",
+            hint="Set REDIS_URL to use channels_redis.",
+            id='notifications.W001',
+        )
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 5.2.1 on 2026-10-19 04:49
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def populate_counters(apps, schema_editor):
+    Notification = apps.get_model('notifications', 'Notification')
+    NotificationCounter = apps.get_model('notifications', 'NotificationCounter')
+
+    rows = (
+        Notification.objects.values('recipient_id', 'notification_type')
+        .annotate(total=Count('id'), unread=Count('id', filter=Q(is_read=False)))
+        .order_by()
+    )
+    NotificationCounter.objects.bulk_create(
+        (
+            NotificationCounter(
+                user_id=row['recipient_id'],
+                notification_type=row['notification_type'],
+                total_count=row['total'],
+                unread_count=row['unread'],
+            )
+            for row in rows.iterator()
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('notification_type', models.CharField(max_length=30)),
+                ('total_count', models.IntegerField(default=0)),
+                ('unread_count', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='notification_counters', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'notification_counters',
+                'unique_together': {('user', 'notification_type')},
+            },
+        ),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
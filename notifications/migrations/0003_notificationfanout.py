@@ -0,0 +1,44 @@
+# Generated by Django 5.2.1 on 2026-10-19 04:50
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0004_assignment_topic'),
+        ('meetings', '0002_meeting_allow_student_recording_access'),
+        ('notifications', '0002_notificationcounter'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationFanout',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('notification_type', models.CharField(choices=[('video_upload', 'New Video Uploaded'), ('quiz_created', 'New Quiz Created'), ('student_enrolled', 'Student Enrolled'), ('live_class_scheduled', 'Live Class Scheduled'), ('payment_completed', 'Payment Completed'), ('meeting_start', 'Meeting Start'), ('general', 'General Notification')], max_length=30)),
+                ('title', models.CharField(max_length=255)),
+                ('message', models.TextField()),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('completed', 'Completed'), ('failed', 'Failed')], default='pending', max_length=20)),
+                ('total_recipients', models.PositiveIntegerField(default=0)),
+                ('processed_recipients', models.PositiveIntegerField(default=0)),
+                ('last_enrollment_id', models.BigIntegerField(default=0)),
+                ('error_message', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='courses.course')),
+                ('meeting', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='meetings.meeting')),
+                ('quiz', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='courses.quiz')),
+                ('sender', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='notification_fanouts', to=settings.AUTH_USER_MODEL)),
+                ('video', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='courses.video')),
+            ],
+            options={
+                'db_table': 'notification_fanouts',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
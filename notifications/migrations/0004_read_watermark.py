@@ -0,0 +1,111 @@
+# Generated by Django 5.2.1 on 2026-10-19 04:53
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Max, Min, Q
+
+
+def move_read_state_to_watermarks(apps, schema_editor):
+    """
+    Put each user's watermark just below their oldest unread notification
+    and keep the notifications read individually above it as exceptions
+    """
+    Notification = apps.get_model('notifications', 'Notification')
+    NotificationReadState = apps.get_model('notifications', 'NotificationReadState')
+    NotificationReadMark = apps.get_model('notifications', 'NotificationReadMark')
+
+    watermarks = {}
+    states = []
+    rows = (
+        Notification.objects.values('recipient_id')
+        .annotate(
+            last_id=Max('id'),
+            first_unread_id=Min('id', filter=Q(is_read=False)),
+            last_read_at=Max('read_at', filter=Q(is_read=True)),
+        )
+        .order_by()
+    )
+    for row in rows.iterator():
+        if row['first_unread_id'] is None:
+            last_read_id = row['last_id']
+        else:
+            last_read_id = row['first_unread_id'] - 1
+        watermarks[row['recipient_id']] = last_read_id
+        if last_read_id:
+            states.append(NotificationReadState(
+                user_id=row['recipient_id'],
+                last_read_id=last_read_id,
+                last_read_at=row['last_read_at'],
+            ))
+    NotificationReadState.objects.bulk_create(states, batch_size=1000)
+
+    marks = (
+        NotificationReadMark(
+            notification_id=notification_id,
+            user_id=recipient_id,
+            is_read=True,
+            read_at=read_at,
+        )
+        for notification_id, recipient_id, read_at in Notification.objects.filter(is_read=True)
+        .values_list('id', 'recipient_id', 'read_at')
+        .iterator()
+        if notification_id > watermarks.get(recipient_id, 0)
+    )
+    NotificationReadMark.objects.bulk_create(marks, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0004_user_list_indexes'),
+        ('notifications', '0003_notificationfanout'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationReadMark',
+            fields=[
+                ('notification', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='read_mark', serialize=False, to='notifications.notification')),
+                ('is_read', models.BooleanField()),
+                ('read_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'db_table': 'notification_read_marks',
+            },
+        ),
+        migrations.CreateModel(
+            name='NotificationReadState',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='notification_read_state', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('last_read_id', models.BigIntegerField(default=0)),
+                ('last_read_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'db_table': 'notification_read_states',
+            },
+        ),
+        migrations.AddField(
+            model_name='notificationreadmark',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='notification_read_marks', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='notificationreadmark',
+            index=models.Index(fields=['user', 'notification'], name='notificatio_user_id_1a585e_idx'),
+        ),
+        migrations.RunPython(move_read_state_to_watermarks, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='notification',
+            name='notificatio_recipie_4e3567_idx',
+        ),
+        migrations.RemoveField(
+            model_name='notification',
+            name='is_read',
+        ),
+        migrations.RemoveField(
+            model_name='notification',
+            name='read_at',
+        ),
+    ]
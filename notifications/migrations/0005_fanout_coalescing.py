@@ -0,0 +1,51 @@
+# Generated by Django 5.2.1 on 2026-10-19 04:56
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0004_assignment_topic'),
+        ('meetings', '0002_meeting_allow_student_recording_access'),
+        ('notifications', '0004_read_watermark'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notificationfanout',
+            name='deliver_after',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='notificationfanout',
+            name='event_count',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.AddField(
+            model_name='notificationfanout',
+            name='event_counts',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='notificationfanout',
+            name='event_titles',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.AlterField(
+            model_name='notification',
+            name='notification_type',
+            field=models.CharField(choices=[('video_upload', 'New Video Uploaded'), ('quiz_created', 'New Quiz Created'), ('student_enrolled', 'Student Enrolled'), ('live_class_scheduled', 'Live Class Scheduled'), ('payment_completed', 'Payment Completed'), ('meeting_start', 'Meeting Start'), ('course_digest', 'Course Updates Digest'), ('general', 'General Notification')], max_length=30),
+        ),
+        migrations.AlterField(
+            model_name='notificationfanout',
+            name='notification_type',
+            field=models.CharField(choices=[('video_upload', 'New Video Uploaded'), ('quiz_created', 'New Quiz Created'), ('student_enrolled', 'Student Enrolled'), ('live_class_scheduled', 'Live Class Scheduled'), ('payment_completed', 'Payment Completed'), ('meeting_start', 'Meeting Start'), ('course_digest', 'Course Updates Digest'), ('general', 'General Notification')], max_length=30),
+        ),
+        migrations.AddIndex(
+            model_name='notificationfanout',
+            index=models.Index(fields=['course', 'status', 'deliver_after'], name='notificatio_course__03bcac_idx'),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.1 on 2026-10-19 04:57
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0004_assignment_topic'),
+        ('meetings', '0002_meeting_allow_student_recording_access'),
+        ('notifications', '0005_fanout_coalescing'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedNotification',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('sender_id', models.UUIDField(blank=True, null=True)),
+                ('notification_type', models.CharField(choices=[('video_upload', 'New Video Uploaded'), ('quiz_created', 'New Quiz Created'), ('student_enrolled', 'Student Enrolled'), ('live_class_scheduled', 'Live Class Scheduled'), ('payment_completed', 'Payment Completed'), ('meeting_start', 'Meeting Start'), ('course_digest', 'Course Updates Digest'), ('general', 'General Notification')], max_length=30)),
+                ('title', models.CharField(max_length=255)),
+                ('message', models.TextField()),
+                ('course_id', models.BigIntegerField(blank=True, null=True)),
+                ('created_at', models.DateTimeField()),
+                ('read_at', models.DateTimeField(blank=True, null=True)),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'db_table': 'notification_archive',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['created_at', 'id'], name='notificatio_created_a853cd_idx'),
+        ),
+        migrations.AddField(
+            model_name='archivednotification',
+            name='recipient',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_notifications', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='archivednotification',
+            index=models.Index(fields=['recipient', '-created_at'], name='notificatio_recipie_ce227b_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-19 06:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0006_notification_archive'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notificationfanout',
+            name='claimed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -1,14 +1,62 @@
 # notifications/models.py
 
-from django.db import models
+import logging
+from collections import defaultdict
+
+from django.db import models, transaction
+from django.db.models import F, Sum, Max, Case, When, Value
+from django.db.models.functions import Coalesce
 from django.conf import settings
 from django.utils import timezone
 from courses.models import Course, Video, Quiz
+from lms.db import increment_or_create
 from meetings.models import Meeting
 
+logger = logging.getLogger(__name__)
+
 User = settings.AUTH_USER_MODEL
 
 
+class NotificationQuerySet(models.QuerySet):
+    """
+    Read state is not stored per row: a notification is read when its id is
+    at or below the recipient's read watermark, unless a NotificationReadMark
+    says otherwise.
+    """
+    
+    def with_read_state(self):
+        """Annotate each notification with its effective is_read and read_at"""
+        watermark = Coalesce(F('recipient__notification_read_state__last_read_id'), Value(0))
+        return self.annotate(
+            is_read=Case(
+                When(read_mark__isnull=False, then=F('read_mark__is_read')),
+                When(id__lte=watermark, then=Value(True)),
+                default=Value(False),
+                output_field=models.BooleanField()
+            ),
+            read_at=Case(
+                When(read_mark__isnull=False, then=F('read_mark__read_at')),
+                When(id__lte=watermark, then=F('recipient__notification_read_state__last_read_at')),
+                default=Value(None),
+                output_field=models.DateTimeField()
+            )
+        )
+    
+    def _fetch_all(self):
+        fetched = self._result_cache is None
+        super()._fetch_all()
+        if fetched and self._iterable_class is models.query.ModelIterable and 'is_read' not in self.query.annotations:
+            # Rows missing their read state load it together on first access
+            for notification in self._result_cache:
+                notification._read_state_peers = self._result_cache
+    
+    def read(self):
+        return self.with_read_state().filter(is_read=True)
+    
+    def unread(self):
+        return self.with_read_state().filter(is_read=False)
+
+
 class Notification(models.Model):
     """
     Model to store notifications for users in the LMS system
@@ -20,6 +68,7 @@ class Notification(models.Model):
         ('live_class_scheduled', 'Live Class Scheduled'),
         ('payment_completed', 'Payment Completed'),
          ('meeting_start', 'Meeting Start'),
+        ('course_digest', 'Course Updates Digest'),
         ('general', 'General Notification'),
     ]
     
@@ -73,24 +122,76 @@ class Notification(models.Model):
         blank=True
     )
     
-    # Status and timestamps
-    is_read = models.BooleanField(default=False)
+    # Timestamps (read state lives in NotificationReadState/NotificationReadMark)
     created_at = models.DateTimeField(default=timezone.now)
-    read_at = models.DateTimeField(null=True, blank=True)
+    
+    objects = NotificationQuerySet.as_manager()
     
     class Meta:
         ordering = ['-created_at']
         indexes = [
             models.Index(fields=['recipient', '-created_at']),
-            models.Index(fields=['recipient', 'is_read']),
+            models.Index(fields=['created_at', 'id']),
+        ]
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_from_db = True
+        return instance
+    
+    def _load_read_state(self):
+        # New notifications are always unread
+        if not getattr(self, '_loaded_from_db', False):
+            self._is_read, self._read_at = False, None
+            return
+        
+        # Rows fetched without with_read_state() look their state up on first
+        # access, in one query for every row of the queryset they came from
+        pending = [
+            notification for notification in getattr(self, '_read_state_peers', [self])
+            if '_is_read' not in notification.__dict__ and notification is not self
         ]
+        pending.append(self)
+        logger.warning(
+            f"Read state of {len(pending)} notifications loaded separately; "
+            "fetch them with Notification.objects.with_read_state()"
+        )
+        states = {
+            pk: (is_read, read_at)
+            for pk, is_read, read_at in Notification.objects.filter(
+                pk__in=[notification.pk for notification in pending]
+            ).with_read_state().values_list('pk', 'is_read', 'read_at')
+        }
+        for notification in pending:
+            notification._is_read, notification._read_at = states.get(notification.pk, (False, None))
+    
+    @property
+    def is_read(self):
+        if '_is_read' not in self.__dict__:
+            self._load_read_state()
+        return self._is_read
+    
+    @is_read.setter
+    def is_read(self, value):
+        self._is_read = value
+    
+    @property
+    def read_at(self):
+        if '_read_at' not in self.__dict__:
+            self._load_read_state()
+        return self._read_at
+    
+    @read_at.setter
+    def read_at(self, value):
+        self._read_at = value
     
     def mark_as_read(self):
         """Mark notification as read"""
         if not self.is_read:
+            NotificationReadMark.set_state(Notification.objects.filter(pk=self.pk), is_read=True)
             self.is_read = True
             self.read_at = timezone.now()
-            self.save()
     
     def __str__(self):
         return f"{self.title} - {self.recipient.email}"
@@ -110,4 +211,384 @@ class Notification(models.Model):
             minutes = diff.seconds // 60
             return f"{minutes} minute{'s' if minutes > 1 else ''} ago"
         else:
-            return "Just now"
\ No newline at end of file
+            return "Just now"
+
+
+class ArchivedNotification(models.Model):
+    """
+    Compact copy of a read notification moved out of the hot table by the
+    retention task. Related objects are kept as plain ids so archiving
+    never cascades or locks course content.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    recipient = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='archived_notifications'
+    )
+    sender_id = models.UUIDField(null=True, blank=True)
+    notification_type = models.CharField(max_length=30, choices=Notification.NOTIFICATION_TYPES)
+    title = models.CharField(max_length=255)
+    message = models.TextField()
+    course_id = models.BigIntegerField(null=True, blank=True)
+    created_at = models.DateTimeField()
+    read_at = models.DateTimeField(null=True, blank=True)
+    archived_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        db_table = 'notification_archive'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['recipient', '-created_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.title} (archived)"
+    
+    @classmethod
+    def from_notification(cls, notification):
+        return cls(
+            id=notification.id,
+            recipient_id=notification.recipient_id,
+            sender_id=notification.sender_id,
+            notification_type=notification.notification_type,
+            title=notification.title,
+            message=notification.message,
+            course_id=notification.course_id,
+            created_at=notification.created_at,
+            read_at=notification.read_at
+        )
+
+
+class NotificationReadState(models.Model):
+    """
+    Per-user read watermark: every notification with an id at or below
+    ``last_read_id`` is read, so "mark all as read" is a single-row write
+    """
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='notification_read_state'
+    )
+    last_read_id = models.BigIntegerField(default=0)
+    last_read_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        db_table = 'notification_read_states'
+    
+    def __str__(self):
+        return f"{self.user_id} read up to {self.last_read_id}"
+    
+    @classmethod
+    def mark_all_read(cls, user):
+        """
+        Move the user's watermark past their newest notification, dropping
+        the exceptions it now covers and zeroing their unread counters
+
+        Returns:
+            int: Number of notifications that were unread
+        """
+        now = timezone.now()
+        with transaction.atomic():
+            last_id = Notification.objects.filter(recipient=user).aggregate(last_id=Max('id'))['last_id']
+            if last_id is None:
+                return 0
+            
+            unread_count = NotificationCounter.unread_for(user)
+            
+            state, created = cls.objects.select_for_update().get_or_create(
+                user=user,
+                defaults={'last_read_id': last_id, 'last_read_at': now}
+            )
+            if not created and last_id > state.last_read_id:
+                state.last_read_id = last_id
+                state.last_read_at = now
+                state.save(update_fields=['last_read_id', 'last_read_at'])
+            
+            NotificationReadMark.objects.filter(user=user, notification_id__lte=last_id).delete()
+            NotificationCounter.objects.filter(user=user).update(unread_count=0, updated_at=now)
+        
+        return unread_count
+
+
+class NotificationReadMark(models.Model):
+    """
+    Sparse exception to the read watermark for a notification read
+    individually above it, or marked unread again below it
+    """
+    notification = models.OneToOneField(
+        Notification,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='read_mark'
+    )
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='notification_read_marks'
+    )
+    is_read = models.BooleanField()
+    read_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        db_table = 'notification_read_marks'
+        indexes = [
+            models.Index(fields=['user', 'notification']),
+        ]
+    
+    def __str__(self):
+        return f"{self.notification_id} {'read' if self.is_read else 'unread'}"
+    
+    @classmethod
+    def set_state(cls, notifications, is_read):
+        """
+        Mark the notifications in a queryset read or unread, recording an
+        exception for each one whose state changes and adjusting the
+        recipients' unread counters
+
+        Returns:
+            int: Number of notifications whose state changed
+        """
+        now = timezone.now()
+        with transaction.atomic():
+            changed = list(
+                notifications.with_read_state()
+                .filter(is_read=not is_read)
+                .values_list('id', 'recipient_id', 'notification_type')
+            )
+            if not changed:
+                return 0
+            
+            cls.objects.bulk_create(
+                [
+                    cls(
+                        notification_id=notification_id,
+                        user_id=recipient_id,
+                        is_read=is_read,
+                        read_at=now if is_read else None
+                    )
+                    for notification_id, recipient_id, _ in changed
+                ],
+                update_conflicts=True,
+                unique_fields=['notification'],
+                update_fields=['is_read', 'read_at']
+            )
+            
+            deltas = {}
+            for _, recipient_id, notification_type in changed:
+                total, unread = deltas.get((recipient_id, notification_type), (0, 0))
+                deltas[(recipient_id, notification_type)] = (total, unread + (-1 if is_read else 1))
+            NotificationCounter.adjust_many(deltas)
+        
+        return len(changed)
+
+
+class NotificationCounter(models.Model):
+    """
+    Per-user, per-type notification totals so badge counts and stats are
+    single-row reads. Kept in step by the notification signals and views
+    and rebuilt periodically by reconcile_notification_counters.
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='notification_counters'
+    )
+    notification_type = models.CharField(max_length=30)
+    total_count = models.IntegerField(default=0)
+    unread_count = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        db_table = 'notification_counters'
+        unique_together = ['user', 'notification_type']
+    
+    def __str__(self):
+        return f"{self.user_id} {self.notification_type}: {self.unread_count}/{self.total_count}"
+    
+    @classmethod
+    def adjust(cls, user_id, notification_type, total=0, unread=0):
+        """
+        Add ``total``/``unread`` to the user's counter for a type, creating
+        it if needed. Pass negative values when notifications are read or deleted.
+        """
+        if not total and not unread:
+            return
+        
+        increment_or_create(
+            cls,
+            {'user_id': user_id, 'notification_type': notification_type},
+            {'total_count': total, 'unread_count': unread},
+            initial={'total_count': max(total, 0), 'unread_count': max(unread, 0)},
+            updated_at=timezone.now()
+        )
+    
+    @classmethod
+    def adjust_many(cls, deltas):
+        """
+        Apply a mapping of {(user_id, notification_type): (total, unread)}.
+
+        Missing counters are inserted first, then users sharing a type and
+        delta (e.g. every recipient of a fan-out batch) get one UPDATE, so
+        the query count follows the number of distinct deltas, not users.
+        """
+        groups = defaultdict(list)
+        for (user_id, notification_type), (total, unread) in deltas.items():
+            if total or unread:
+                groups[(notification_type, total, unread)].append(user_id)
+        if not groups:
+            return
+        
+        now = timezone.now()
+        with transaction.atomic():
+            cls.objects.bulk_create(
+                [
+                    cls(user_id=user_id, notification_type=notification_type)
+                    for (notification_type, _, _), user_ids in groups.items()
+                    for user_id in user_ids
+                ],
+                ignore_conflicts=True
+            )
+            for (notification_type, total, unread), user_ids in groups.items():
+                cls.objects.filter(user_id__in=user_ids, notification_type=notification_type).update(
+                    total_count=F('total_count') + total,
+                    unread_count=F('unread_count') + unread,
+                    updated_at=now
+                )
+    
+    @classmethod
+    def unread_for(cls, user):
+        """Total unread notifications of a user"""
+        unread = cls.objects.filter(user=user).aggregate(unread=Sum('unread_count'))['unread']
+        return max(unread or 0, 0)
+
+
+class NotificationFanout(models.Model):
+    """
+    A content notification (new video, quiz or live class) being delivered
+    to every verified student of a course by a background task. The
+    notification text is rendered once here and copied to each recipient;
+    progress is tracked by enrollment id so a retried task resumes.
+
+    The first event of a course (and type, unless in digest mode) is
+    delivered at once; further events within the coalescing window are
+    merged into one pending fan-out delivered when the window ends.
+    """
+    # Singular/plural phrases used when describing coalesced events
+    EVENT_PHRASES = {
+        'video_upload': ('new video', 'new videos'),
+        'quiz_created': ('new quiz', 'new quizzes'),
+    }
+    
+    # Always delivered on their own: a live class notification carries its
+    # date and time, which a summary of several would lose
+    UNCOALESCED_TYPES = {'live_class_scheduled'}
+    
+    # Titles of coalesced events listed in the notification message
+    MAX_LISTED_TITLES = 5
+
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    ]
+    
+    notification_type = models.CharField(max_length=30, choices=Notification.NOTIFICATION_TYPES)
+    sender = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='notification_fanouts',
+        null=True,
+        blank=True
+    )
+    title = models.CharField(max_length=255)
+    message = models.TextField()
+    
+    course = models.ForeignKey(Course, on_delete=models.CASCADE)
+    video = models.ForeignKey(Video, on_delete=models.CASCADE, null=True, blank=True)
+    quiz = models.ForeignKey(Quiz, on_delete=models.CASCADE, null=True, blank=True)
+    meeting = models.ForeignKey(Meeting, on_delete=models.CASCADE, null=True, blank=True)
+    
+    # Coalescing
+    event_count = models.PositiveIntegerField(default=1)
+    event_counts = models.JSONField(default=dict, blank=True)
+    event_titles = models.JSONField(default=list, blank=True)
+    deliver_after = models.DateTimeField(null=True, blank=True)
+    
+    # Progress
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    total_recipients = models.PositiveIntegerField(default=0)
+    processed_recipients = models.PositiveIntegerField(default=0)
+    last_enrollment_id = models.BigIntegerField(default=0)
+    error_message = models.TextField(blank=True)
+    # Set when a task claims the fan-out and refreshed with every batch; a
+    # running fan-out whose claim goes stale (its worker died) is reclaimed
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        db_table = 'notification_fanouts'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['course', 'status', 'deliver_after']),
+        ]
+    
+    def __str__(self):
+        return f"{self.title} -> {self.course.title} ({self.status})"
+    
+    def record_event(self, notification_type, title):
+        """Count an event (e.g. one uploaded video) towards this fan-out"""
+        self.event_counts[notification_type] = self.event_counts.get(notification_type, 0) + 1
+        if len(self.event_titles) < self.MAX_LISTED_TITLES:
+            self.event_titles.append(title)
+    
+    def coalesce(self, notification_type, title):
+        """
+        Merge another event into this pending fan-out and re-render its
+        text as a summary, e.g. "12 new videos in Python Basics"
+        """
+        self.record_event(notification_type, title)
+        self.event_count += 1
+        
+        if notification_type != self.notification_type:
+            # Only possible in digest mode
+            self.notification_type = 'course_digest'
+        
+        # A summary links to the course rather than one of its items
+        self.video = self.quiz = self.meeting = None
+        
+        summary = self.describe_events()
+        self.title = f"{summary[0].upper()}{summary[1:]} in {self.course.title}"
+        
+        listed = ', '.join(f'"{title}"' for title in self.event_titles)
+        remaining = self.event_count - len(self.event_titles)
+        if remaining > 0:
+            listed += f' and {remaining} more'
+        self.message = f'{summary[0].upper()}{summary[1:]} in the course "{self.course.title}": {listed}. Check them out now!'
+    
+    def describe_events(self):
+        """e.g. "3 new videos, 1 new quiz" """
+        parts = []
+        for notification_type, count in self.event_counts.items():
+            singular, plural = self.EVENT_PHRASES.get(notification_type, ('update', 'updates'))
+            parts.append(f"{count} {singular if count == 1 else plural}")
+        return ', '.join(parts)
+    
+    def build_notification(self, recipient_id):
+        """Notification for one recipient, copied from the rendered fan-out"""
+        return Notification(
+            recipient_id=recipient_id,
+            sender_id=self.sender_id,
+            notification_type=self.notification_type,
+            title=self.title,
+            message=self.message,
+            course_id=self.course_id,
+            video_id=self.video_id,
+            quiz_id=self.quiz_id,
+            meeting_id=self.meeting_id
+        )
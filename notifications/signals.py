@@ -1,16 +1,112 @@
 # notifications/signals.py
 
-from django.db.models.signals import post_save
+import threading
+
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
+from django.db import transaction
+from django.utils import timezone
+from datetime import timedelta
 from django.contrib.auth import get_user_model
 from courses.models import Video, Quiz, Enrollment
 from meetings.models import Meeting
 from payments.models import Payment
-from .models import Notification
+from .models import Notification, NotificationFanout
+from .tasks import course_fanout_enrollments, deliver_notification_fanout, reconcile_counters_for
+from .utils import create_notifications, count_notifications, push_notifications, notification_settings
 from authentication.models import TeacherProfile,StudentProfile,StudentQuery
 
 User = get_user_model()
 
+# Recipients whose notifications this thread deleted, reconciled together
+# when the deleting transaction commits
+_deleted_recipients = threading.local()
+
+
+@receiver(post_save, sender=Notification)
+def push_created_notification(sender, instance, created, **kwargs):
+    """
+    Count single notifications and push them to the recipient's socket
+    after commit (bulk creates are handled by create_notifications)
+    """
+    if created:
+        count_notifications([instance])
+        push_notifications([instance])
+
+
+@receiver(post_delete, sender=Notification)
+def reconcile_counters_after_delete(sender, instance, using, **kwargs):
+    """
+    Bring the recipient's counters in line once the delete commits. Covers
+    queryset deletes and cascades from a deleted course, meeting or user
+    alike, with one reconcile pass per deleting transaction.
+    """
+    recipient_ids = getattr(_deleted_recipients, 'ids', None)
+    if recipient_ids is None:
+        recipient_ids = _deleted_recipients.ids = set()
+    recipient_ids.add(instance.recipient_id)
+    # Registered per row: a rolled back transaction drops its callbacks,
+    # and the ids it left behind are reconciled by the next one
+    transaction.on_commit(reconcile_deleted_recipients, using=using, robust=True)
+
+
+def reconcile_deleted_recipients():
+    recipient_ids = getattr(_deleted_recipients, 'ids', None)
+    _deleted_recipients.ids = None
+    if recipient_ids:
+        reconcile_counters_for(recipient_ids)
+
+
+def queue_course_fanout(**fields):
+    """
+    Record a course content notification and deliver it to the enrolled
+    students in the background once the triggering save commits.
+
+    The first event is delivered right away. Events within the coalescing
+    window of the course's previous delivery are merged into one pending
+    fan-out, delivered when the window ends, so a burst of uploads
+    produces one notification per student per window, not per upload.
+    Live classes are never merged (see NotificationFanout.UNCOALESCED_TYPES).
+    """
+    course = fields['course']
+    if not course_fanout_enrollments(course.id).exists():
+        return None
+    
+    config = notification_settings()
+    window = timedelta(seconds=config['COALESCE_WINDOW_SECONDS'])
+    event_title = (fields.get('video') or fields.get('quiz') or fields.get('meeting')).title
+    now = timezone.now()
+    
+    with transaction.atomic():
+        deliver_after = now
+        if window and fields['notification_type'] not in NotificationFanout.UNCOALESCED_TYPES:
+            fanouts = NotificationFanout.objects.select_for_update().filter(course=course).exclude(
+                notification_type__in=NotificationFanout.UNCOALESCED_TYPES
+            )
+            if not config['DIGEST_MODE']:
+                fanouts = fanouts.filter(notification_type=fields['notification_type'])
+            
+            fanout = fanouts.filter(status='pending', deliver_after__gt=now).order_by('created_at').first()
+            if fanout:
+                fanout.coalesce(fields['notification_type'], event_title)
+                fanout.save()
+                return fanout
+            
+            # Hold this one back only if the previous delivery was recent
+            previous = fanouts.exclude(deliver_after__isnull=True).order_by('-deliver_after').first()
+            if previous:
+                deliver_after = max(now, previous.deliver_after + window)
+        
+        fanout = NotificationFanout(deliver_after=deliver_after, **fields)
+        fanout.record_event(fanout.notification_type, event_title)
+        fanout.save()
+    
+    countdown = (deliver_after - now).total_seconds()
+    transaction.on_commit(
+        lambda: deliver_notification_fanout.apply_async((fanout.id,), countdown=countdown)
+    )
+    return fanout
+
 
 @receiver(post_save, sender=Video)
 def notify_video_upload(sender, instance, created, **kwargs):
@@ -18,29 +114,14 @@ def notify_video_upload(sender, instance, created, **kwargs):
     Send notification to all enrolled students when a new video is uploaded
     """
     if created:  # Only for new videos
-        # Get all enrolled students in the course
-        enrolled_students = instance.course.enrollments.filter(
-           payment_status='verified',
-            student__isnull=False
-        ).select_related('student')
-        
-        # Create notifications for each enrolled student
-        notifications_to_create = []
-        for enrollment in enrolled_students:
-            notification = Notification(
-                recipient=enrollment.student,
-                sender=instance.course.teacher.user,
-                notification_type='video_upload',
-                title=f'New Video: {instance.title}',
-                message=f'A new video "{instance.title}" has been uploaded to the course "{instance.course.title}". Check it out now!',
-                course=instance.course,
-                video=instance
-            )
-            notifications_to_create.append(notification)
-        
-        # Bulk create notifications for better performance
-        if notifications_to_create:
-            Notification.objects.bulk_create(notifications_to_create)
+        queue_course_fanout(
+            sender=instance.course.teacher.user,
+            notification_type='video_upload',
+            title=f'New Video: {instance.title}',
+            message=f'A new video "{instance.title}" has been uploaded to the course "{instance.course.title}". Check it out now!',
+            course=instance.course,
+            video=instance
+        )
 
 
 @receiver(post_save, sender=Quiz)
@@ -49,29 +130,14 @@ def notify_quiz_creation(sender, instance, created, **kwargs):
     Send notification to all enrolled students when a new quiz is created
     """
     if created:  # Only for new quizzes
-        # Get all enrolled students in the course
-        enrolled_students = instance.course.enrollments.filter(
-            payment_status='verified',
-            student__isnull=False
-        ).select_related('student')
-        
-        # Create notifications for each enrolled student
-        notifications_to_create = []
-        for enrollment in enrolled_students:
-            notification = Notification(
-                recipient=enrollment.student,
-                sender=instance.course.teacher.user,
-                notification_type='quiz_created',
-                title=f'New Quiz: {instance.title}',
-                message=f'A new quiz "{instance.title}" has been created for the course "{instance.course.title}". Test your knowledge!',
-                course=instance.course,
-                quiz=instance
-            )
-            notifications_to_create.append(notification)
-        
-        # Bulk create notifications for better performance
-        if notifications_to_create:
-            Notification.objects.bulk_create(notifications_to_create)
+        queue_course_fanout(
+            sender=instance.course.teacher.user,
+            notification_type='quiz_created',
+            title=f'New Quiz: {instance.title}',
+            message=f'A new quiz "{instance.title}" has been created for the course "{instance.course.title}". Test your knowledge!',
+            course=instance.course,
+            quiz=instance
+        )
 
 
 @receiver(post_save, sender=Payment)
@@ -83,7 +149,7 @@ def notify_payment_completion(sender, instance, created, **kwargs):
         # Check if enrollment exists (payment successful means student is enrolled)
         try:
             enrollment = Enrollment.objects.get(
-                student=instance.user,
+                student__user=instance.user,
                 course=instance.course
             )
             
@@ -118,7 +184,7 @@ def notify_payment_completion(sender, instance, created, **kwargs):
             
             # Bulk create notifications
             if notifications_to_create:
-                Notification.objects.bulk_create(notifications_to_create)
+                create_notifications(notifications_to_create)
                 
         except Enrollment.DoesNotExist:
             pass  # No enrollment found, skip notification
@@ -130,32 +196,17 @@ def notify_live_class_scheduled(sender, instance, created, **kwargs):
     Send notification to all enrolled students when a live class is scheduled
     """
     if created and instance.meeting_type == 'lecture' and instance.course and instance.scheduled_time:
-        # Get all enrolled students in the course
-        enrolled_students = instance.course.enrollments.filter(
-            payment_status='verified',
-            student__isnull=False
-        ).select_related('student')
-        
         # Format the scheduled time
         scheduled_time_str = instance.scheduled_time.strftime('%B %d, %Y at %I:%M %p')
         
-        # Create notifications for each enrolled student
-        notifications_to_create = []
-        for enrollment in enrolled_students:
-            notification = Notification(
-                recipient=enrollment.student,
-                sender=instance.host,
-                notification_type='live_class_scheduled',
-                title=f'Live Class Scheduled: {instance.title}',
-                message=f'A live class "{instance.title}" has been scheduled for "{instance.course.title}" on {scheduled_time_str}. Don\'t miss it!',
-                course=instance.course,
-                meeting=instance
-            )
-            notifications_to_create.append(notification)
-        
-        # Bulk create notifications for better performance
-        if notifications_to_create:
-            Notification.objects.bulk_create(notifications_to_create)
+        queue_course_fanout(
+            sender=instance.host,
+            notification_type='live_class_scheduled',
+            title=f'Live Class Scheduled: {instance.title}',
+            message=f'A live class "{instance.title}" has been scheduled for "{instance.course.title}" on {scheduled_time_str}. Don\'t miss it!',
+            course=instance.course,
+            meeting=instance
+        )
 
 
 # Alternative signal for enrollment (if you want to notify on enrollment directly)
@@ -203,7 +254,7 @@ def notify_enrollment_direct(sender, instance, created, **kwargs):
         
         # Bulk create notifications
         if notifications_to_create:
-            Notification.objects.bulk_create(notifications_to_create)
+            create_notifications(notifications_to_create)
 
 
 
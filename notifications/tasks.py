@@ -0,0 +1,271 @@
+# notifications/tasks.py
+
+import logging
+from datetime import timedelta
+from itertools import islice
+
+from celery import shared_task
+from django.contrib.auth import get_user_model
+from django.db import DatabaseError, transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from courses.models import Enrollment
+from email_automation.dispatch import enqueue_on_commit
+from email_automation.tasks import send_new_content_notification
+from .models import ArchivedNotification, Notification, NotificationCounter, NotificationFanout
+from .utils import create_notifications, notification_settings
+
+logger = logging.getLogger(__name__)
+
+User = get_user_model()
+
+# Users whose counters are recomputed per transaction
+RECONCILE_BATCH_SIZE = 500
+
+# Notifications written per bulk_create/transaction during fan-out
+FANOUT_BATCH_SIZE = 1000
+
+# Retries of a fan-out interrupted by a database error before it is left failed
+FANOUT_MAX_RETRIES = 5
+
+# Notifications archived/deleted per transaction, and batches per run
+RETENTION_BATCH_SIZE = 1000
+RETENTION_MAX_BATCHES = 100
+
+
+def course_fanout_enrollments(course_id):
+    """Enrollments whose students receive a course's content notifications"""
+    return Enrollment.objects.filter(
+        course_id=course_id,
+        payment_status='verified',
+        student__isnull=False
+    )
+
+
+def claimable_fanouts(now):
+    """
+    Fan-outs a delivery task may claim: pending, failed, or running with a
+    claim older than FANOUT_CLAIM_TIMEOUT_SECONDS (their worker died)
+    """
+    stale_before = now - timedelta(seconds=notification_settings()['FANOUT_CLAIM_TIMEOUT_SECONDS'])
+    return Q(status__in=['pending', 'failed']) | Q(
+        Q(claimed_at__isnull=True) | Q(claimed_at__lt=stale_before),
+        status='running'
+    )
+
+
+@shared_task(
+    bind=True,
+    autoretry_for=(DatabaseError,),
+    retry_backoff=True,
+    retry_backoff_max=600,
+    max_retries=FANOUT_MAX_RETRIES
+)
+def deliver_notification_fanout(self, fanout_id, batch_size=FANOUT_BATCH_SIZE):
+    """
+    Create a fan-out's notification for every verified student of its course,
+    streaming enrollments and writing one batch per transaction. Progress is
+    saved with each batch, so when a database error interrupts it the task
+    is retried with backoff and continues after the last enrollment
+    delivered instead of starting over.
+    """
+    # Claiming the fan-out also closes it to further coalescing
+    now = timezone.now()
+    claimed = NotificationFanout.objects.filter(
+        claimable_fanouts(now),
+        id=fanout_id
+    ).update(status='running', error_message='', claimed_at=now)
+    
+    try:
+        fanout = NotificationFanout.objects.get(id=fanout_id)
+    except NotificationFanout.DoesNotExist:
+        logger.error(f"Notification fan-out {fanout_id} not found")
+        return 0
+    
+    if not claimed:
+        logger.info(f"Notification fan-out {fanout_id} is already {fanout.status}, skipping")
+        return fanout.processed_recipients
+    
+    enrollments = course_fanout_enrollments(fanout.course_id)
+    if fanout.started_at is None:
+        fanout.started_at = timezone.now()
+        fanout.total_recipients = enrollments.count()
+        fanout.save(update_fields=['started_at', 'total_recipients'])
+    
+    rows = (
+        enrollments.filter(id__gt=fanout.last_enrollment_id)
+        .order_by('id')
+        .values_list('id', 'student__user_id')
+        .iterator(chunk_size=batch_size)
+    )
+    
+    try:
+        while True:
+            batch = list(islice(rows, batch_size))
+            if not batch:
+                break
+            
+            with transaction.atomic():
+                create_notifications([fanout.build_notification(user_id) for _, user_id in batch])
+                fanout.processed_recipients += len(batch)
+                fanout.last_enrollment_id = batch[-1][0]
+                fanout.claimed_at = timezone.now()
+                fanout.save(update_fields=['processed_recipients', 'last_enrollment_id', 'claimed_at'])
+    except Exception as e:
+        logger.error(f"Notification fan-out {fanout_id} failed: {str(e)}")
+        NotificationFanout.objects.filter(id=fanout_id).update(status='failed', error_message=str(e))
+        raise
+    finally:
+        # Release the enrollment cursor now rather than whenever the
+        # generator is collected
+        rows.close()
+    
+    fanout.status = 'completed'
+    fanout.completed_at = timezone.now()
+    fanout.save(update_fields=['status', 'completed_at'])
+    
+    # One content email per delivered fan-out, so emails are coalesced
+    # along with the notifications
+    enqueue_on_commit(send_new_content_notification, fanout.course_id, fanout.title)
+    
+    logger.info(f"Notification fan-out {fanout_id} delivered to {fanout.processed_recipients} students")
+    return fanout.processed_recipients
+
+
+def reconcile_counters_for(user_ids):
+    """
+    Recompute the notification counters of the given users from the
+    notifications table, writing only the rows that drifted
+
+    Returns:
+        int: Number of counter rows created, updated or removed
+    """
+    actual = {
+        (row['recipient_id'], row['notification_type']): (row['total'], row['unread'])
+        for row in Notification.objects.filter(recipient_id__in=user_ids)
+        .with_read_state()
+        .values('recipient_id', 'notification_type')
+        .annotate(total=Count('id'), unread=Count('id', filter=Q(is_read=False)))
+        .order_by()
+    }
+
+    fixed = 0
+    with transaction.atomic():
+        existing = {
+            (counter.user_id, counter.notification_type): counter
+            for counter in NotificationCounter.objects.select_for_update().filter(user_id__in=user_ids)
+        }
+
+        stale = [counter.id for key, counter in existing.items() if key not in actual]
+        if stale:
+            NotificationCounter.objects.filter(id__in=stale).delete()
+            fixed += len(stale)
+
+        to_update = []
+        to_create = []
+        now = timezone.now()
+        for (user_id, notification_type), (total, unread) in actual.items():
+            counter = existing.get((user_id, notification_type))
+            if counter is None:
+                to_create.append(NotificationCounter(
+                    user_id=user_id,
+                    notification_type=notification_type,
+                    total_count=total,
+                    unread_count=unread
+                ))
+            elif counter.total_count != total or counter.unread_count != unread:
+                counter.total_count = total
+                counter.unread_count = unread
+                counter.updated_at = now
+                to_update.append(counter)
+
+        NotificationCounter.objects.bulk_create(to_create, ignore_conflicts=True)
+        NotificationCounter.objects.bulk_update(to_update, ['total_count', 'unread_count', 'updated_at'])
+        fixed += len(to_create) + len(to_update)
+
+    return fixed
+
+
+@shared_task
+def reconcile_notification_counters(batch_size=RECONCILE_BATCH_SIZE):
+    """
+    Heal drift in the cached notification counters (e.g. from cascade
+    deletes or concurrent updates) by recomputing them per batch of users
+    """
+    user_ids = User.objects.order_by('id').values_list('id', flat=True).iterator(chunk_size=batch_size)
+
+    fixed = 0
+    while True:
+        batch = list(islice(user_ids, batch_size))
+        if not batch:
+            break
+        fixed += reconcile_counters_for(batch)
+
+    logger.info(f"Reconciled notification counters, fixed {fixed} rows")
+    return fixed
+
+
+@shared_task
+def deliver_due_notification_fanouts():
+    """
+    Start coalesced fan-outs whose window has closed but whose scheduled
+    delivery never ran (e.g. the countdown task was lost), and take over
+    running ones whose worker stopped making progress
+    """
+    now = timezone.now()
+    due = NotificationFanout.objects.filter(
+        claimable_fanouts(now),
+        ~Q(status='failed'),
+        deliver_after__lte=now - timedelta(minutes=1)
+    ).values_list('id', flat=True)
+    
+    count = 0
+    for fanout_id in due:
+        deliver_notification_fanout.delay(fanout_id)
+        count += 1
+    
+    if count:
+        logger.info(f"Queued {count} overdue or stalled notification fan-outs")
+    return count
+
+
+@shared_task
+def archive_old_notifications(batch_size=RETENTION_BATCH_SIZE, max_batches=RETENTION_MAX_BATCHES):
+    """
+    Move read notifications older than the retention period out of the hot
+    table, into ArchivedNotification or deleted depending on RETENTION_MODE.
+    Works in bounded batches, each its own transaction, and stops after
+    ``max_batches`` so a backlog is worked off over several runs.
+    """
+    config = notification_settings()
+    cutoff = timezone.now() - timedelta(days=config['RETENTION_DAYS'])
+    archive = config['RETENTION_MODE'] == 'archive'
+    
+    processed = 0
+    for _ in range(max_batches):
+        with transaction.atomic():
+            batch = list(
+                Notification.objects.filter(created_at__lt=cutoff)
+                .read()
+                .order_by('created_at', 'id')[:batch_size]
+            )
+            if not batch:
+                break
+            
+            if archive:
+                ArchivedNotification.objects.bulk_create(
+                    [ArchivedNotification.from_notification(n) for n in batch],
+                    ignore_conflicts=True
+                )
+            # Counters are reconciled by the post_delete handler on commit
+            Notification.objects.filter(id__in=[n.id for n in batch]).delete()
+        
+        processed += len(batch)
+        if len(batch) < batch_size:
+            break
+    
+    logger.info(
+        f"{'Archived' if archive else 'Deleted'} {processed} read notifications older than {cutoff:%Y-%m-%d}"
+    )
+    return processed
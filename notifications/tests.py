@@ -0,0 +1,644 @@
+import asyncio
+import base64
+import json
+import os
+import unittest
+from datetime import timedelta
+from unittest import mock
+from urllib.parse import urlencode
+
+from celery.exceptions import Retry
+from channels.db import database_sync_to_async
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth import get_user_model
+from django.db import OperationalError, connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from courses.models import Course, Enrollment, Quiz, Video
+from lms.asgi import application
+from meetings.models import Meeting
+
+from .models import (
+    ArchivedNotification, Notification, NotificationCounter, NotificationFanout, NotificationReadMark,
+    NotificationReadState
+)
+from .tasks import (
+    archive_old_notifications, deliver_due_notification_fanouts, deliver_notification_fanout,
+    reconcile_notification_counters
+)
+from . import tasks
+from .serializers import NotificationListSerializer
+from .checks import check_channel_layer
+from .utils import create_notifications, get_unread_count
+
+User = get_user_model()
+
+
+def make_users(count, prefix='user'):
+    return [
+        User.objects.create_user(username=f'{prefix}{i}', email=f'{prefix}{i}@example.com')
+        for i in range(count)
+    ]
+
+
+def counters(users):
+    return {
+        (counter.user_id, counter.notification_type): (counter.total_count, counter.unread_count)
+        for counter in NotificationCounter.objects.filter(user__in=users)
+    }
+
+
+class NotificationCounterTests(TestCase):
+    """Cached per-user counters and their reconciliation"""
+
+    def count_queries(self, deltas):
+        with CaptureQueriesContext(connection) as queries:
+            NotificationCounter.adjust_many(deltas)
+        return len(queries)
+
+    def test_adjust_many_issues_one_update_per_distinct_delta(self):
+        users = make_users(30)
+        few = self.count_queries({(user.id, 'general'): (1, 1) for user in users[:3]})
+        many = self.count_queries({(user.id, 'general'): (1, 1) for user in users})
+        self.assertEqual(few, many)
+
+        # A second type/delta costs one more UPDATE
+        mixed = {(user.id, 'general'): (1, 1) for user in users}
+        mixed.update({(user.id, 'video_upload'): (2, 0) for user in users[:10]})
+        self.assertEqual(self.count_queries(mixed), many + 1)
+
+        self.assertEqual(counters(users[:1]), {(users[0].id, 'general'): (3, 3), (users[0].id, 'video_upload'): (2, 0)})
+        self.assertEqual(counters(users[20:21]), {(users[20].id, 'general'): (2, 2)})
+
+    def test_zero_deltas_write_nothing(self):
+        users = make_users(2)
+        self.assertEqual(self.count_queries({(user.id, 'general'): (0, 0) for user in users}), 0)
+        self.assertFalse(NotificationCounter.objects.exists())
+
+    def test_counters_follow_creation_and_reads(self):
+        users = make_users(2)
+        created = create_notifications([
+            Notification(recipient=user, notification_type='general', title='Hi', message='Hello')
+            for user in users for _ in range(3)
+        ])
+        Notification.objects.create(recipient=users[0], notification_type='video_upload', title='V', message='')
+        self.assertEqual(get_unread_count(users[0]), 4)
+
+        created[0].mark_as_read()
+        self.assertEqual(get_unread_count(users[0]), 3)
+        self.assertEqual(counters(users[1:]), {(users[1].id, 'general'): (3, 3)})
+
+    def test_cascade_and_queryset_deletes_update_counters(self):
+        users = make_users(2)
+        teacher = User.objects.create_user(username='teacher', email='teacher@example.com', role='teacher')
+        course = Course.objects.create(title='Algebra', description='', teacher=teacher.teacher_profile)
+        create_notifications([
+            Notification(recipient=user, notification_type='video_upload', title='V', message='', course=course)
+            for user in users
+        ])
+        Notification.objects.create(recipient=users[0], notification_type='general', title='Hi', message='')
+        NotificationReadState.mark_all_read(users[1])
+        Notification.objects.create(recipient=users[1], notification_type='general', title='Hi', message='')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            course.delete()
+        self.assertEqual(counters(users), {(users[0].id, 'general'): (1, 1), (users[1].id, 'general'): (1, 1)})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Notification.objects.filter(recipient=users[0]).delete()
+        self.assertEqual(counters(users), {(users[1].id, 'general'): (1, 1)})
+
+    def test_reconcile_heals_drift(self):
+        users = make_users(3)
+        create_notifications([
+            Notification(recipient=user, notification_type='general', title='Hi', message='Hello')
+            for user in users
+        ])
+        expected = counters(users)
+
+        NotificationCounter.objects.filter(user=users[0]).update(unread_count=7)
+        NotificationCounter.objects.filter(user=users[1]).delete()
+        NotificationCounter.objects.create(user=users[2], notification_type='quiz_created', total_count=1)
+
+        self.assertEqual(reconcile_notification_counters(), 3)
+        self.assertEqual(counters(users), expected)
+        self.assertEqual(reconcile_notification_counters(), 0)
+
+
+class ReadWatermarkTests(TestCase):
+    """Read state from the per-user watermark and its exceptions"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user, cls.other = make_users(2)
+
+    def notify(self, count, user=None):
+        return create_notifications([
+            Notification(recipient=user or self.user, notification_type='general', title=f'n{i}', message='')
+            for i in range(count)
+        ])
+
+    def read_ids(self, user=None):
+        return set(Notification.objects.filter(recipient=user or self.user).read().values_list('id', flat=True))
+
+    def test_mark_all_read_is_one_watermark_for_everything_so_far(self):
+        first = self.notify(3)
+        other = self.notify(2, self.other)
+
+        self.assertEqual(NotificationReadState.mark_all_read(self.user), 3)
+        self.assertEqual(self.read_ids(), {n.id for n in first})
+        self.assertEqual(get_unread_count(self.user), 0)
+        # Other users are unaffected even though their ids are lower
+        self.assertEqual(self.read_ids(self.other), set())
+        self.assertEqual(get_unread_count(self.other), 2)
+
+        later = self.notify(1)
+        self.assertEqual(self.read_ids(), {n.id for n in first})
+        self.assertEqual(get_unread_count(self.user), 1)
+        self.assertFalse(Notification.objects.get(pk=later[0].pk).is_read)
+
+    def test_exceptions_above_and_below_the_watermark(self):
+        first = self.notify(3)
+        NotificationReadState.mark_all_read(self.user)
+        later = self.notify(2)
+
+        # Read individually above the watermark
+        Notification.objects.get(pk=later[1].pk).mark_as_read()
+        # Marked unread again below it
+        NotificationReadMark.set_state(Notification.objects.filter(pk=first[0].pk), is_read=False)
+
+        self.assertEqual(self.read_ids(), {first[1].id, first[2].id, later[1].id})
+        self.assertEqual(get_unread_count(self.user), 2)
+        state = Notification.objects.filter(pk=later[1].pk).with_read_state().get()
+        self.assertIsNotNone(state.read_at)
+
+        # Marking everything read again folds the exceptions into the watermark
+        self.assertEqual(NotificationReadState.mark_all_read(self.user), 2)
+        self.assertFalse(NotificationReadMark.objects.filter(user=self.user).exists())
+        self.assertEqual(self.read_ids(), {n.id for n in first + later})
+
+    def test_plain_querysets_load_read_state_in_one_query(self):
+        notifications = self.notify(10)
+        NotificationReadState.mark_all_read(self.user)
+        NotificationReadMark.set_state(Notification.objects.filter(pk=notifications[0].pk), is_read=False)
+
+        with self.assertNumQueries(2), self.assertLogs('notifications.models', 'WARNING'):
+            data = NotificationListSerializer(Notification.objects.filter(recipient=self.user), many=True).data
+        self.assertEqual([item['id'] for item in data if not item['is_read']], [notifications[0].id])
+
+    def test_setting_an_unchanged_state_is_a_no_op(self):
+        notifications = self.notify(2)
+        self.assertEqual(NotificationReadMark.set_state(Notification.objects.filter(recipient=self.user), False), 0)
+        self.assertEqual(NotificationReadMark.set_state(Notification.objects.filter(pk=notifications[0].pk), True), 1)
+        self.assertEqual(NotificationReadMark.set_state(Notification.objects.filter(pk=notifications[0].pk), True), 0)
+        self.assertEqual(get_unread_count(self.user), 1)
+
+
+class ReadWatermarkMigrationTests(TransactionTestCase):
+    """0004_read_watermark turns per-row is_read flags into watermarks"""
+    before = [('notifications', '0003_notificationfanout')]
+    after = [('notifications', '0004_read_watermark')]
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_read_flags_become_watermarks_and_exceptions(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.before)
+        old_apps = executor.loader.project_state(self.before).apps
+        OldUser = old_apps.get_model('authentication', 'User')
+        OldNotification = old_apps.get_model('notifications', 'Notification')
+
+        ann = OldUser.objects.create(username='ann', email='ann@example.com')
+        bob = OldUser.objects.create(username='bob', email='bob@example.com')
+        cat = OldUser.objects.create(username='cat', email='cat@example.com')
+        read_flags = {ann: [True, True, False, True, False], bob: [True, True], cat: [False, True]}
+        ids = {}
+        for user, flags in read_flags.items():
+            ids[user.username] = [
+                OldNotification.objects.create(
+                    recipient=user, notification_type='general', title='t', message='', is_read=is_read
+                ).id
+                for is_read in flags
+            ]
+
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(self.after)
+        new_apps = executor.loader.project_state(self.after).apps
+        ReadState = new_apps.get_model('notifications', 'NotificationReadState')
+        ReadMark = new_apps.get_model('notifications', 'NotificationReadMark')
+
+        watermarks = dict(ReadState.objects.values_list('user__username', 'last_read_id'))
+        # Just below the oldest unread one, or the newest when all are read
+        self.assertEqual(watermarks['ann'], ids['ann'][2] - 1)
+        self.assertEqual(watermarks['bob'], ids['bob'][1])
+        self.assertEqual(
+            set(ReadMark.objects.values_list('notification_id', 'is_read')),
+            {(ids['ann'][3], True), (ids['cat'][1], True)}
+        )
+
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(executor.loader.graph.leaf_nodes())
+        for user, flags in read_flags.items():
+            read = set(Notification.objects.filter(recipient_id=user.id).read().values_list('id', flat=True))
+            self.assertEqual(read, {pk for pk, is_read in zip(ids[user.username], flags) if is_read})
+
+
+class NotificationListPaginationTests(TestCase):
+    """Cursor pages of a user's notifications"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user, cls.other = make_users(2)
+        cls.notifications = create_notifications([
+            Notification(
+                recipient=cls.user, notification_type='general' if i % 3 else 'video_upload',
+                title=f'n{i}', message=''
+            )
+            for i in range(12)
+        ])
+        create_notifications([Notification(recipient=cls.other, notification_type='general', title='x', message='')])
+        # Half of them share a timestamp, so pages must not split or repeat ties
+        Notification.objects.filter(pk__in=[n.pk for n in cls.notifications[:6]]).update(
+            created_at=timezone.now() - timedelta(hours=1)
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def walk(self, params, link='next', url='/api/notifications/'):
+        ids, pages = [], []
+        response = self.client.get(url, params)
+        while True:
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn('count', response.data)
+            pages.append(response.data)
+            ids.extend(item['id'] for item in response.data['results'])
+            if not response.data[link]:
+                return ids, pages
+            response = self.client.get(response.data[link])
+
+    def expected(self, queryset):
+        return list(queryset.order_by('-created_at', '-id').values_list('id', flat=True))
+
+    def test_pages_cover_every_notification_once_newest_first(self):
+        ids, pages = self.walk({'page_size': 5})
+        self.assertEqual(ids, self.expected(Notification.objects.filter(recipient=self.user)))
+        self.assertEqual(len(pages), 3)
+
+        # And back again from the last page
+        back, _ = self.walk({}, link='previous', url=pages[1]['next'])
+        self.assertEqual(back, ids[10:] + ids[5:10] + ids[:5])
+
+    def test_malformed_cursors_are_rejected(self):
+        for position in ['no separator', 'not a date|1', f'{timezone.now().isoformat()}|x']:
+            with self.subTest(position=position):
+                cursor = base64.b64encode(urlencode({'p': position}).encode()).decode()
+                response = self.client.get('/api/notifications/', {'cursor': cursor})
+                self.assertEqual(response.status_code, 404)
+
+    def test_filters_apply_across_pages(self):
+        NotificationReadState.mark_all_read(self.user)
+        unread = create_notifications([
+            Notification(recipient=self.user, notification_type='general', title='late', message='')
+        ])
+        ids, _ = self.walk({'page_size': 2, 'is_read': 'false'})
+        self.assertEqual(ids, [unread[0].id])
+
+        ids, _ = self.walk({'page_size': 2, 'notification_type': 'video_upload'})
+        self.assertEqual(
+            ids, self.expected(Notification.objects.filter(recipient=self.user, notification_type='video_upload'))
+        )
+
+
+class NotificationRetentionTests(TestCase):
+    """Old read notifications leave the hot table in bounded batches"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user, = make_users(1)
+
+    def setUp(self):
+        old = timezone.now() - timedelta(days=91)
+        self.old_read = self.notify(5, old)
+        self.old_unread = self.notify(2, old)
+        self.recent_read = self.notify(2, timezone.now())
+        NotificationReadMark.set_state(
+            Notification.objects.filter(pk__in=[n.pk for n in self.old_read + self.recent_read]), is_read=True
+        )
+
+    def notify(self, count, created_at):
+        return create_notifications([
+            Notification(recipient=self.user, notification_type='general', title='t', message='', created_at=created_at)
+            for _ in range(count)
+        ])
+
+    def remaining(self):
+        return set(Notification.objects.values_list('id', flat=True))
+
+    def test_archives_old_read_notifications_in_batches(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(archive_old_notifications(batch_size=2), 5)
+
+        self.assertEqual(self.remaining(), {n.id for n in self.old_unread + self.recent_read})
+        archived = ArchivedNotification.objects.order_by('id')
+        self.assertEqual([a.id for a in archived], [n.id for n in self.old_read])
+        self.assertTrue(all(a.read_at for a in archived))
+        self.assertEqual(counters([self.user]), {(self.user.id, 'general'): (4, 2)})
+        self.assertEqual(archive_old_notifications(batch_size=2), 0)
+
+    def test_a_run_stops_after_max_batches(self):
+        self.assertEqual(archive_old_notifications(batch_size=2, max_batches=2), 4)
+        self.assertEqual(archive_old_notifications(batch_size=2, max_batches=2), 1)
+
+    @override_settings(NOTIFICATION_SETTINGS={'RETENTION_MODE': 'delete'})
+    def test_delete_mode_drops_them(self):
+        self.assertEqual(archive_old_notifications(), 5)
+        self.assertFalse(ArchivedNotification.objects.exists())
+        self.assertEqual(self.remaining(), {n.id for n in self.old_unread + self.recent_read})
+
+
+def make_course(students):
+    teacher = User.objects.create_user(username='teacher', email='teacher@example.com', role='teacher')
+    course = Course.objects.create(title='Algebra', description='', teacher=teacher.teacher_profile)
+    for user in students:
+        Enrollment.objects.create(student=user.student_profile, course=course, payment_status='verified')
+    return course
+
+
+class NotificationFanoutTests(TestCase):
+    """Background delivery of course notifications in resumable batches"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.students = [
+            User.objects.create_user(username=f'student{i}', email=f'student{i}@example.com', role='student')
+            for i in range(5)
+        ]
+        cls.course = make_course(cls.students)
+
+    def make_fanout(self):
+        return NotificationFanout.objects.create(
+            notification_type='video_upload', title='New video', message='Watch it', course=self.course
+        )
+
+    def recipients(self):
+        return sorted(Notification.objects.filter(title='New video').values_list('recipient_id', flat=True))
+
+    def test_delivers_once_per_student(self):
+        fanout = self.make_fanout()
+        self.assertEqual(deliver_notification_fanout.delay(fanout.id, batch_size=2).get(), 5)
+
+        fanout.refresh_from_db()
+        self.assertEqual((fanout.status, fanout.processed_recipients, fanout.total_recipients), ('completed', 5, 5))
+        self.assertEqual(self.recipients(), sorted(user.id for user in self.students))
+
+        # Delivering a completed fan-out again is a no-op
+        deliver_notification_fanout.delay(fanout.id, batch_size=2)
+        self.assertEqual(len(self.recipients()), 5)
+
+    def test_database_error_is_retried_from_the_last_batch(self):
+        fanout = self.make_fanout()
+        calls = []
+
+        def flaky_create(notifications):
+            calls.append(len(notifications))
+            if len(calls) == 2:
+                raise OperationalError('database is locked')
+            return create_notifications(notifications)
+
+        # Stop the eager task from running its retry inline: the broker
+        # would deliver it later as a new run
+        with mock.patch.object(tasks, 'create_notifications', side_effect=flaky_create), \
+                mock.patch.object(deliver_notification_fanout, 'retry', side_effect=Retry()) as retry:
+            with self.assertRaises(Retry):
+                deliver_notification_fanout.delay(fanout.id, batch_size=2)
+            self.assertIsInstance(retry.call_args.kwargs['exc'], OperationalError)
+
+            fanout.refresh_from_db()
+            self.assertEqual((fanout.status, fanout.processed_recipients), ('failed', 2))
+
+            deliver_notification_fanout.delay(fanout.id, batch_size=2)
+
+        # The retry continued after batch 1 instead of writing it twice
+        self.assertEqual(calls, [2, 2, 2, 1])
+        fanout.refresh_from_db()
+        self.assertEqual((fanout.status, fanout.processed_recipients), ('completed', 5))
+        self.assertEqual(self.recipients(), sorted(user.id for user in self.students))
+
+    def test_other_errors_leave_the_fanout_failed(self):
+        fanout = self.make_fanout()
+
+        with mock.patch.object(tasks, 'create_notifications', side_effect=ValueError('bad data')):
+            with self.assertRaises(ValueError):
+                deliver_notification_fanout.delay(fanout.id, batch_size=2)
+
+        fanout.refresh_from_db()
+        self.assertEqual((fanout.status, fanout.error_message), ('failed', 'bad data'))
+
+
+class CoalescingTests(TestCase):
+    """Bursts of course content become one notification per window"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.students = [
+            User.objects.create_user(username=f'student{i}', email=f'student{i}@example.com', role='student')
+            for i in range(3)
+        ]
+        cls.course = make_course(cls.students)
+
+    def setUp(self):
+        patcher = mock.patch.object(deliver_notification_fanout, 'apply_async')
+        self.apply_async = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def upload(self, title, model=Video):
+        with self.captureOnCommitCallbacks(execute=True):
+            if model is Video:
+                Video.objects.create(course=self.course, title=title, video_file='video.mp4')
+            else:
+                Quiz.objects.create(course=self.course, title=title)
+
+    def countdowns(self):
+        return [round(call.kwargs['countdown']) for call in self.apply_async.call_args_list]
+
+    def test_first_upload_is_delivered_at_once_and_follow_ups_coalesce(self):
+        self.upload('Intro')
+        for title in ('Part 1', 'Part 2', 'Part 3'):
+            self.upload(title)
+
+        first, merged = NotificationFanout.objects.order_by('created_at')
+        self.assertEqual(self.countdowns(), [0, 60])
+        self.assertEqual(first.title, 'New Video: Intro')
+        self.assertEqual(merged.event_count, 3)
+        self.assertEqual(merged.title, '3 new videos in Algebra')
+        self.assertIn('"Part 1", "Part 2", "Part 3"', merged.message)
+        self.assertIsNone(merged.video)
+
+        # Every student gets one notification per fan-out
+        for fanout in (first, merged):
+            deliver_notification_fanout.run(fanout.id)
+        for student in self.students:
+            self.assertEqual(Notification.objects.filter(recipient=student, notification_type='video_upload').count(), 2)
+
+    def test_upload_after_the_window_is_delivered_at_once(self):
+        self.upload('Intro')
+        NotificationFanout.objects.update(deliver_after=timezone.now() - timedelta(seconds=61))
+        self.upload('Part 1')
+
+        self.assertEqual(self.countdowns(), [0, 0])
+
+    def test_types_are_coalesced_separately_unless_in_digest_mode(self):
+        self.upload('Intro')
+        self.upload('Quiz 1', model=Quiz)
+        self.assertEqual(self.countdowns(), [0, 0])
+
+        with override_settings(NOTIFICATION_SETTINGS={'DIGEST_MODE': True}):
+            self.upload('Part 1')
+            self.upload('Quiz 2', model=Quiz)
+
+        digest = NotificationFanout.objects.order_by('-created_at').first()
+        self.assertEqual(digest.notification_type, 'course_digest')
+        self.assertEqual(digest.event_counts, {'video_upload': 1, 'quiz_created': 1})
+
+    @override_settings(NOTIFICATION_SETTINGS={'DIGEST_MODE': True})
+    def test_live_classes_are_delivered_with_their_own_times(self):
+        self.upload('Intro')
+        starts = [timezone.now() + timedelta(days=day) for day in (1, 2)]
+        with self.captureOnCommitCallbacks(execute=True):
+            for i, scheduled_time in enumerate(starts):
+                Meeting.objects.create(
+                    host=self.course.teacher.user, title=f'Class {i}', meeting_type='lecture',
+                    course=self.course, scheduled_time=scheduled_time
+                )
+        self.upload('Part 1')
+
+        self.assertEqual(self.countdowns(), [0, 0, 0, 60])
+        live = NotificationFanout.objects.filter(notification_type='live_class_scheduled').order_by('created_at')
+        for fanout, scheduled_time in zip(live, starts):
+            self.assertEqual(fanout.event_count, 1)
+            self.assertIn(scheduled_time.strftime('%B %d, %Y at %I:%M %p'), fanout.message)
+
+    @override_settings(NOTIFICATION_SETTINGS={'COALESCE_WINDOW_SECONDS': 0})
+    def test_zero_window_delivers_every_upload(self):
+        for title in ('Intro', 'Part 1', 'Part 2'):
+            self.upload(title)
+
+        self.assertEqual(self.countdowns(), [0, 0, 0])
+        self.assertEqual(NotificationFanout.objects.filter(event_count=1).count(), 3)
+
+    def test_one_content_email_per_delivered_fanout(self):
+        self.upload('Intro')
+        for title in ('Part 1', 'Part 2'):
+            self.upload(title)
+
+        with mock.patch('notifications.tasks.send_new_content_notification') as send_email, \
+                self.captureOnCommitCallbacks(execute=True):
+            for fanout in NotificationFanout.objects.order_by('created_at'):
+                deliver_notification_fanout.run(fanout.id)
+
+        self.assertEqual(
+            [call.args for call in send_email.delay.call_args_list],
+            [(self.course.id, 'New Video: Intro'), (self.course.id, '2 new videos in Algebra')]
+        )
+
+    def test_stale_running_fanouts_are_reclaimed(self):
+        self.upload('Intro')
+        fanout = NotificationFanout.objects.get()
+        NotificationFanout.objects.update(
+            status='running', claimed_at=timezone.now() - timedelta(seconds=30),
+            deliver_after=timezone.now() - timedelta(minutes=5)
+        )
+
+        # Its worker may still be busy: leave it alone
+        self.assertEqual(deliver_notification_fanout.run(fanout.id), 0)
+        self.assertEqual(deliver_due_notification_fanouts.run(), 0)
+        self.assertFalse(Notification.objects.filter(notification_type='video_upload').exists())
+
+        NotificationFanout.objects.update(claimed_at=timezone.now() - timedelta(seconds=601))
+        with mock.patch.object(deliver_notification_fanout, 'delay') as delay:
+            self.assertEqual(deliver_due_notification_fanouts.run(), 1)
+        delay.assert_called_once_with(fanout.id)
+
+        self.assertEqual(deliver_notification_fanout.run(fanout.id), 3)
+        fanout.refresh_from_db()
+        self.assertEqual(fanout.status, 'completed')
+
+
+class TaskPushTests(TransactionTestCase):
+    """Notifications created by a Celery task reach the recipient's socket"""
+
+    def setUp(self):
+        teacher = User.objects.create_user(
+            username='teacher', email='teacher@example.com', password='pass', role='teacher'
+        )
+        self.student = User.objects.create_user(
+            username='student', email='student@example.com', password='pass', role='student'
+        )
+        self.course = Course.objects.create(title='Algebra', description='', teacher=teacher.teacher_profile)
+        Enrollment.objects.create(
+            student=self.student.student_profile, course=self.course, payment_status='verified'
+        )
+
+    def assert_task_push_reaches_socket(self):
+        fanout = NotificationFanout.objects.create(
+            notification_type='video_upload', title='New video', message='Watch it', course=self.course
+        )
+        cookie = f'access={AccessToken.for_user(self.student)}'.encode()
+
+        async def scenario():
+            communicator = WebsocketCommunicator(application, '/ws/alerts/', headers=[(b'cookie', cookie)])
+            connected, _ = await communicator.connect()
+            self.assertTrue(connected)
+
+            # The task runs on another thread, as it would in a worker
+            delivered = await database_sync_to_async(
+                lambda: deliver_notification_fanout.delay(fanout.id).get(), thread_sensitive=False
+            )()
+            self.assertEqual(delivered, 1)
+
+            event = json.loads(await communicator.receive_from(timeout=5))
+            await communicator.disconnect()
+            return event
+
+        event = asyncio.run(scenario())
+        self.assertEqual(event['type'], 'notification')
+        self.assertEqual(event['notification']['title'], 'New video')
+        self.assertEqual(event['notification']['course_id'], self.course.id)
+
+    def test_push_from_task_reaches_consumer(self):
+        self.assert_task_push_reaches_socket()
+
+    @unittest.skipUnless(os.environ.get('REDIS_URL'), 'REDIS_URL is not set')
+    def test_push_from_task_reaches_consumer_over_redis(self):
+        layers = {
+            'default': {
+                'BACKEND': 'channels_redis.core.RedisChannelLayer',
+                'CONFIG': {'hosts': [os.environ['REDIS_URL']]},
+            }
+        }
+        with override_settings(CHANNEL_LAYERS=layers):
+            self.assert_task_push_reaches_socket()
+
+
+class ChannelLayerCheckTests(SimpleTestCase):
+    """Pushes from Celery workers need a channel layer shared with Daphne"""
+
+    def check(self, backend):
+        with override_settings(CHANNEL_LAYERS={'default': {'BACKEND': backend}}):
+            return [warning.id for warning in check_channel_layer(None)]
+
+    def test_warns_about_the_in_memory_layer(self):
+        self.assertEqual(self.check('channels.layers.InMemoryChannelLayer'), ['notifications.W001'])
+        self.assertEqual(self.check('channels_redis.core.RedisChannelLayer'), [])
@@ -0,0 +1,123 @@
+# notifications/utils.py
+
+import logging
+from collections import defaultdict
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.db import transaction
+
+from lms.conf import merged_settings
+
+from .models import Notification, NotificationCounter
+
+logger = logging.getLogger(__name__)
+
+# Most notifications replayed to a reconnecting socket before it has to
+# fall back to the REST list
+RESUME_LIMIT = 50
+
+DEFAULT_NOTIFICATION_SETTINGS = {
+    'COALESCE_WINDOW_SECONDS': 60,
+    'FANOUT_CLAIM_TIMEOUT_SECONDS': 600,
+    'DIGEST_MODE': False,
+    'RETENTION_DAYS': 90,
+    'RETENTION_MODE': 'archive',
+}
+
+
+def notification_settings():
+    """Coalescing, fan-out and retention options (NOTIFICATION_SETTINGS)"""
+    return merged_settings('NOTIFICATION_SETTINGS', DEFAULT_NOTIFICATION_SETTINGS)
+
+
+def user_group_name(user_id):
+    """Channel group every socket of a user joins (see alerts.consumers)"""
+    return f"user_{user_id}"
+
+
+def notification_event(notification):
+    """Compact payload pushed over the socket for a notification"""
+    return {
+        'id': notification.id,
+        'notification_type': notification.notification_type,
+        'title': notification.title,
+        'course_id': notification.course_id,
+        'is_read': notification.is_read,
+        'created_at': notification.created_at.isoformat(),
+    }
+
+
+def push_notifications(notifications):
+    """
+    Push the given saved notifications to their recipients' channel groups
+    once the surrounding transaction commits
+    """
+    events = [
+        (notification.recipient_id, notification_event(notification))
+        for notification in notifications
+        if notification.pk is not None
+    ]
+    if not events:
+        return
+
+    def send():
+        channel_layer = get_channel_layer()
+        if not channel_layer:
+            return
+        for recipient_id, event in events:
+            try:
+                async_to_sync(channel_layer.group_send)(
+                    user_group_name(recipient_id),
+                    {'type': 'notification_created', 'notification': event}
+                )
+            except Exception as e:
+                # Clients resume from their last seen id, so a lost push is recoverable
+                logger.warning(f"Failed to push notification {event['id']}: {str(e)}")
+
+    transaction.on_commit(send)
+
+
+def count_notifications(notifications):
+    """
+    Add notifications to their recipients' cached counters, one update
+    per (recipient, type). Deletes are reconciled by a post_delete handler.
+    """
+    deltas = defaultdict(lambda: [0, 0])
+    for notification in notifications:
+        delta = deltas[(notification.recipient_id, notification.notification_type)]
+        delta[0] += 1
+        if not notification.is_read:
+            delta[1] += 1
+    NotificationCounter.adjust_many(deltas)
+
+
+def create_notifications(notifications, batch_size=None):
+    """
+    Bulk create notifications, update the recipients' counters and push
+    them to their sockets after commit
+    """
+    created = Notification.objects.bulk_create(notifications, batch_size=batch_size)
+    count_notifications(created)
+    push_notifications(created)
+    return created
+
+
+def get_unread_count(user):
+    """Unread badge count of a user, read from the cached counters"""
+    return NotificationCounter.unread_for(user)
+
+
+def get_missed_notifications(user_id, last_id, limit=RESUME_LIMIT):
+    """
+    Notifications a user received after ``last_id``, oldest first
+
+    Returns:
+        tuple: (list of compact events, whether more than ``limit`` were missed)
+    """
+    missed = list(
+        Notification.objects.filter(recipient_id=user_id, id__gt=last_id)
+        .with_read_state()
+        .order_by('id')[:limit + 1]
+    )
+    return [notification_event(n) for n in missed[:limit]], len(missed) > limit
@@ -4,10 +4,13 @@ from rest_framework import generics, status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import Cursor, CursorPagination
 from django.db.models import Q, Count
+from django.utils.dateparse import parse_datetime
 from django.shortcuts import get_object_or_404
-from .models import Notification
+from .models import Notification, NotificationCounter, NotificationReadMark, NotificationReadState
+from .utils import get_unread_count
 from .serializers import (
     NotificationSerializer,
     NotificationListSerializer,
@@ -16,11 +19,80 @@ from .serializers import (
 )
 
 
-class NotificationPagination(PageNumberPagination):
-    """Custom pagination for notifications"""
+class NotificationPagination(CursorPagination):
+    """
+    Cursor pagination for notifications, newest first. Seeks on the
+    (recipient, -created_at) index instead of OFFSET and skips the COUNT.
+
+    The cursor position is the (created_at, id) pair of the edge row, so
+    rows sharing a created_at are neither skipped nor repeated, whichever
+    way the pages are walked.
+    """
     page_size = 20
     page_size_query_param = 'page_size'
     max_page_size = 100
+    ordering = ('-created_at', '-id')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.base_url = request.build_absolute_uri()
+        self.cursor = self.decode_cursor(request)
+        reverse = bool(self.cursor and self.cursor.reverse)
+        position = self.cursor.position if self.cursor else None
+
+        if reverse:
+            queryset = queryset.order_by('created_at', 'id')
+        else:
+            queryset = queryset.order_by(*self.ordering)
+
+        if position is not None:
+            created_at, pk = self.parse_position(position)
+            # Forward pages are older than the position, reverse pages newer
+            lookup = 'gt' if reverse else 'lt'
+            queryset = queryset.filter(
+                Q(**{f'created_at__{lookup}': created_at}) |
+                Q(created_at=created_at, **{f'id__{lookup}': pk})
+            )
+
+        results = list(queryset[:self.page_size + 1])
+        self.page = results[:self.page_size]
+        has_following = len(results) > len(self.page)
+        if reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = position is not None, has_following
+        else:
+            self.has_next, self.has_previous = has_following, position is not None
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+        return self.page
+
+    def parse_position(self, position):
+        created_at, _, pk = position.partition('|')
+        try:
+            created_at = parse_datetime(created_at)
+            pk = int(pk)
+        except ValueError:
+            created_at = None
+        if created_at is None:
+            raise NotFound(self.invalid_cursor_message)
+        return created_at, pk
+
+    def _get_position_from_instance(self, instance, ordering):
+        return f'{instance.created_at.isoformat()}|{instance.pk}'
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        position = self._get_position_from_instance(self.page[-1], self.ordering) if self.page else self.cursor.position
+        return self.encode_cursor(Cursor(offset=0, reverse=False, position=position))
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        position = self._get_position_from_instance(self.page[0], self.ordering) if self.page else self.cursor.position
+        return self.encode_cursor(Cursor(offset=0, reverse=True, position=position))
 
 
 class NotificationListView(generics.ListAPIView):
@@ -30,7 +102,7 @@ class NotificationListView(generics.ListAPIView):
     Query Parameters:
     - is_read: Filter by read status (true/false)
     - notification_type: Filter by notification type
-    - page: Page number for pagination
+    - cursor: Opaque cursor from the previous response's next/previous link
     - page_size: Number of items per page (max 100)
     """
     serializer_class = NotificationListSerializer
@@ -39,7 +111,7 @@ class NotificationListView(generics.ListAPIView):
     
     def get_queryset(self):
         user = self.request.user
-        queryset = Notification.objects.filter(recipient=user).select_related(
+        queryset = Notification.objects.filter(recipient=user).with_read_state().select_related(
             'sender', 'course', 'video', 'quiz', 'meeting'
         )
         
@@ -67,7 +139,7 @@ class NotificationDetailView(generics.RetrieveAPIView):
     def get_queryset(self):
         if getattr(self, 'swagger_fake_view', False):
             return Notification.objects.none()
-        return Notification.objects.filter(recipient=self.request.user).select_related(
+        return Notification.objects.filter(recipient=self.request.user).with_read_state().select_related(
             'sender', 'course', 'video', 'quiz', 'meeting'
         )
     
@@ -99,9 +171,8 @@ def mark_notifications_as_read(request):
         # Get notifications that belong to the current user and are unread
         notifications = Notification.objects.filter(
             id__in=notification_ids,
-            recipient=request.user,
-            is_read=False
-        )
+            recipient=request.user
+        ).unread()
         
         if not notifications.exists():
             return Response(
@@ -110,10 +181,7 @@ def mark_notifications_as_read(request):
             )
         
         # Mark notifications as read
-        updated_count = 0
-        for notification in notifications:
-            notification.mark_as_read()
-            updated_count += 1
+        updated_count = NotificationReadMark.set_state(notifications, is_read=True)
         
         return Response({
             'message': f'Successfully marked {updated_count} notifications as read.',
@@ -129,15 +197,8 @@ def mark_all_notifications_as_read(request):
     """
     Mark all unread notifications as read for the current user
     """
-    unread_notifications = Notification.objects.filter(
-        recipient=request.user,
-        is_read=False
-    )
-    
-    updated_count = 0
-    for notification in unread_notifications:
-        notification.mark_as_read()
-        updated_count += 1
+    # Moves the user's read watermark instead of updating every notification
+    updated_count = NotificationReadState.mark_all_read(request.user)
     
     return Response({
         'message': f'Successfully marked {updated_count} notifications as read.',
@@ -159,19 +220,17 @@ def notification_stats(request):
     """
     user = request.user
     
-    # Get total counts
-    total_count = Notification.objects.filter(recipient=user).count()
-    unread_count = Notification.objects.filter(recipient=user, is_read=False).count()
-    read_count = total_count - unread_count
-    
-    # Get counts by notification type
-    type_counts = Notification.objects.filter(recipient=user).values(
-        'notification_type'
-    ).annotate(
-        count=Count('id')
-    ).order_by('notification_type')
+    # Read from the cached per-type counters instead of counting notifications
+    counters = NotificationCounter.objects.filter(user=user).order_by('notification_type')
     
-    notification_types = {item['notification_type']: item['count'] for item in type_counts}
+    notification_types = {
+        counter.notification_type: max(counter.total_count, 0)
+        for counter in counters
+        if counter.total_count > 0
+    }
+    total_count = sum(notification_types.values())
+    unread_count = min(sum(max(counter.unread_count, 0) for counter in counters), total_count)
+    read_count = total_count - unread_count
     
     stats_data = {
         'total_count': total_count,
@@ -191,7 +250,7 @@ def delete_notification(request, notification_id):
     Delete a specific notification
     """
     try:
-        notification = Notification.objects.get(
+        notification = Notification.objects.with_read_state().get(
             id=notification_id,
             recipient=request.user
         )
@@ -212,10 +271,13 @@ def delete_all_read_notifications(request):
     """
     Delete all read notifications for the current user
     """
-    deleted_count, _ = Notification.objects.filter(
-        recipient=request.user,
-        is_read=True
-    ).delete()
+    read_notifications = Notification.objects.filter(
+        recipient=request.user
+    ).read()
+    
+    _, deleted = read_notifications.delete()
+    # Exclude cascaded read marks from the reported count
+    deleted_count = deleted.get(Notification._meta.label, 0)
     
     return Response({
         'message': f'Successfully deleted {deleted_count} read notifications.',
@@ -228,15 +290,12 @@ def delete_all_read_notifications(request):
 def unread_notifications_count(request):
     """
     Get the count of unread notifications for the current user
-    This is useful for showing notification badges in the UI
+    This is useful for showing notification badges in the UI.
+    Clients connected to ws/alerts/ get new notifications pushed and the
+    unread count on resume, so they only need this on first load.
     """
-    unread_count = Notification.objects.filter(
-        recipient=request.user,
-        is_read=False
-    ).count()
-    
     return Response({
-        'unread_count': unread_count
+        'unread_count': get_unread_count(request.user)
     })
 
 
@@ -249,7 +308,7 @@ def recent_notifications(request):
     """
     recent_notifications = Notification.objects.filter(
         recipient=request.user
-    ).select_related(
+    ).with_read_state().select_related(
         'sender', 'course'
     ).order_by('-created_at')[:10]
     
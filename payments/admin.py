@@ -1,4 +1,11 @@
 from django.contrib import admin
-from .models import Payment
+from .models import Payment, RevenueDaily
 # Register your models here.
-admin.site.register(Payment)
\ No newline at end of file
+admin.site.register(Payment)
+
+
+@admin.register(RevenueDaily)
+class RevenueDailyAdmin(admin.ModelAdmin):
+    list_display = ['date', 'source', 'course', 'teacher', 'gateway', 'amount', 'payment_count']
+    list_filter = ['source', 'gateway', 'date']
+    date_hierarchy = 'date'
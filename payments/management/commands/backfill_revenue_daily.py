@@ -0,0 +1,87 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import Coalesce, TruncDate
+
+from payments.models import Payment, RevenueDaily
+from individual_live_class.models import LiveClassPayment
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the RevenueDaily rollup from successful course and live class payments'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--since',
+            help='Only rebuild rollup rows from this date (YYYY-MM-DD) onwards',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of rollup rows written per bulk insert',
+        )
+
+    def handle(self, *args, **options):
+        since = None
+        if options['since']:
+            try:
+                since = datetime.strptime(options['since'], '%Y-%m-%d').date()
+            except ValueError:
+                raise CommandError('--since must be in YYYY-MM-DD format')
+
+        course_rows = (
+            Payment.objects.filter(is_successful=True)
+            .annotate(date=TruncDate('created_at'))
+            .values('date', 'course_id', 'course__teacher_id', 'gateway')
+            .annotate(total=Sum('amount'), count=Count('id'))
+        )
+        live_class_rows = (
+            LiveClassPayment.objects.filter(status='completed')
+            # The day the signal records them on: completion, falling back
+            # to initiation for payments completed without a timestamp
+            .annotate(date=TruncDate(Coalesce('completed_at', 'initiated_at')))
+            .values('date', 'schedule__teacher_id', 'payment_method')
+            .annotate(total=Sum('amount'), count=Count('id'))
+        )
+        existing = RevenueDaily.objects.all()
+        if since:
+            course_rows = course_rows.filter(date__gte=since)
+            live_class_rows = live_class_rows.filter(date__gte=since)
+            existing = existing.filter(date__gte=since)
+
+        rollups = [
+            RevenueDaily(
+                date=row['date'],
+                source='course',
+                course_id=row['course_id'],
+                teacher_id=row['course__teacher_id'],
+                gateway=row['gateway'] or '',
+                amount=row['total'],
+                payment_count=row['count'],
+            )
+            for row in course_rows
+        ]
+        rollups += [
+            RevenueDaily(
+                date=row['date'],
+                source='live_class',
+                teacher_id=row['schedule__teacher_id'],
+                gateway=row['payment_method'] or '',
+                amount=row['total'],
+                payment_count=row['count'],
+            )
+            for row in live_class_rows
+        ]
+
+        with transaction.atomic():
+            deleted, _ = existing.delete()
+            RevenueDaily.objects.bulk_create(rollups, batch_size=options['batch_size'])
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'✓ Rebuilt {len(rollups)} revenue rollup rows (replaced {deleted})'
+            )
+        )
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.1 on 2026-10-19 04:42
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0004_user_list_indexes'),
+        ('courses', '0004_assignment_topic'),
+        ('payments', '0002_payment_created_at_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RevenueDaily',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('source', models.CharField(choices=[('course', 'Course Payment'), ('live_class', 'Live Class Payment')], default='course', max_length=20)),
+                ('gateway', models.CharField(blank=True, max_length=50)),
+                ('amount', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('payment_count', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('course', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='daily_revenue', to='courses.course')),
+                ('teacher', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='daily_revenue', to='authentication.teacherprofile')),
+            ],
+            options={
+                'db_table': 'revenue_daily',
+                'ordering': ['date'],
+                'indexes': [models.Index(fields=['source', 'date'], name='revenue_dai_source_6eb0dd_idx'), models.Index(fields=['teacher', 'date'], name='revenue_dai_teacher_609685_idx'), models.Index(fields=['course', 'date'], name='revenue_dai_course__192dce_idx')],
+                'unique_together': {('date', 'source', 'course', 'teacher', 'gateway')},
+            },
+        ),
+    ]
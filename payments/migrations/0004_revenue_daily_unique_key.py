@@ -0,0 +1,47 @@
+# Generated by Django 5.2.1 on 2026-10-19 05:56
+
+import django.db.models.functions.comparison
+from django.db import migrations, models
+from django.db.models import Count, Min, Sum
+
+
+def merge_duplicate_rollups(apps, schema_editor):
+    # Rows without a course or teacher could be duplicated under the old
+    # unique_together; fold each set into its oldest row
+    RevenueDaily = apps.get_model('payments', 'RevenueDaily')
+
+    duplicates = (
+        RevenueDaily.objects.values('date', 'source', 'course_id', 'teacher_id', 'gateway')
+        .annotate(rows=Count('id'), keep=Min('id'), amount_total=Sum('amount'), count_total=Sum('payment_count'))
+        .filter(rows__gt=1)
+        .order_by()
+    )
+    for row in duplicates:
+        RevenueDaily.objects.filter(pk=row['keep']).update(
+            amount=row['amount_total'], payment_count=row['count_total']
+        )
+        RevenueDaily.objects.filter(
+            date=row['date'], source=row['source'], course_id=row['course_id'],
+            teacher_id=row['teacher_id'], gateway=row['gateway'],
+        ).exclude(pk=row['keep']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0004_user_list_indexes'),
+        ('courses', '0004_assignment_topic'),
+        ('payments', '0003_revenuedaily'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_rollups, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='revenuedaily',
+            unique_together=set(),
+        ),
+        migrations.AddConstraint(
+            model_name='revenuedaily',
+            constraint=models.UniqueConstraint(models.F('date'), models.F('source'), django.db.models.functions.comparison.Coalesce('course', models.Value(0)), django.db.models.functions.comparison.Coalesce('teacher', models.Value(0)), models.F('gateway'), name='revenue_daily_unique_key'),
+        ),
+    ]
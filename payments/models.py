@@ -1,8 +1,12 @@
 # payment/models.py - Updated to link with courses
 
 from django.db import models
+from django.db.models import Value
+from django.db.models.functions import Coalesce
 from django.contrib.auth import get_user_model
+from authentication.models import TeacherProfile
 from courses.models import Course
+from lms.db import increment_or_create
 
 User = get_user_model()
 
@@ -22,6 +26,66 @@ class Payment(models.Model):
     
     class Meta:
         unique_together = ['user', 'course']  # Prevent duplicate payments for same course
+        indexes = [
+            models.Index(fields=['created_at', 'id']),
+        ]
     
     def __str__(self):
         return f"{self.user.username} - {self.course.title} - {self.gateway} - {self.amount}"
+
+
+class RevenueDaily(models.Model):
+    """
+    Daily revenue rollup per course, teacher and gateway, kept up to date
+    on payment success transitions so charts and reports don't re-sum payments
+    """
+    SOURCE_CHOICES = (
+        ('course', 'Course Payment'),
+        ('live_class', 'Live Class Payment'),
+    )
+    
+    date = models.DateField()
+    source = models.CharField(max_length=20, choices=SOURCE_CHOICES, default='course')
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='daily_revenue', null=True, blank=True)
+    teacher = models.ForeignKey(TeacherProfile, on_delete=models.CASCADE, related_name='daily_revenue', null=True, blank=True)
+    gateway = models.CharField(max_length=50, blank=True)
+    
+    amount = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    payment_count = models.IntegerField(default=0)
+    
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        db_table = 'revenue_daily'
+        ordering = ['date']
+        constraints = [
+            # One row per key, counting a missing course/teacher as a value
+            # of its own (NULLs never collide in a plain unique index)
+            models.UniqueConstraint(
+                'date', 'source', Coalesce('course', Value(0)), Coalesce('teacher', Value(0)), 'gateway',
+                name='revenue_daily_unique_key',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['source', 'date']),
+            models.Index(fields=['teacher', 'date']),
+            models.Index(fields=['course', 'date']),
+        ]
+    
+    def __str__(self):
+        return f"{self.date} - {self.source} - {self.gateway} - {self.amount}"
+    
+    @classmethod
+    def record(cls, date, amount, source='course', course=None, teacher=None, gateway='', count=1):
+        """
+        Add ``amount``/``count`` to the rollup row for the given key, creating it
+        if needed. Pass negative values to reverse a previously recorded payment.
+        """
+        key = {
+            'date': date,
+            'source': source,
+            'course': course,
+            'teacher': teacher,
+            'gateway': gateway or '',
+        }
+        increment_or_create(cls, key, {'amount': amount, 'payment_count': count})
@@ -0,0 +1,39 @@
+# payments/signals.py
+
+from django.db.models.signals import pre_save, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import Payment, RevenueDaily
+
+
+@receiver(pre_save, sender=Payment)
+def remember_payment_state(sender, instance, **kwargs):
+    """Remember whether the payment was already successful before this save"""
+    instance._was_successful = False
+    if instance.pk:
+        instance._was_successful = Payment.objects.filter(
+            pk=instance.pk, is_successful=True
+        ).exists()
+
+
+@receiver(post_save, sender=Payment)
+def update_revenue_rollup(sender, instance, created, **kwargs):
+    """
+    Add the payment to the daily revenue rollup when it becomes successful,
+    and take it back out if it is later marked as failed
+    """
+    was_successful = getattr(instance, '_was_successful', False)
+    if instance.is_successful == was_successful:
+        return
+    
+    sign = 1 if instance.is_successful else -1
+    RevenueDaily.record(
+        date=timezone.localdate(instance.created_at),
+        amount=sign * instance.amount,
+        count=sign,
+        source='course',
+        course=instance.course,
+        teacher=instance.course.teacher if instance.course else None,
+        gateway=instance.gateway,
+    )
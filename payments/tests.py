@@ -1,3 +1,120 @@
+import uuid
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import IntegrityError, transaction
 from django.test import TestCase
+from django.utils import timezone
+
+from courses.models import Course
+from individual_live_class.models import LiveClassPayment, LiveClassSchedule, LiveClassSubscription
+
+from .models import Payment, RevenueDaily
+
+User = get_user_model()
+
+
+def rollup_rows():
+    return sorted(
+        RevenueDaily.objects.values_list(
+            'date', 'source', 'course_id', 'teacher_id', 'gateway', 'amount', 'payment_count'
+        ),
+        key=str,
+    )
+
+
+class RevenueDailyTests(TestCase):
+    """The daily revenue rollup kept by the payment signals and the backfill"""
+
+    @classmethod
+    def setUpTestData(cls):
+        # Live class notifications go to the admin at recipient_id=1
+        User.objects.create_user(
+            id=uuid.UUID(int=1), username='admin', email='admin@example.com', password='pass', role='admin'
+        )
+        cls.teacher = User.objects.create_user(
+            username='teacher', email='teacher@example.com', password='pass', role='teacher'
+        ).teacher_profile
+        cls.student = User.objects.create_user(
+            username='student', email='student@example.com', password='pass', role='student'
+        )
+        cls.course = Course.objects.create(title='Algebra', description='', teacher=cls.teacher, price=50)
+
+    def test_record_keeps_one_row_for_keys_without_course_or_teacher(self):
+        today = timezone.localdate()
+        RevenueDaily.record(today, Decimal('10'), source='live_class', gateway='jazzcash')
+        RevenueDaily.record(today, Decimal('15'), source='live_class', gateway='jazzcash')
+
+        row = RevenueDaily.objects.get()
+        self.assertEqual((row.amount, row.payment_count), (Decimal('25'), 2))
+
+    def test_duplicate_key_without_course_is_rejected(self):
+        today = timezone.localdate()
+        RevenueDaily.objects.create(date=today, source='live_class', teacher=self.teacher, gateway='jazzcash')
+
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            RevenueDaily.objects.create(date=today, source='live_class', teacher=self.teacher, gateway='jazzcash')
+
+    def test_signals_and_backfill_agree(self):
+        other_student = User.objects.create_user(
+            username='other', email='other@example.com', password='pass', role='student'
+        )
+        Payment.objects.create(
+            user=self.student, course=self.course, gateway='jazzcash', txn_ref='t1',
+            amount=Decimal('50'), is_successful=True
+        )
+        pending = Payment.objects.create(
+            user=other_student, course=self.course, gateway='easypaisa', txn_ref='t2', amount=Decimal('50')
+        )
+        pending.is_successful = True
+        pending.save()
+
+        schedule = LiveClassSchedule.objects.create(
+            teacher=self.teacher, student=other_student.student_profile, subject='Maths',
+            classes_per_week=1, class_days=['monday'], class_times={'monday': '18:00'},
+            weekly_payment=Decimal('20'), monthly_payment=Decimal('70'), start_date=timezone.localdate()
+        )
+        payments = []
+        for i in range(3):
+            subscription = LiveClassSubscription.objects.create(
+                schedule=schedule, student=other_student.student_profile, subscription_type='weekly',
+                amount_paid=Decimal('20'), classes_included=1,
+                start_date=timezone.localdate(), end_date=timezone.localdate() + timedelta(days=7)
+            )
+            payments.append(LiveClassPayment.objects.create(
+                subscription=subscription, student=other_student.student_profile, schedule=schedule,
+                amount=Decimal('20'), payment_method='jazzcash', transaction_reference=f'live{i}'
+            ))
+        # Initiated yesterday and completed without a timestamp: the
+        # completion day counts, on both paths
+        LiveClassPayment.objects.filter(pk=payments[0].pk).update(initiated_at=timezone.now() - timedelta(days=1))
+        payments[0].refresh_from_db()
+        payments[0].status = 'completed'
+        payments[0].save()
+        for payment in payments[1:]:
+            payment.status = 'completed'
+            payment.completed_at = timezone.now()
+            payment.save()
+        # Completed, then refunded: counted and taken back out
+        payments[2].status = 'refunded'
+        payments[2].save()
+
+        payments[0].refresh_from_db()
+        self.assertIsNotNone(payments[0].completed_at)
+
+        recorded = rollup_rows()
+        self.assertEqual(
+            {(row[1], row[4]): (row[5], row[6]) for row in recorded if row[6]},
+            {
+                ('course', 'jazzcash'): (Decimal('50'), 1),
+                ('course', 'easypaisa'): (Decimal('50'), 1),
+                ('live_class', 'jazzcash'): (Decimal('40'), 2),
+            },
+        )
+
+        call_command('backfill_revenue_daily', stdout=open('/dev/null', 'w'))
 
-# Create your tests here.
+        # Reversals can leave zeroed rows behind on the signal path
+        self.assertEqual([row for row in recorded if row[6]], rollup_rows())
@@ -3,4 +3,39 @@ import hashlib
 def generate_secure_hash(data: dict, integrity_salt: str) -> str:
     sorted_keys = sorted(data.keys())
     string_to_hash = integrity_salt + '&' + '&'.join([str(data[k]) for k in sorted_keys])
-    return hashlib.sha256(string_to_hash.encode('utf-8')).hexdigest()
\ No newline at end of file
+    return hashlib.sha256(string_to_hash.encode('utf-8')).hexdigest()
+
+def daily_revenue_series(start_date, end_date=None, **filters):
+    """
+    Revenue per day from the RevenueDaily rollup, e.g. for dashboard charts
+
+    Extra keyword arguments filter the rollup rows (source, teacher, course, gateway).
+    """
+    from django.db.models import Sum
+    from .models import RevenueDaily
+
+    rows = RevenueDaily.objects.filter(date__gte=start_date, **filters)
+    if end_date:
+        rows = rows.filter(date__lte=end_date)
+
+    rows = rows.values('date').annotate(
+        total=Sum('amount'),
+        payments=Sum('payment_count'),
+    ).order_by('date')
+
+    return [
+        {
+            'date': row['date'].isoformat(),
+            'amount': float(row['total'] or 0),
+            'payments': row['payments'] or 0,
+        }
+        for row in rows
+    ]
+
+
+def total_revenue(**filters):
+    """Sum of the RevenueDaily rollup rows matching ``filters``"""
+    from django.db.models import Sum
+    from .models import RevenueDaily
+
+    return RevenueDaily.objects.filter(**filters).aggregate(total=Sum('amount'))['total'] or 0
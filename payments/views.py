@@ -6,6 +6,7 @@ from .jazzcash import generate_jazzcash_url
 from .easypaisa import generate_easypaisa_url
 
 from .models import Payment
+from email_automation.dispatch import enqueue_on_commit
 from email_automation.tasks import send_payment_confirmation_email
 # from meetings.models import Meeting
 
@@ -27,12 +28,6 @@ def initiate_jazzcash(request):
         txn_ref=txn_ref,
         gateway="jazzcash",
     )
-    send_payment_confirmation_email(
-            user_id=user.id,
-            payment_id=payment.id
-        )
-    print("Email send")
-
     return Response({"payment_url": payment_url})
 
 @api_view(['GET'])
@@ -46,10 +41,11 @@ def verify_jazzcash(request):
         if status == "000":
             payment.is_successful = True
             payment.save()
-            send_payment_confirmation_email(
-            user_id=user.id,
-            payment_id=payment.id
-        )
+            enqueue_on_commit(
+                send_payment_confirmation_email,
+                user_id=payment.user_id,
+                payment_id=payment.id
+            )
             return Response({"status": "success"})
         else:
             return Response({"status": "failed"})
@@ -10,7 +10,7 @@ from courses.models import Course, Video, Quiz, Assignment, Enrollment, Topic
 from courses.serializers import CourseListSerializer, VideoDetailSerializer, QuizSerializer, AssignmentSerializer 
 from .serializers import TeacherCourseSerializer, TeacherVideoSerializer, TeacherQuizSerializer, EnrolledStudentSerializer,LiveClassSerializer, TeacherAssignmentSerializer,TeacherTopicSerializer
 from meetings.models import Meeting
-from django.core.mail import send_mail
+from email_automation.dispatch import send_mail_async
 from datetime import datetime
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
@@ -1384,7 +1384,7 @@ def teacher_course_live_classes(request, course_id):
         for enrollment in verified_enrollments:
             student_email = enrollment.student.email
             try:
-                send_mail(
+                send_mail_async(
                     subject=f"📢 New Live Class for {course.title}",
                     message=f"Dear {enrollment.student.get_full_name()},\n\nYou are invited to attend a live class titled '{meeting.title}' scheduled on {meeting.scheduled_time}. Don't miss it!\n\nRegards,\n{teacher.user.get_full_name()}",
                     from_email='no-reply@lms.com',